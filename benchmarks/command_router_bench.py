@@ -0,0 +1,104 @@
+"""Command matching: linear filters of the old handlers vs the compiled CommandRouter.
+
+    python benchmarks/command_router_bench.py [rounds] [extra_patterns]
+
+Commands and patterns are taken from the module manifests, extra_patterns adds synthetic modules
+to see how both grow with the number of patterns. Both ways must pick the same module.
+"""
+import importlib
+import os
+import pkgutil
+import re
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import bot.modules as modules_pkg
+from bot.command_router import CommandRouter
+
+TEXTS = [
+    "/calc 2+2", "/dl https://www.tiktok.com/@user/video/1", "/help", "/help_dl", "/math x^2",
+    "/ai hello", "/mp3@some_bot https://youtu.be/x", "/circle", "/help_voice@some_bot",
+    "/unknown command", "hello there", "https://www.instagram.com/p/abc/", "/start", "/id",
+    "just a long message without any command in it " * 3, "/solve x+1=2",
+]
+
+
+def load_tables(extra: int):
+    cmd_list, cmd_patterns = {}, []
+    for _, name, is_pkg in pkgutil.iter_modules(modules_pkg.__path__):
+        manifest = getattr(importlib.import_module(f"bot.modules.{name}"), "MANIFEST", None) if is_pkg else None
+        if not manifest:
+            continue
+        for cmd in manifest["commands"]:
+            cmd_list.setdefault(cmd, name)
+        cmd_patterns.extend((re.compile(p, re.IGNORECASE), name) for p in manifest["patterns"])
+    for n in range(extra):
+        cmd_patterns.append((re.compile(rf"^/extra{n}_(one|two)(?:@\w+)?", re.IGNORECASE), f"extra{n}"))
+    return cmd_list, cmd_patterns
+
+
+def old_route(message, cmd_list: dict, cmd_patterns: list):
+    # the two message_handler filters, then CommandHandler.handle_message
+    text = message.any_text or ""
+    by_command = text.startswith("/") and text.lstrip('/').split()[0].split('@')[0].lower() in cmd_list
+    if not by_command and not any(pattern.match(str(message.any_text).lower()) for pattern, _ in cmd_patterns):
+        return None
+    text = message.any_text.lower()
+    cmd = text.split(" ")[0] if " " in text else text
+    if "\n" in cmd: cmd = cmd.split("\n")[0]
+    if "@" in cmd:
+        cmd = cmd.split("@")[0]
+    cmd = cmd.strip("/")
+    if cmd in cmd_list:
+        return cmd_list[cmd]
+    for pattern, name in cmd_patterns:
+        if pattern.match(text):
+            return name
+    return None
+
+
+def new_route(message, router: CommandRouter):
+    # the handler filter and handle_message both classify, the second call is cached on the message
+    if not router.classify(message):
+        return None
+    return router.classify(message).instance
+
+
+def measure(label: str, route, batches: list) -> float:
+    started = time.perf_counter()
+    for batch in batches:
+        for message in batch:
+            route(message)
+    elapsed = time.perf_counter() - started
+    count = sum(len(b) for b in batches)
+    print(f"{label}: {elapsed / count * 1e6:.2f}us per message")
+    return elapsed
+
+
+def main(rounds: int, extra: int):
+    cmd_list, cmd_patterns = load_tables(extra)
+    router = CommandRouter()
+    for cmd, name in cmd_list.items():
+        router.add_command(cmd, name)
+    for pattern, name in cmd_patterns:
+        router.add_pattern(pattern, name)
+    router.compile()
+
+    for text in TEXTS:
+        message = SimpleNamespace(any_text=text)
+        assert old_route(message, cmd_list, cmd_patterns) == new_route(message, router), text
+
+    print(f"{len(cmd_list)} commands, {len(cmd_patterns)} patterns, {len(TEXTS)} texts x {rounds}")
+    old = measure("linear", lambda m: old_route(m, cmd_list, cmd_patterns),
+                  [[SimpleNamespace(any_text=t) for t in TEXTS] for _ in range(rounds)])
+    new = measure("router", lambda m: new_route(m, router),
+                  [[SimpleNamespace(any_text=t) for t in TEXTS] for _ in range(rounds)])
+    print(f"x{old / new:.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 0)
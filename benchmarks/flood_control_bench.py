@@ -0,0 +1,48 @@
+"""Memory of FloodControl in memory mode after button presses from many chats.
+
+    python benchmarks/flood_control_bench.py [chats]
+
+Compares with the unbounded dict of dicts used before FLOOD_MAX_CHATS / FLOOD_MAX_HISTORY.
+"""
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ["FLOOD_BACKEND"] = "memory"
+
+from bot.utils.flood_control import FloodControl
+
+
+async def bounded(chats: int):
+    tracemalloc.start()
+    flood = FloodControl()
+    started = time.perf_counter()
+    for chat_id in range(chats):
+        await flood.check(chat_id)
+        await flood.repeated(chat_id, f"base_h_{chat_id % 7}")
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"bounded: {len(flood.hist)} chats kept, {current / 1e6:.1f}MB now, {peak / 1e6:.1f}MB peak, "
+          f"{elapsed / chats * 1e6:.2f}us per press")
+
+
+def unbounded(chats: int):
+    tracemalloc.start()
+    hist_user_timecall = {}
+    for chat_id in range(chats):
+        hist = hist_user_timecall.setdefault(chat_id, {})
+        hist.get("last", 0)
+        hist[f"base_h_{chat_id % 7}"] = int(time.time() * 1000)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"unbounded: {len(hist_user_timecall)} chats kept, {current / 1e6:.1f}MB now")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    asyncio.run(bounded(count))
+    unbounded(count)
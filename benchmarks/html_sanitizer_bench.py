@@ -0,0 +1,37 @@
+"""sanitize_html vs the BeautifulSoup version it replaced, uncached.
+
+    python benchmarks/html_sanitizer_bench.py [random_strings]
+
+Needs beautifulsoup4 4.13 (requirements.txt), the corpus and the old version are shared with
+tests/test_html_sanitizer.py.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bot.utils.html_sanitizer import _sanitize, sanitize_html
+from tests.test_html_sanitizer import bs4_sanitize, corpus
+
+
+def measure(label: str, sanitize, texts: list[str]) -> float:
+    started = time.perf_counter()
+    for text in texts:
+        sanitize(text)
+    elapsed = time.perf_counter() - started
+    print(f"{label}: {elapsed / len(texts) * 1e6:.1f}us per string")
+    return elapsed
+
+
+def main(random_count: int):
+    texts = corpus(random_count)
+    print(f"{len(texts)} strings")
+    old = measure("bs4", bs4_sanitize, texts)
+    new = measure("parser", _sanitize.__wrapped__, texts)
+    measure("sanitize_html (fast path and cache)", sanitize_html, texts)
+    print(f"x{old / new:.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,91 @@
+"""RequestLimiter with many users: queue lookups, cancels, drain, idle CPU and wake-up latency.
+
+    python benchmarks/request_limiter_bench.py [users] [tasks] [idle_seconds]
+
+Every user gets tasks / users queued tasks with a 1 second pause between them (memory backend).
+Wake-up latency is how late a task of a user starts after its pause is over.
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ["LIMITER_BACKEND"] = "memory"
+
+from utils.request_limiter import RequestLimiter
+
+RATE = 1.0
+
+
+async def run(users: int, tasks: int, idle_seconds: float):
+    limiter = RequestLimiter()
+    limiter.set_rate_limit("bench", RATE)
+    expected, latency = {}, []
+    cancels = min(tasks // 10, 10000)
+    drained = asyncio.Event()
+    finished = 0
+
+    def make(user_id):
+        async def work():
+            now = time.monotonic()
+            if user_id in expected:
+                latency.append(now - expected[user_id])
+            expected[user_id] = now + RATE
+        return work
+
+    async def callback(_):
+        nonlocal finished
+        finished += 1
+        if finished >= tasks - cancels:
+            drained.set()
+
+    cpu, started = time.process_time(), time.perf_counter()
+    ids = [await limiter.run(name="bench", proxy="", user_id=n % users, coro=make(n % users), callback=callback)
+           for n in range(tasks)]
+    enqueued = time.process_time()
+    print(f"enqueue {tasks} tasks of {users} users: {enqueued - cpu:.2f}s cpu")
+
+    waiting = ids[users * 2:]
+    lookups = random.sample(waiting, min(len(waiting), 2000))
+    t = time.perf_counter()
+    for task_id in lookups:
+        limiter.get_task_position(task_id)
+    print(f"get_task_position x{len(lookups)}: {(time.perf_counter() - t) * 1e3:.1f}ms")
+
+    cancelled = random.sample(waiting, min(len(waiting), cancels))
+    t = time.perf_counter()
+    for task_id in cancelled:
+        limiter.cancel_task(task_id)
+    print(f"cancel_task x{len(cancelled)}: {(time.perf_counter() - t) * 1e3:.1f}ms")
+
+    await drained.wait()
+    print(f"drain: {time.perf_counter() - started:.1f}s wall, {time.process_time() - enqueued:.2f}s cpu "
+          f"(at least {tasks / users - 1:.0f}s of pauses)")
+    latency.sort()
+    if latency:
+        n = len(latency)
+        print(f"wake-up latency: p50 {latency[n // 2] * 1e3:.1f}ms, p99 {latency[int(n * 0.99)] * 1e3:.1f}ms, "
+              f"max {latency[-1] * 1e3:.1f}ms")
+
+    # every user has a task waiting for a long pause, nothing should run
+    limiter.set_rate_limit("idle", 600)
+    for user_id in range(users):
+        for _ in range(2):
+            await limiter.run(name="idle", proxy="", user_id=user_id, coro=make(-1 - user_id))
+    await asyncio.sleep(1)
+    cpu = time.process_time()
+    await asyncio.sleep(idle_seconds)
+    print(f"idle cpu with {users} waiting queues: {time.process_time() - cpu:.2f}s over {idle_seconds:.0f}s")
+    limiter.dispatcher.cancel()
+
+
+def main(users: int, tasks: int, idle_seconds: float):
+    asyncio.run(run(users, tasks, idle_seconds))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 100000,
+         float(sys.argv[3]) if len(sys.argv) > 3 else 10)
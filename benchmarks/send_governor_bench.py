@@ -0,0 +1,57 @@
+"""Dispatcher cost of SendGovernor.
+
+    python benchmarks/send_governor_bench.py [calls] [chats]
+
+drain: a backlog of calls spread over many chats, limits are raised so only the dispatcher is measured.
+throttled: the same number of calls waits in throttled groups while private chats are served.
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("SEND_GLOBAL_RATE", "1000000000")
+os.environ.setdefault("SEND_CHAT_RATE", "1000000000")
+os.environ.setdefault("SEND_CHAT_BURST", "1000000000")
+os.environ.setdefault("SEND_COSMETIC_LIMIT", "1000000000")
+
+from bot.utils.send_governor import SendGovernor, PRIORITIES
+
+
+async def request():
+    return None
+
+
+async def drain(governor: SendGovernor, calls: int, chats: int):
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        governor.call(n % chats + 1, request, priority=PRIORITIES[n % len(PRIORITIES)]) for n in range(calls)
+    ])
+    elapsed = time.perf_counter() - started
+    print(f"drain: {calls} calls in {chats} chats: {elapsed:.2f}s, {elapsed / calls * 1e6:.1f}us per call")
+
+
+async def throttled(governor: SendGovernor, calls: int, chats: int):
+    # groups keep their default limit of 20 messages per minute, so these calls stay queued
+    waiting = [asyncio.ensure_future(governor.call(-(n % chats) - 1, request)) for n in range(calls)]
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    await asyncio.gather(*[governor.call(n + 1, request) for n in range(calls)])
+    elapsed = time.perf_counter() - started
+    print(f"throttled: {calls} calls with {governor.depth()} waiting in {chats} groups: "
+          f"{elapsed:.2f}s, {elapsed / calls * 1e6:.1f}us per call")
+    for future in waiting:
+        future.cancel()
+
+
+async def main(calls: int, chats: int):
+    governor = SendGovernor()
+    await drain(governor, calls, chats)
+    await throttled(governor, calls, chats)
+    await governor.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000,
+                     int(sys.argv[2]) if len(sys.argv) > 2 else 2000))
@@ -0,0 +1,82 @@
+"""Redis memory of user languages: a key per user, hashes by id // 100 and hashes by crc32 of the id.
+
+    python benchmarks/settings_memory_bench.py [users] [port] [db]
+
+Needs a Redis server, the db (15 by default) is flushed before every layout.
+Ids are random like real Telegram ids: 10-digit users and -100... groups.
+"""
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import redis
+
+from utils.user_settings import SETTINGS_BUCKETS, bucket_key
+
+LANGS = ["en", "uk", "ru", "de", "es"]
+
+
+def realistic_ids(count: int, seed: int = 1) -> list[int]:
+    rnd = random.Random(seed)
+    ids = set()
+    while len(ids) < count:
+        if rnd.random() < 0.9:
+            ids.add(rnd.randint(10 ** 8, 8 * 10 ** 9))
+        else:
+            ids.add(-10 ** 12 - rnd.randint(10 ** 9, 3 * 10 ** 9))
+    return list(ids)
+
+
+def legacy(user_id: int, lang: str):
+    return "set", f"user:{user_id}:lang", lang
+
+
+def by_range(user_id: int, lang: str):
+    return "hset", f"us:{user_id // 100}", str(user_id % 100), json.dumps({"lang": lang})
+
+
+def by_crc(user_id: int, lang: str):
+    return "hset", *bucket_key(user_id), json.dumps({"lang": lang})
+
+
+def measure(client: redis.Redis, label: str, layout, ids: list[int]):
+    client.flushdb()
+    before = client.info("memory")["used_memory"]
+    pipe = client.pipeline(transaction=False)
+    for n, user_id in enumerate(ids):
+        op, *args = layout(user_id, LANGS[n % len(LANGS)])
+        getattr(pipe, op)(*args)
+    pipe.execute()
+    total = client.info("memory")["used_memory"] - before
+    keys = list(client.scan_iter(count=1000))
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.memory_usage(key, samples=0)
+    used = sum(pipe.execute())
+    encodings = {}
+    for key in keys[:2000]:
+        encoding = client.object("encoding", key)
+        encodings[encoding] = encodings.get(encoding, 0) + 1
+    print(f"{label}: {len(keys)} keys, MEMORY USAGE {used / 1e6:.2f}MB ({used / len(ids):.0f} bytes per user), "
+          f"used_memory +{total / 1e6:.2f}MB, encodings of first {min(len(keys), 2000)} keys {encodings}")
+    return total
+
+
+def main(users: int, port: int, db: int):
+    client = redis.Redis(port=port, db=db, decode_responses=True)
+    ids = realistic_ids(users)
+    print(f"{users} users, {SETTINGS_BUCKETS} buckets")
+    old = measure(client, "key per user", legacy, ids)
+    measure(client, "hash per id // 100", by_range, ids)
+    new = measure(client, "hash per crc32 % SETTINGS_BUCKETS", by_crc, ids)
+    client.flushdb()
+    print(f"x{old / new:.1f} less than a key per user")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 6379,
+         int(sys.argv[3]) if len(sys.argv) > 3 else 15)
@@ -0,0 +1,63 @@
+"""Updates per second handled with 1..N bot shards.
+
+    python benchmarks/shard_throughput_bench.py [updates] [max_shards] [work_ms]
+
+Updates go through ShardSupervisor.dispatch into the shard queues as in BOT_SHARDS mode.
+The shard processes do work_ms of CPU work per update instead of running the bot, so only
+routing and the spread over processes are measured.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bot.shard_supervisor import ShardSupervisor
+
+
+def fake_shard(queue: multiprocessing.Queue, done: multiprocessing.Queue, work_ms: float):
+    handled = 0
+    while (update := queue.get()) is not None:
+        until = time.perf_counter() + work_ms / 1000
+        while time.perf_counter() < until:
+            pass
+        handled += 1
+    done.put(handled)
+
+
+async def measure(updates: int, shards: int, work_ms: float) -> float:
+    supervisor = ShardSupervisor("0:bench", logging.getLogger("bench"), shards)
+    done = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=fake_shard, args=(queue, done, work_ms)) for queue in supervisor.queues]
+    for p in processes:
+        p.start()
+    started = time.perf_counter()
+    for n in range(updates):
+        await supervisor.dispatch({"update_id": n, "message": {"chat": {"id": n % 1000}, "text": "/dl link"}})
+    for queue in supervisor.queues:
+        queue.put(None)
+    handled = sum(done.get() for _ in processes)
+    elapsed = time.perf_counter() - started
+    for p in processes:
+        p.join()
+    assert handled == updates
+    return updates / elapsed
+
+
+async def main(updates: int, max_shards: int, work_ms: float):
+    base = None
+    shards = 1
+    while shards <= max_shards:
+        rate = await measure(updates, shards, work_ms)
+        base = base or rate
+        print(f"{shards} shards: {rate:.0f} updates/s, x{rate / base:.2f}")
+        shards *= 2
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 4000,
+                     int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 4,
+                     float(sys.argv[3]) if len(sys.argv) > 3 else 1.0))
@@ -0,0 +1,119 @@
+"""Cold start of the bot: time to the first get_me and RSS at idle, with lazy and eager module loading.
+
+    python benchmarks/startup_bench.py [runs] [idle_seconds]
+
+Every run starts a new python process which creates TelegramBot and calls get_me against a local fake
+Bot API. Eager imports all bot/modules/*/commands.py before get_me, like load_modules did before manifests;
+modules whose dependencies are not installed are listed and left out of it.
+"""
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+from aiohttp import web
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+CHILD = r"""
+import time
+started = time.perf_counter()
+import asyncio, importlib, json, os, pkgutil, sys
+
+import telebot.asyncio_helper
+telebot.asyncio_helper.API_URL = os.environ["BENCH_API_URL"]
+
+from bot.async_telebot import TelegramBot
+from utils.logging_utils import setup_temp_logger
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+async def main():
+    failed = []
+    if os.environ.get("BENCH_EAGER"):
+        import bot.modules as modules_pkg
+        for _, name, is_pkg in pkgutil.iter_modules(modules_pkg.__path__):
+            if is_pkg:
+                try:
+                    importlib.import_module(f"bot.modules.{name}.commands")
+                except ImportError as e:
+                    failed.append(f"{name} ({e.name})")
+    bot = TelegramBot("123:bench", setup_temp_logger("StartupBench"))
+    await bot.load_bot_info()
+    ready = time.perf_counter() - started
+    await asyncio.sleep(float(os.environ["BENCH_IDLE"]))
+    print(json.dumps({"ready": ready, "rss": rss_mb(), "modules": len(sys.modules), "failed": failed}))
+    await bot.bot.close_session()
+
+asyncio.run(main())
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def get_me(request: web.Request) -> web.Response:
+    return web.json_response({"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Bench",
+                                                     "username": "bench_bot"}})
+
+
+async def start_once(env: dict) -> dict:
+    started = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, "-c", CHILD, cwd=ROOT, env=env,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+    out, _ = await proc.communicate()
+    result = json.loads(out.decode().strip().splitlines()[-1])
+    # with the interpreter start, minus the idle time
+    result["total"] = time.perf_counter() - started - float(env["BENCH_IDLE"])
+    return result
+
+
+async def run(runs: int, idle: float):
+    app = web.Application()
+    app.router.add_route("*", "/bot{token}/getMe", get_me)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = free_port()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    env = {
+        **os.environ,
+        "BENCH_API_URL": f"http://127.0.0.1:{port}/bot{{0}}/{{1}}",
+        "BENCH_IDLE": str(idle),
+        "SETTINGS_BACKEND": os.environ.get("SETTINGS_BACKEND", "local"),
+        "SETTINGS_PATH": os.path.join(tempfile.mkdtemp(), "settings.sqlite"),
+    }
+    env.pop("WEBHOOK_URL", None)
+    try:
+        for label, extra in (("lazy", {}), ("eager", {"BENCH_EAGER": "1"})):
+            results = [await start_once({**env, **extra}) for _ in range(runs)]
+            print(f"{label}: get_me after {statistics.median(r['ready'] for r in results):.2f}s "
+                  f"({statistics.median(r['total'] for r in results):.2f}s with interpreter start), "
+                  f"idle RSS {statistics.median(r['rss'] for r in results):.1f}MB, "
+                  f"{results[0]['modules']} modules imported")
+            if results[0]["failed"]:
+                print(f"  not installed, left out: {', '.join(results[0]['failed'])}")
+    finally:
+        await runner.cleanup()
+
+
+def main(runs: int, idle: float):
+    asyncio.run(run(runs, idle))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3,
+         float(sys.argv[2]) if len(sys.argv) > 2 else 2)
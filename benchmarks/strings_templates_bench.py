@@ -0,0 +1,56 @@
+"""String lookups: formatting on every call (old StringsManager) vs templates compiled at load.
+
+    python benchmarks/strings_templates_bench.py [rounds]
+
+Every string of data/strings is rendered with the args real calls pass, both ways must give the same text.
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from tests.test_strings_templates import bot_strings, old_format
+from utils.strings_manager import Template
+
+
+def measure(label: str, render, calls: list, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for item, args in calls:
+            render(item, args)
+    elapsed = time.perf_counter() - started
+    print(f"  {label}: {elapsed / (rounds * len(calls)) * 1e6:.2f}us per call")
+    return elapsed
+
+
+def compare(title: str, texts: list[str], args_for, rounds: int):
+    calls = [(text, args_for(text)) for text in texts]
+    templates = [(Template(text), args) for text, args in calls]
+    for (text, args), (template, _) in zip(calls, templates):
+        assert old_format(text, args, {}) == template.render(args, {}), text
+    print(f"{title} ({len(calls)} strings)")
+    with contextlib.redirect_stderr(io.StringIO()):
+        old = measure("format", lambda text, args: old_format(text, args, {}), calls, rounds)
+        new = measure("template", lambda template, args: template.render(args, {}), templates, rounds)
+    print(f"  x{old / new:.1f}")
+
+
+def main(rounds: int):
+    texts = bot_strings()
+    plain = [t for t in texts if "%" not in t]
+    formatted = [t for t in texts if "%" in t and Template(t).literals is not None]
+
+    started = time.perf_counter()
+    for text in texts:
+        Template(text)
+    print(f"compile {len(texts)} strings: {(time.perf_counter() - started) * 1e3:.1f}ms")
+
+    compare("plain strings, called with an arg", plain, lambda t: ("Name",), rounds)
+    compare("formatted strings, matching args", formatted, lambda t: ("Name",) * len(Template(t).slots), rounds)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -1,31 +1,54 @@
 import asyncio
+import queue as queue_mod
+import resource
 import signal
 import sys
+import time
 import traceback
 
 import requests
 import telebot.async_telebot
-from telebot.types import Message
+from telebot.types import Message, Update
 
 from bot.command_handler import CommandHandler
-from .utils.bot_utils import is_owner_chat
-from utils import constants
+from bot.update_scheduler import UpdateScheduler
+from bot.webhook_server import WebhookServer
+from .utils.bot_utils import is_owner_chat, governor
+from .utils.progress import ProgressManager
+from utils import constants, load_key
+from utils.http_client import HttpClients
+from utils.redis_utils import RedisClient
+from utils.request_limiter import RequestLimiter
+from utils.user_settings import UserSettings
 
 class TelegramBot:
     def __init__(self, token, logger):
+        self.init_time = time.monotonic()
         self.logger = logger
         self.bot = telebot.async_telebot.AsyncTeleBot(
             token=token,
             parse_mode='HTML'
         )
         self.tasks = []
+        self.main_task = None
         self.stop_flag = False
         self.commands = CommandHandler(self.bot, self.logger)
+        self.scheduler = UpdateScheduler(
+            self.logger,
+            max_concurrency=int(load_key("UPDATE_CONCURRENCY") or 32),
+            shards=int(load_key("UPDATE_SHARDS") or 16),
+            max_pending=int(load_key("UPDATE_QUEUE_LIMIT") or 10000),
+        )
+        self.webhook = self.setup_webhook()
         self.register_handlers()
 
+    def setup_webhook(self) -> WebhookServer | None:
+        return WebhookServer.from_env(self.bot, self.logger)
+
     def register_handlers(self):
         bot = self.bot
         c = self.commands
+        scheduler = self.scheduler
 
         content_types = [
             "text", "audio", "document", "photo",
@@ -34,25 +57,16 @@ class TelegramBot:
         #, "sticker", "location", "contact", "voice", "venue", "poll", "dice"
 
         @bot.message_handler(
-            func=lambda m: (m.any_text or "").startswith("/") and
-                           (m.any_text or "").lstrip('/').split()[0].split('@')[0].lower() in c.cmd_list,
+            func=c.router.classify,
             content_types=content_types
         )
         async def handle_cmd(message: Message):
-            try:
-                await c.handle_message(message)
-            except Exception:
-                self.logger.exception("Exception while handling message")
-
-        @bot.message_handler(
-            func=lambda message: any(pattern.match(str(message.any_text).lower()) for pattern, _ in c.cmd_patterns),
-            content_types=content_types
-        )
-        async def handle_patterns(message: Message):
-            try:
-                await c.handle_message(message)
-            except Exception:
-                self.logger.exception("Exception while handling patterns")
+            async def job():
+                try:
+                    await c.handle_message(message)
+                except Exception:
+                    self.logger.exception("Exception while handling message")
+            scheduler.submit(message.chat.id, job)
 
         @bot.inline_handler(func=lambda query: True)
         async def handle_all_inline(query):
@@ -69,33 +83,44 @@ class TelegramBot:
             ]
         )
         async def handle_any_message(message: Message):
-            try:
-                if is_owner_chat(message) or (message.any_text or "").startswith(f"@{constants.BOT_NAME}"):
+            if not is_owner_chat(message) and not (message.any_text or "").startswith(f"@{constants.BOT_NAME}"):
+                return
+
+            async def job():
+                try:
                     await c.handle_any_message(message)
-            except Exception:
-                self.logger.exception("Exception while handling message")
+                except Exception:
+                    self.logger.exception("Exception while handling message")
+            scheduler.submit(message.chat.id, job)
 
         @bot.callback_query_handler(func=lambda call: True)
         async def handle_all_callback(call):
-            try:
-                err = await c.handle_callback(call)
-            except Exception as e:
-                err = f"{e}"
-                self.logger.exception("Exception while handling inline")
-            if err is not None:
+            async def job():
                 try:
-                    await bot.answer_callback_query(call.id, err or "", show_alert=False, cache_time=0)
-                except Exception:
-                    pass
-
-    async def start_polling(self) -> None:
-        self.logger.info("Starting bot polling...")
-
+                    err = await c.handle_callback(call)
+                except Exception as e:
+                    err = f"{e}"
+                    self.logger.exception("Exception while handling inline")
+                if err is not None:
+                    try:
+                        await bot.answer_callback_query(call.id, err or "", show_alert=False, cache_time=0)
+                    except Exception:
+                        pass
+            # callbacks from inline messages have no message, they are ordered per user
+            scheduler.submit(call.message.chat.id if call.message else call.from_user.id, job)
+
+    async def load_bot_info(self) -> None:
         bot_info = await self.bot.get_me()
         if bot_info and bot_info.username:
-            import utils.constants as constants
             constants.BOT_NAME = bot_info.username
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.logger.info(f"Bot ready in {time.monotonic() - self.init_time:.2f}s, max RSS {max_rss:.1f} MB")
+
+    async def start_polling(self) -> None:
+        self.logger.info("Starting bot polling...")
 
+        await self.load_bot_info()
+        await self.bot.delete_webhook()
 
         while not self.stop_flag:
             try:
@@ -108,6 +133,34 @@ class TelegramBot:
                 await asyncio.sleep(5)
 
 
+    async def start_webhook(self) -> None:
+        self.logger.info("Starting bot webhook...")
+
+        await self.load_bot_info()
+        await self.webhook.start()
+
+        while not self.stop_flag:
+            await asyncio.sleep(1)
+
+    async def start_shard(self, queue) -> None:
+        self.logger.info("Starting bot shard...")
+
+        await self.load_bot_info()
+        loop = asyncio.get_running_loop()
+
+        while not self.stop_flag:
+            try:
+                # short timeout, so a blocked executor thread does not hold up the exit
+                update = await loop.run_in_executor(None, queue.get, True, 1)
+            except queue_mod.Empty:
+                continue
+            if update is None:
+                break
+            try:
+                await self.bot.process_new_updates([Update.de_json(update)])
+            except Exception as e:
+                self.logger.error(f"Bot shard error: {e}\n{traceback.format_exc()}")
+
     async def stop_polling(self) -> None:
         self.bot._polling = False
         await self.bot.close_session()
@@ -120,34 +173,53 @@ class TelegramBot:
                     await task
                 except asyncio.CancelledError:
                     pass
+        if self.webhook:
+            await self.webhook.stop()
+        await self.scheduler.stop()
+        await governor.stop()
+        await HttpClients().close()
+        await UserSettings().close()
+        await RedisClient.shutdown()
         await self.stop_polling()
 
-    def graceful_exit(self, signum=None, frame=None) -> None:
+    def graceful_exit(self, signum=None) -> None:
         self.logger.info(f"Received signal {signum}, stopping bot gracefully...")
         self.stop_flag = True
+        self.bot._polling = False
+        if self.main_task and not self.main_task.done():
+            self.main_task.cancel()
 
+    def run(self, queue=None):
         try:
-            loop = asyncio.get_running_loop()
-            loop.create_task(self.stop_tasks())
-        except RuntimeError:
-            asyncio.run(self.stop_tasks())
-
-        sys.exit(0)
-
-    def run(self):
-        signal.signal(signal.SIGINT, self.graceful_exit)
-        signal.signal(signal.SIGTERM, self.graceful_exit)
-        try:
-            asyncio.run(self._run())
-        except (KeyboardInterrupt, SystemExit):
+            asyncio.run(self._run(queue))
+        except KeyboardInterrupt:
             self.logger.info("Bot stopped by keyboard interrupt")
-            asyncio.run(self.stop_polling())
         except Exception as e:
             self.logger.critical(f"Fatal error: {e}\n{traceback.format_exc()}")
             sys.exit(1)
 
-    async def _run(self):
-        await asyncio.gather(
-            self.start_polling(),
-            return_exceptions=True
-        )
\ No newline at end of file
+    async def _run(self, queue=None):
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self.graceful_exit, signum)
+        self.tasks.append(asyncio.create_task(self.scheduler.stats_loop()))
+        self.tasks.append(asyncio.create_task(governor.stats_loop()))
+        self.tasks.append(asyncio.create_task(ProgressManager().stats_loop()))
+        self.tasks.append(asyncio.create_task(HttpClients().stats_loop()))
+        self.tasks.append(asyncio.create_task(RequestLimiter().stats_loop()))
+        self.tasks.append(asyncio.create_task(UserSettings().sync_loop()))
+        await HttpClients().start()
+        if queue is not None:
+            start = self.start_shard(queue)
+        elif self.webhook:
+            start = self.start_webhook()
+        else:
+            start = self.start_polling()
+        self.main_task = asyncio.create_task(start)
+        try:
+            await self.main_task
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await self.stop_tasks()
+        self.logger.info("Bot stopped")
\ No newline at end of file
@@ -1,6 +1,5 @@
 import pkgutil
 import importlib
-import time
 import traceback
 from logging import Logger
 
@@ -8,9 +7,15 @@ from telebot.async_telebot import AsyncTeleBot
 from telebot.types import InlineQuery, Message, InlineQueryResultArticle, InputTextMessageContent, CallbackQuery, \
     InlineQueryResultsButton
 
+from utils.job_queue import JobQueue
+from utils.redis_utils import RedisClient
 from utils.strings_manager import StringsManager
 
-from utils import constants
+from utils import constants, load_key
+from .command_router import CommandRouter
+from .inline_index import InlineIndex
+from .lazy_commands import LazyCommands
+from .message_features import extract_features
 from .utils import bot_utils
 
 
@@ -23,61 +28,110 @@ class CommandHandler:
         self.cmd_patterns = []  # [(pattern, module_instance)]
         self.inline_handlers = []  # [module_instance]
         self.any_message_handlers = []  # [module_instance]
+        self.any_message_routes = {}  # { frozenset(features): [module_instance] }
         self.callback_handlers = []  # [module_instance]
+        self.router = CommandRouter()
+        self.job_commands = set()  # commands executed by job workers
         self.strings = StringsManager()
+        self.jobs = self.setup_jobs()
         self.load_modules()
+        self.inline_index = InlineIndex(self.strings, self.cmd_list_module)
+        self.inline_index.build()
 
     def load_modules(self):
         import bot.modules as modules_pkg
         for loader, name, is_pkg in pkgutil.iter_modules(modules_pkg.__path__):
+            if not is_pkg:
+                continue
             module = importlib.import_module(f"bot.modules.{name}")
-            if hasattr(module, "Commands"):
-                if name == "base":
-                    instance = module.Commands(self.bot, handler=self)
-                else:
-                    instance = module.Commands(self.bot)
-                for cmd in getattr(instance, "cmd_list", {}):
-                    self.cmd_list[cmd] = instance
-                    self.cmd_list_module[cmd] = name
-                for pat in getattr(instance, "cmd_patterns", []):
-                    self.cmd_patterns.append((pat, instance))
-                if hasattr(instance, "handle_inline") and callable(instance.handle_inline):
-                    self.inline_handlers.append(instance)
-                if hasattr(instance, "handle_any_message") and callable(instance.handle_any_message):
-                    self.any_message_handlers.append(instance)
-                if hasattr(instance, "handle_callback") and callable(instance.handle_callback):
-                    self.callback_handlers.append(instance)
+            if manifest := getattr(module, "MANIFEST", None):
+                self.register_module(name, LazyCommands(self.bot, name, manifest, handler=self), manifest.get("handlers", []))
+                self.job_commands.update(manifest.get("jobs", []))
+            elif hasattr(module, "Commands"):
+                instance = module.Commands(self.bot, handler=self)
+                handlers = [h for h in ("inline", "any_message", "callback")
+                            if callable(getattr(instance, f"handle_{h}", None))]
+                self.register_module(name, instance, handlers)
+        self.any_message_handlers.sort(key=lambda h: getattr(h, "order", 0))
+        self.any_message_routes = {}
+        self.router.compile()
+
+    def register_module(self, name: str, instance, handlers: list[str]):
+        cmd_func = getattr(instance, "_cmd_func", {})
+        for cmd in getattr(instance, "cmd_list", {}):
+            self.cmd_list[cmd] = instance
+            self.cmd_list_module[cmd] = name
+            self.router.add_command(cmd, instance, cmd_func.get(cmd))
+        cmd_func_pattern = getattr(instance, "_cmd_func_pattern", {})
+        for pat in getattr(instance, "cmd_patterns", []):
+            self.cmd_patterns.append((pat, instance))
+            self.router.add_pattern(pat, instance, cmd_func_pattern.get(pat))
+        if "inline" in handlers:
+            self.inline_handlers.append(instance)
+        if "any_message" in handlers:
+            self.any_message_handlers.append(instance)
+        if "callback" in handlers:
+            self.callback_handlers.append(instance)
+
+    def setup_jobs(self) -> JobQueue | None:
+        if not load_key("JOB_QUEUE"):
+            return None
+        redis = RedisClient()
+        return JobQueue(redis.host, redis.port, redis.db, logger=self.bot_logger)
+
+    async def enqueue_job(self, message: Message, module_name: str, command: str, pattern: str = None) -> bool:
+        try:
+            await self.jobs.enqueue({
+                "module": module_name,
+                "command": command,
+                "pattern": pattern,
+                "message": message.json,
+            })
+            return True
+        except Exception as e:
+            self.bot_logger.error(f"Cant enqueue /{command} job, running locally: {e}")
+            return False
+
+    async def enqueue_command(self, message: Message, module_name: str, command: str) -> bool:
+        # plain messages (links, videos) run on job workers like the same command would
+        if not self.jobs or command not in self.job_commands:
+            return False
+        return await self.enqueue_job(message, module_name, command)
+
+    async def resolve_langs(self, message: Message):
+        await self.strings.resolve_langs(message.chat.id, message.from_user.id if message.from_user else None)
 
     async def handle_message(self, message: Message):
-        text = message.any_text.lower()
-        cmd = text.split(" ")[0] if " " in text else text
-        if "\n" in cmd: cmd = cmd.split("\n")[0]
-        if "@" in cmd:
-            b_name = cmd.split("@")[1]
-            cmd = cmd.split("@")[0]
-            if b_name.lower() != constants.BOT_NAME:
-                return
-        cmd = cmd.strip("/")
-        if cmd in self.cmd_list:
-            await self.cmd_list[cmd].make_command(message, command=cmd)
+        route = self.router.classify(message)
+        if not route:
             return
-
-        for pattern, instance in self.cmd_patterns:
-            if pattern.match(text):
-                await instance.make_command(message, command=cmd)
+        if route.bot_name and route.bot_name != constants.BOT_NAME.lower():
+            return
+        if (self.jobs and route.command in self.job_commands and
+                await self.enqueue_job(message, route.instance.module_name, route.command, route.pattern)):
+            return
+        await self.resolve_langs(message)
+        await route.instance.make_command(message, command=route.command, func=route.func, pattern=route.pattern)
+
+    def get_any_message_handlers(self, features: frozenset[str]) -> list:
+        handlers = self.any_message_routes.get(features)
+        if handlers is None:
+            handlers = [
+                h for h in self.any_message_handlers
+                if getattr(h, "features", None) is None or h.features & features
+            ]
+            self.any_message_routes[features] = handlers
+        return handlers
 
     async def handle_any_message(self, message: Message):
-        handlers = sorted(
-            self.any_message_handlers,
-            key=lambda h: getattr(h, "order", 0),
-            reverse=False
-        )
-        for instance in handlers:
+        await self.resolve_langs(message)
+        for instance in self.get_any_message_handlers(extract_features(message)):
             handled = await instance.handle_any_message(message)
             if handled: return
         await bot_utils.try_reaction(bot=self.bot, message=message, reaction="😡")
 
     async def handle_inline(self, query: InlineQuery):
+        await self.strings.resolve_langs(query.from_user.id)
         text = query.query.strip()
         r_list = []
         if not text.startswith("/"):
@@ -87,42 +141,30 @@ class CommandHandler:
                     r_list = handled_list
                     break
 
+        lang = self.strings.get_cur_lang(query.from_user.id)
         if text and not r_list:
             thumb_cmd = constants.THUMB_DEF
-            for cmd in self.cmd_list.keys():
-                check_title = text != "/" and (cmd.startswith(text) or f"/{cmd}".startswith(text))
-
-                module = self.cmd_list_module.get(cmd, '')
-
-                _desc = self.strings.get(f"{module}_desc_{cmd}", query.from_user.id)
-                if not _desc: continue
-                check_desc = len(text) > 3 and f" {text}" in f" {_desc}"
-
-                _tags = self.strings.get(f"{module}_tags_{cmd}", query.from_user.id)
-                _tags += ", " + self.strings.get_with_lang(f"{module}_tags_{cmd}", query.from_user.id, "en")
-                check_tags = len(text) > 3 and f", {text}" in f", {_tags} "
-
-                if check_title or check_desc or check_tags:
-                    title = f"/help_{cmd}"
-                    r_list.append(
-                        InlineQueryResultArticle(
-                            id=len(r_list) + 1,
-                            title=title,
-                            description=_desc,
-                            thumbnail_url=thumb_cmd,
-                            input_message_content=InputTextMessageContent(
-                                message_text=f"/help_{cmd}@{constants.BOT_NAME}",
-                                parse_mode="HTML",
-                                disable_web_page_preview=True
-                            )
+            for cmd, _desc in self.inline_index.search(text, lang):
+                title = f"/help_{cmd}"
+                r_list.append(
+                    InlineQueryResultArticle(
+                        id=len(r_list) + 1,
+                        title=title,
+                        description=_desc,
+                        thumbnail_url=thumb_cmd,
+                        input_message_content=InputTextMessageContent(
+                            message_text=f"/help_{cmd}@{constants.BOT_NAME}",
+                            parse_mode="HTML",
+                            disable_web_page_preview=True
                         )
                     )
+                )
         if not text or not r_list:
             thumb = constants.THUMB_SEARCH
             r_list.append(
                 InlineQueryResultArticle(
                     id=len(r_list) + 1,
-                    title=f"🔎 {self.strings.get('enter_command', query.from_user.id)}",
+                    title=f"🔎 {self.strings.get_with_lang('enter_command', lang=lang)}",
                     description="/help",
                     thumbnail_url=thumb,
                     input_message_content=InputTextMessageContent(
@@ -156,7 +198,7 @@ class CommandHandler:
             await self.bot.answer_inline_query(
                 query.id, r_list, cache_time=1,
                 button=InlineQueryResultsButton(
-                    text=self.strings.get('ads', query.from_user.id),
+                    text=self.strings.get_with_lang('ads', lang=lang),
                     # web_app=WebAppInfo(
                     #     url=f"https://is.gd/6xzvYw",
                     # )
@@ -168,16 +210,14 @@ class CommandHandler:
         return True
 
     async def handle_callback(self, call: CallbackQuery) -> str | None:
-        user_id = call.message.chat.id
-        hist = bot_utils.hist_user_timecall.setdefault(user_id, {})
-        cur_time = int(time.time() * 1000)
-        if t_block := bot_utils.check_flood(user_id):
-            return self.strings.get("wait_sec", call.message.chat.id, t_block)
-        if (cur_time - hist.get(call.data, 0)) < 500:
-            bot_utils.block_flood(user_id, 1000)
-            return self.strings.get("wait_sec", call.message.chat.id, bot_utils.check_flood(user_id))
-        hist[call.data] = cur_time
-        if call.data == "delete":
+        user_id = call.message.chat.id if call.message else call.from_user.id
+        await self.strings.resolve_langs(user_id, call.from_user.id)
+        if t_block := await bot_utils.check_flood(user_id):
+            return self.strings.get("wait_sec", user_id, t_block)
+        if await bot_utils.repeated_call(user_id, call.data):
+            await bot_utils.block_flood(user_id, 1000)
+            return self.strings.get("wait_sec", user_id, await bot_utils.check_flood(user_id))
+        if call.data == "delete" and call.message:
             await bot_utils.try_delete(self.bot, message=call.message)
             return None
         for instance in self.callback_handlers:
@@ -0,0 +1,66 @@
+import re
+from typing import Callable, NamedTuple
+
+from telebot.types import Message
+
+
+class Route(NamedTuple):
+    command: str
+    instance: object
+    func: Callable | None
+    bot_name: str = ""
+    pattern: str = ""
+
+
+_UNSET = object()
+
+
+class CommandRouter:
+    def __init__(self):
+        self.commands = {}  # { "command_name": Route }
+        self.patterns = []  # [(pattern, module_instance, func)]
+        self._pattern = None
+
+    def add_command(self, cmd: str, instance, func: Callable = None):
+        self.commands.setdefault(cmd, Route(cmd, instance, func))
+
+    def add_pattern(self, pattern: re.Pattern, instance, func: Callable = None):
+        self.patterns.append((pattern, instance, func))
+        self._pattern = None
+
+    def compile(self) -> re.Pattern | None:
+        # all patterns in one alternation, group "p{N}" points to self.patterns[N]
+        if self.patterns:
+            self._pattern = re.compile(
+                "|".join(f"(?P<p{i}>{p.pattern})" for i, (p, _, _) in enumerate(self.patterns)),
+                re.IGNORECASE
+            )
+        return self._pattern
+
+    @staticmethod
+    def parse_command(text: str) -> tuple[str, str]:
+        head = text.split(maxsplit=1)[0].lower() if text.strip() else ""
+        cmd, _, b_name = head.partition("@")
+        return cmd.strip("/"), b_name
+
+    def classify(self, message: Message) -> Route | None:
+        # the filter and the handler both ask, the result (also a miss) is kept on the message
+        if (route := getattr(message, "route", _UNSET)) is not _UNSET:
+            return route
+        text = message.any_text or ""
+        route = None
+        if text.startswith("/"):
+            cmd, b_name = self.parse_command(text)
+            if (route := self.commands.get(cmd)) is not None:
+                if b_name:
+                    route = Route(cmd, route.instance, route.func, b_name)
+            else:
+                if self._pattern is None:
+                    self.compile()
+                # patterns are compiled with IGNORECASE, the text is not lowered
+                m = self._pattern.match(text) if self._pattern else None
+                if m and m.lastgroup:
+                    pattern, instance, func = self.patterns[int(m.lastgroup[1:])]
+                    route = Route(cmd, instance, func, b_name, pattern.pattern)
+        message.route = route
+        return route
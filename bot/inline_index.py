@@ -0,0 +1,73 @@
+from utils.strings_manager import StringsManager
+
+MAX_PREFIX = 16
+MIN_TEXT_PREFIX = 4
+
+
+class InlineIndex:
+    def __init__(self, strings: StringsManager, cmd_list_module: dict):
+        self.strings = strings
+        self.cmd_list_module = cmd_list_module  # { "command_name": "module_name" }
+        self.version = None
+        self.by_lang = {}  # { lang: (entries, title_index, text_index) }
+
+    def build(self):
+        self.by_lang = {}
+        for lang in self.strings.strings_by_lang.keys():
+            entries = []  # [(cmd, desc, tags)]
+            title_index = {}  # { "/he": [entry_idx] }
+            text_index = {}  # { "down": [entry_idx] }
+            for cmd, module in self.cmd_list_module.items():
+                desc_key = f"{module}_desc_{cmd}"
+                if not self.strings.has(desc_key, lang):
+                    continue
+                desc = self.strings.get_with_lang(desc_key, lang=lang)
+                if not desc: continue
+                tags_key = f"{module}_tags_{cmd}"
+                tags = self.strings.get_with_lang(tags_key, lang=lang)
+                tags += ", " + self.strings.get_with_lang(tags_key, lang="en")
+
+                idx = len(entries)
+                entries.append((cmd, desc, tags))
+                for name in (cmd, f"/{cmd}"):
+                    for k in range(1, len(name) + 1):
+                        self._add(title_index, name[:k], idx)
+                # query matches from the start of a description word or of a tag
+                self._add_words(text_index, desc, " ", idx)
+                self._add_words(text_index, tags + " ", ", ", idx)
+            self.by_lang[lang] = (entries, title_index, text_index)
+        self.version = self.strings.version
+
+    @staticmethod
+    def _add(index: dict, key: str, idx: int):
+        items = index.setdefault(key, [])
+        if not items or items[-1] != idx:
+            items.append(idx)
+
+    def _add_words(self, index: dict, text: str, sep: str, idx: int):
+        start = 0
+        while start < len(text):
+            for k in range(MIN_TEXT_PREFIX, min(MAX_PREFIX, len(text) - start) + 1):
+                self._add(index, text[start:start + k], idx)
+            pos = text.find(sep, start)
+            if pos < 0:
+                break
+            start = pos + len(sep)
+
+    def search(self, text: str, lang: str = None) -> list[tuple[str, str]]:
+        if self.version != self.strings.version:
+            self.build()
+        entries, title_index, text_index = self.by_lang.get(lang) or self.by_lang.get(None) or ([], {}, {})
+
+        found = set()
+        if text != "/":
+            found.update(title_index.get(text, ()))
+        if len(text) >= MIN_TEXT_PREFIX:
+            if len(text) <= MAX_PREFIX:
+                found.update(text_index.get(text, ()))
+            else:
+                found.update(
+                    i for i, (_, desc, tags) in enumerate(entries)
+                    if f" {text}" in f" {desc}" or f", {text}" in f", {tags} "
+                )
+        return [(entries[i][0], entries[i][1]) for i in sorted(found)]
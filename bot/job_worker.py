@@ -0,0 +1,77 @@
+import asyncio
+import importlib
+import signal
+import sys
+import traceback
+
+import telebot.async_telebot
+from telebot.types import Message
+
+from bot.lazy_commands import LazyCommands
+from utils import constants, load_key
+from utils.http_client import HttpClients
+from utils.job_queue import JobQueue
+from utils.redis_utils import RedisClient
+from utils.strings_manager import StringsManager
+from utils.user_settings import UserSettings
+
+
+class JobWorker:
+    def __init__(self, token, logger):
+        self.logger = logger
+        self.bot = telebot.async_telebot.AsyncTeleBot(
+            token=token,
+            parse_mode='HTML'
+        )
+        redis = RedisClient()
+        self.queue = JobQueue(redis.host, redis.port, redis.db, logger=self.logger,
+                              retry_delay=float(load_key("JOB_RETRY_DELAY") or 10))
+        self.concurrency = int(load_key("JOB_CONCURRENCY") or 2)
+        self.modules = {}  # { "module_name": LazyCommands }
+
+    def get_module(self, name: str) -> LazyCommands:
+        if name not in self.modules:
+            module = importlib.import_module(f"bot.modules.{name}")
+            self.modules[name] = LazyCommands(self.bot, name, module.MANIFEST)
+        return self.modules[name]
+
+    async def handle_job(self, job: dict):
+        message = Message.de_json(job["message"])
+        instance = self.get_module(job["module"])
+        self.logger.info(f"Job /{job['command']} from [{message.chat.id}]")
+        await StringsManager().resolve_langs(message.chat.id, message.from_user.id if message.from_user else None)
+        # network failures go back to the queue, the user gets the error after the last retry
+        final = job.get("attempt", 0) >= self.queue.max_retries
+        await instance.make_command(message, command=job["command"], pattern=job.get("pattern") or None,
+                                    raise_errors=not final)
+
+    async def _run(self):
+        bot_info = await self.bot.get_me()
+        if bot_info and bot_info.username:
+            constants.BOT_NAME = bot_info.username
+        self.logger.info(f"Job worker {self.queue.consumer_name()} started, concurrency {self.concurrency}")
+        loop = asyncio.get_running_loop()
+        main_task = asyncio.current_task()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, main_task.cancel)
+        settings_sync = asyncio.create_task(UserSettings().sync_loop())
+        try:
+            await self.queue.consume(self.handle_job, concurrency=self.concurrency)
+        except asyncio.CancelledError:
+            self.logger.info("Job worker stopping...")
+        finally:
+            settings_sync.cancel()
+            await self.queue.close()
+            await HttpClients().close()
+            await UserSettings().close()
+            await RedisClient.shutdown()
+            await self.bot.close_session()
+
+    def run(self):
+        try:
+            asyncio.run(self._run())
+        except (KeyboardInterrupt, SystemExit):
+            self.logger.info("Job worker stopped")
+        except Exception as e:
+            self.logger.critical(f"Fatal error: {e}\n{traceback.format_exc()}")
+            sys.exit(1)
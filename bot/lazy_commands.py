@@ -0,0 +1,62 @@
+import importlib
+import re
+
+from telebot.async_telebot import AsyncTeleBot
+from telebot.types import Message, InlineQuery, CallbackQuery
+
+
+class LazyCommands:
+    # stands in for module Commands, real class is imported on first use
+    def __init__(self, bot: AsyncTeleBot, name: str, manifest: dict, handler=None):
+        self.bot = bot
+        self.module_name = name
+        self.handler = handler
+        self.cmd_list = list(manifest.get("commands", []))
+        self.cmd_patterns = [re.compile(p, re.IGNORECASE) for p in manifest.get("patterns", [])]
+        self.handlers = set(manifest.get("handlers", []))
+        # message features required by handle_any_message, None means any message
+        self.features = frozenset(manifest["features"]) if "features" in manifest else None
+        self.order = manifest.get("order", 0)
+        self._instance = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+    @property
+    def instance(self):
+        if self._instance is None:
+            module = importlib.import_module(f"bot.modules.{self.module_name}.commands")
+            instance = module.Commands(self.bot, handler=self.handler)
+            self.check_manifest(instance)
+            self._instance = instance
+        return self._instance
+
+    def check_manifest(self, instance):
+        # the manifest repeats the Commands lists by hand, a mismatch would route commands wrongly
+        name = self.module_name
+        errors = []
+        if list(instance.cmd_list) != self.cmd_list:
+            errors.append(f"commands {self.cmd_list} != {list(instance.cmd_list)}")
+        patterns = [p.pattern for p in instance.cmd_patterns]
+        if patterns != [p.pattern for p in self.cmd_patterns]:
+            errors.append(f"patterns {[p.pattern for p in self.cmd_patterns]} != {patterns}")
+        handlers = {h for h in ("inline", "any_message", "callback") if callable(getattr(instance, f"handle_{h}", None))}
+        if handlers != self.handlers:
+            errors.append(f"handlers {sorted(self.handlers)} != {sorted(handlers)}")
+        if errors:
+            raise RuntimeError(f"{name} MANIFEST does not match its Commands: {'; '.join(errors)}")
+
+    async def make_command(self, message: Message, command: str = None, func=None, pattern: str = None,
+                           raise_errors: bool = False):
+        await self.instance.make_command(message, command=command, func=func, pattern=pattern,
+                                         raise_errors=raise_errors)
+
+    async def handle_inline(self, query: InlineQuery) -> list:
+        return await self.instance.handle_inline(query)
+
+    async def handle_any_message(self, message: Message) -> bool:
+        return await self.instance.handle_any_message(message)
+
+    async def handle_callback(self, call: CallbackQuery) -> str | bool:
+        return await self.instance.handle_callback(call)
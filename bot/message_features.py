@@ -0,0 +1,54 @@
+import re
+
+from telebot.types import Message
+
+from utils import constants
+from utils.utils import extract_urls
+
+TEXT = "text"
+URLS = "urls"
+DIGITS = "digits"
+VIDEO = "video"
+AUDIO = "audio"
+CONTACT = "contact"
+REPLY = "reply"
+FORWARD = "forward"
+
+_digit_pattern = re.compile(r"\d")
+
+
+def _has_video(m: Message) -> bool:
+    if not m: return False
+    return bool(m.video or (m.document and (m.document.mime_type or "").startswith("video/")))
+
+
+def _has_audio(m: Message) -> bool:
+    if not m: return False
+    return bool(m.audio or (m.document and (m.document.mime_type or "").startswith("audio/")))
+
+
+def extract_features(message: Message) -> frozenset[str]:
+    features = set()
+    text = message.any_text or ""
+    if constants.BOT_NAME and text.startswith(f"@{constants.BOT_NAME}"):
+        text = text.split(f"@{constants.BOT_NAME}", 1)[1]
+    reply = message.reply_to_message
+    reply_text = (reply.any_text or "") if reply else ""
+
+    if text.strip():
+        features.add(TEXT)
+    if extract_urls(text) or extract_urls(reply_text):
+        features.add(URLS)
+    if _digit_pattern.search(text):
+        features.add(DIGITS)
+    if _has_video(message) or _has_video(reply):
+        features.add(VIDEO)
+    if _has_audio(message) or _has_audio(reply):
+        features.add(AUDIO)
+    if message.contact:
+        features.add(CONTACT)
+    if reply:
+        features.add(REPLY)
+    if message.forward_from or message.forward_from_chat:
+        features.add(FORWARD)
+    return frozenset(features)
@@ -1 +1,10 @@
-from .commands import Commands
\ No newline at end of file
+MANIFEST = {
+    "commands": ["ai", "help_ai"],
+    "patterns": [
+        r"^/ai(?:@\w+)?",
+        r"^/help_(ai)(?:@\w+)?",
+    ],
+    "handlers": ["any_message"],
+    "features": ["text", "reply"],
+    "order": 99999,
+}
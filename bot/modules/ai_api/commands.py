@@ -1,11 +1,13 @@
 import re
+from functools import partial
 
 from telebot.async_telebot import AsyncTeleBot
 from telebot.types import Message
 
 from bot.command_handler import CommandHandler
 from bot.utils import bot_utils
-from utils import constants
+from bot.utils.progress import ProgressManager
+from utils import constants, load_key
 from utils.request_limiter import RequestLimiter
 from ..base_commands import BaseCommands
 from .utils import *
@@ -45,12 +47,12 @@ class Commands(BaseCommands):
         if not text:
             raise ValueError("empty query")
 
-        sticker = constants.STICKER_THINKS
-        st_loading = await bot_utils.try_sticker(self.bot, sticker, message=message, reply_to_message_id=message.message_id)
+        progress = ProgressManager().create(self.bot, message, action="typing", sticker=constants.STICKER_THINKS)
+        await progress.start()
 
         wait_msg: Message | None = None
         async def handle_response(result):
-            await bot_utils.try_delete(self.bot, message=st_loading)
+            await progress.stop()
             if not isinstance(result, dict):
                 text_result = f"⚠️ ERROR: {result}"
             else:
@@ -76,22 +78,25 @@ class Commands(BaseCommands):
 
         # queue_name = "apifreellm.com"
         # limiter.set_rate_limit(queue_name, 5)
-        # f = apifreellm_com(text)
+        # f = partial(apifreellm_com, text)
 
         queue_name = "cerebras_ai"
         limiter.set_rate_limit(queue_name, 2)
         lang_str = self.strings.get("lang_name", message.chat.id).replace("🤡", "")
-        f = cerebras_ai(msgs, message.chat.id, lang=lang_str, is_help=is_help)
+        f = partial(cerebras_ai, msgs, message.chat.id, lang=lang_str, is_help=is_help)
         api_keys = load_keys("CEREBRAS_TOKENS")
         if not api_keys:
             raise ValueError("Invalid API key")
+        # requests per minute allowed for one key, shared by all bot replicas with LIMITER_BACKEND=redis
+        limiter.set_quota(queue_name, int(load_key("CEREBRAS_RPM") or 0) * len(api_keys), burst=len(api_keys))
 
         task_id = await limiter.run(
             name=queue_name,
             proxy="",
             user_id=message.chat.id,
             coro=f,
-            callback=handle_response
+            callback=handle_response,
+            weight_class=bot_utils.chat_class(message),
         )
 
         queue_pos, queue_len = limiter.get_task_position(task_id)
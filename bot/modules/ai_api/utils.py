@@ -1,11 +1,8 @@
-import ssl
 import traceback
 from itertools import cycle
 
-import aiohttp
-import certifi
-
 from utils import load_keys
+from utils.http_client import HttpClients, GROUP_AI
 
 
 async def apifreellm_com(msg: str) -> dict:
@@ -14,17 +11,16 @@ async def apifreellm_com(msg: str) -> dict:
     msg = msg.replace("\n\n", "\n").strip()
     msg += f"\n[text format with emoji]"
     try:
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
-            async with session.post(api_url, ssl=ssl_context, json={"message": msg}) as resp:
-                if resp.status != 200:
-                    result["error"] = f"HTTP {resp.status}"
-                    return result
-                try:
-                    data = await resp.json()
-                except Exception:
-                    result["error"] = "Invalid JSON response"
-                    return result
+        session = HttpClients().get(GROUP_AI)
+        async with session.post(api_url, json={"message": msg}) as resp:
+            if resp.status != 200:
+                result["error"] = f"HTTP {resp.status}"
+                return result
+            try:
+                data = await resp.json()
+            except Exception:
+                result["error"] = "Invalid JSON response"
+                return result
         if "error" in data:
             result["error"] = data["error"]
             return result
@@ -87,19 +83,16 @@ async def cerebras_ai(msgs: list[str], user, lang: str = None, is_help: bool = F
         "seed": -1
     }
     try:
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
-            async with session.post(
-                    api_url, json=payload, headers=headers, ssl=ssl_context,
-            ) as resp:
-                data = {"error": ""}
-                if resp.status != 200:
-                    data["error"] = f"HTTP {resp.status}"
-                else:
-                    try:
-                        data = await resp.json()
-                    except Exception:
-                        data["error"] = "Invalid JSON response"
+        session = HttpClients().get(GROUP_AI)
+        async with session.post(api_url, json=payload, headers=headers) as resp:
+            data = {"error": ""}
+            if resp.status != 200:
+                data["error"] = f"HTTP {resp.status}"
+            else:
+                try:
+                    data = await resp.json()
+                except Exception:
+                    data["error"] = "Invalid JSON response"
         if "error" in data and data["error"]:
             result["error"] = data["error"]
             return result
@@ -1 +1,10 @@
-from .commands import Commands
\ No newline at end of file
+MANIFEST = {
+    "commands": ["help", "start", "contacts", "mp3", "audio", "help_mp3", "logs"],
+    "patterns": [
+        r"^/help(?:@\w+)?",
+        r"^/(audio|mp3)(?:@\w+)?",
+        r"^/help_(audio|mp3)(?:@\w+)?",
+    ],
+    "handlers": ["callback"],
+    "jobs": ["mp3", "audio"],
+}
@@ -9,6 +9,7 @@ from telebot.types import Message, InlineKeyboardMarkup, CallbackQuery, InlineKe
 
 from bot.command_handler import CommandHandler
 from bot.utils import bot_utils
+from bot.utils.progress import ProgressManager
 from ..base_commands import BaseCommands
 from .strings import *
 from utils.utils import video_to_audio_bytes
@@ -43,10 +44,10 @@ class Commands(BaseCommands):
 
         is_person = message.chat.id == message.from_user.id
         lang = (message.from_user.language_code if is_person else None) or ""
-        def_lang = self.settings.get_user_lang(message.chat.id)
+        def_lang = self.strings.get_cur_lang(message.chat.id)
         smb = "🇺🇦" if str(lang).lower() in ["ru", "uk"] or str(def_lang).lower() in ["ru", "uk"] else ""
         if not def_lang:
-            self.settings.set_user_lang(message.chat.id, (lang or "en").lower())
+            await self.strings.set_user_lang(message.chat.id, (lang or "en").lower())
             pre_w = WELCOME_PERSON if is_person else WELCOME_CHAT
             full_name = f"{message.from_user.first_name or ''} {message.from_user.last_name or ''}".strip()
             name = full_name if is_person else message.chat.title
@@ -139,7 +140,7 @@ class Commands(BaseCommands):
             )
         elif key.startswith("setlang_"):
             lang = key.split("_")[1].strip().lower()
-            self.settings.set_user_lang(call.message.chat.id, (lang or "en").lower())
+            await self.strings.set_user_lang(call.message.chat.id, (lang or "en").lower())
             await self._send_start(call.message, True)
             return True
         elif key == "change_lang":
@@ -189,8 +190,9 @@ class Commands(BaseCommands):
         video_file = _extract_video(message) or _extract_video(message.reply_to_message)
         if not video_file:
             raise ValueError("video not founded")
-        st_loading = await bot_utils.try_sticker(self.bot, constants.STICKER_MUSIC, message=message,
-                                                 reply_to_message_id=message.message_id)
+        progress = ProgressManager().create(
+            self.bot, message, action="upload_voice", sticker=constants.STICKER_MUSIC)
+        await progress.start()
         try:
             file_info = await self.bot.get_file(video_file.file_id)
             _bytes = await self.bot.download_file(file_info.file_path)
@@ -204,13 +206,13 @@ class Commands(BaseCommands):
         except Exception as e:
             raise ValueError(str(e))
         finally:
-            await bot_utils.try_delete(self.bot, message=st_loading)
+            await progress.stop()
 
     async def _send_logs(self, message: Message):
         if not str(message.chat.id) in load_keys("OWNER_IDS"): return
-        st_loading = await bot_utils.try_sticker(
-            self.bot, constants.STICKER_LOADING, message=message,
-            reply_to_message_id=message.message_id)
+        progress = ProgressManager().create(
+            self.bot, message, action="upload_document", sticker=constants.STICKER_LOADING)
+        await progress.start()
         output_file = os.path.join(logging_utils.DIR_LOGS, "logs.zip")
         try:
             log_files = [os.path.join(logging_utils.DIR_LOGS, f) for f in os.listdir(logging_utils.DIR_LOGS) if f.endswith('.log')]
@@ -225,4 +227,4 @@ class Commands(BaseCommands):
             await self.bot.send_message(message.chat.id, str(e))
         finally:
             os.remove(output_file)
-            await bot_utils.try_delete(self.bot, message=st_loading)
\ No newline at end of file
+            await progress.stop()
\ No newline at end of file
@@ -1,12 +1,27 @@
+import asyncio
+
+import aiohttp
 from telebot.async_telebot import AsyncTeleBot
+from telebot.asyncio_helper import ApiHTTPException, ApiTelegramException, RequestTimeout
 from telebot.types import Message, InlineKeyboardMarkup
 
 import bot.utils.bot_utils as bot_utils
+from bot.utils.send_governor import sent_messages
 from utils.logging_utils import setup_logger
 from utils.strings_manager import StringsManager
 from utils import constants
 
 
+def is_transient(e: Exception) -> bool:
+    # network and server side errors can pass on a retry, anything else fails the same way again
+    if isinstance(e, ApiTelegramException):
+        return e.error_code == 429 or e.error_code >= 500
+    if isinstance(e, aiohttp.ClientResponseError):
+        return e.status == 429 or e.status >= 500
+    return isinstance(e, (ApiHTTPException, RequestTimeout, aiohttp.ClientError, asyncio.TimeoutError,
+                          ConnectionError))
+
+
 class BaseCommands:
     def __init__(self, bot: AsyncTeleBot, cmd_func: dict, cmd_func_pattern: dict, module_name: str):
         self.bot = bot
@@ -15,13 +30,21 @@ class BaseCommands:
         self.cmd_list = self._cmd_func.keys()
         self._cmd_func_pattern = cmd_func_pattern
         self.cmd_patterns = self._cmd_func_pattern.keys()
+        self._pattern_func = {p.pattern: f for p, f in self._cmd_func_pattern.items()}
         self.module_name = module_name
         self.strings = StringsManager()
-        self.settings = self.strings.redis
+        self.settings = self.strings.settings
         self.order = 0
 
 
-    async def make_command(self, message: Message, command: str = None):
+    async def make_command(self, message: Message, command: str = None, func=None, pattern: str = None,
+                           raise_errors: bool = False):
+        if not func and pattern and command not in self._cmd_func:
+            func = self._pattern_func.get(pattern)
+        if func:
+            await self.handle_command(func, message=message, raise_errors=raise_errors)
+            return
+
         text = message.any_text.strip()
         if not command:
             command = text.split(" ")[0] if " " in text else text
@@ -31,25 +54,31 @@ class BaseCommands:
         command = command.strip("/")
 
         if command in self._cmd_func:
-            await self.handle_command(self._cmd_func[command], message=message)
+            await self.handle_command(self._cmd_func[command], message=message, raise_errors=raise_errors)
             return
 
         for pattern, func in self._cmd_func_pattern.items():
             if pattern.match(f"/{command}"):
-                await self.handle_command(func, message=message)
+                await self.handle_command(func, message=message, raise_errors=raise_errors)
                 return
 
-    async def handle_command(self, command_func, *args, **kwargs):
+    async def handle_command(self, command_func, *args, raise_errors: bool = False, **kwargs):
         f_name = command_func.__name__
         u_message: Message = kwargs.get('message')
         text = u_message.any_text or ""
+        sent = sent_messages.set(set())
         try:
             self.logger.info(f"User {u_message.from_user.id} make command - {text}")
             await command_func(*args, **kwargs)
         except Exception as e:
             # num = random.randint(10000, 99999)
+            user_error = str(e).startswith("⚠️") or "<blockquote>" in str(e)
+            if raise_errors and not user_error and is_transient(e) and not sent_messages.get():
+                # job worker retries it, the error is sent after the last attempt.
+                # A command that already answered is not run again, the user would get the answer twice
+                raise
             self.logger.exception(f"Execute command error #{u_message.message_id}: '{f_name}'")
-            if str(e).startswith("⚠️") or "<blockquote>" in str(e):
+            if user_error:
                 err_str = str(e)
             else:
                 err_str = self.strings.get("error_command", u_message.chat.id)
@@ -68,6 +97,8 @@ class BaseCommands:
             if isinstance(result, Exception):
                 self.logger.exception(f"Cant answer to [{u_message.chat.id}] on error: {result}")
             await bot_utils.try_delete(self.bot, message=st_loading, timeout=3000)
+        finally:
+            sent_messages.reset(sent)
 
     @staticmethod
     def _parse_text(message: Message) -> str:
@@ -1,2 +1,10 @@
-from .commands import Commands
-from .calc_math_core import CalcMath
\ No newline at end of file
+MANIFEST = {
+    "commands": ["math", "help_math", "solve", "help_solve"],
+    "patterns": [
+        r"^/math(?:@\w+)?",
+        r"^/solve(?:@\w+)?",
+        r"^/help_(math|solve)(?:@\w+)?",
+    ],
+    "handlers": ["any_message", "inline"],
+    "features": ["digits"],
+}
@@ -3,6 +3,7 @@ import re
 from telebot.async_telebot import AsyncTeleBot
 from telebot.types import InlineQuery, Message, InlineQueryResultArticle, InputTextMessageContent
 
+from bot.command_handler import CommandHandler
 from ..base_commands import BaseCommands
 from .calc_math_core import CalcMath
 from bot.utils import bot_utils
@@ -10,7 +11,7 @@ import utils.constants as constants
 
 
 class Commands(BaseCommands):
-    def __init__(self, bot: AsyncTeleBot):
+    def __init__(self, bot: AsyncTeleBot, handler: CommandHandler = None):
         cmd_func = {
             "math": self._send_math,
             "help_math": self._send_h,
@@ -25,6 +26,7 @@ class Commands(BaseCommands):
         super().__init__(
             bot, cmd_func, cmd_func_pattern, "calc_math"
         )
+        self.command_handler = handler
 
     async def handle_any_message(self, message: Message) -> bool:
         text = message.any_text or ""
@@ -1,2 +1,8 @@
-from .commands import Commands
-from .calculator_core import Calculator
\ No newline at end of file
+MANIFEST = {
+    "commands": ["calc", "help_calc"],
+    "patterns": [
+        r"^/calc(?:@\w+)?",
+        r"^/help_calc(?:@\w+)?",
+    ],
+    "handlers": [],
+}
@@ -3,6 +3,7 @@ import re
 from telebot.async_telebot import AsyncTeleBot
 from telebot.types import InlineQuery, Message, InlineQueryResultArticle, InputTextMessageContent
 
+from bot.command_handler import CommandHandler
 from ..base_commands import BaseCommands
 from .calculator_core import Calculator
 from bot.utils import bot_utils
@@ -10,7 +11,7 @@ import utils.constants as constants
 
 
 class Commands(BaseCommands):
-    def __init__(self, bot: AsyncTeleBot):
+    def __init__(self, bot: AsyncTeleBot, handler: CommandHandler = None):
         cmd_func = {
             "calc": self._send_calc,
             "help_calc": self._send_h,
@@ -22,6 +23,7 @@ class Commands(BaseCommands):
         super().__init__(
             bot, cmd_func, cmd_func_pattern, "calculator"
         )
+        self.command_handler = handler
 
 
     # async def handle_any_message(self, message: Message) -> bool:
@@ -1 +1,10 @@
-from .commands import Commands
\ No newline at end of file
+MANIFEST = {
+    "commands": ["dl", "download", "help_dl"],
+    "patterns": [
+        r"^/(dl|download)(?:@\w+)?",
+        r"^/help_(dl|download)(?:@\w+)?",
+    ],
+    "handlers": ["inline", "any_message"],
+    "features": ["urls"],
+    "jobs": ["dl", "download"],
+}
@@ -16,10 +16,11 @@ from .sources import (
     InstagramDownloader, YoutubeDownloader
 )
 from .strings import *
+from .file_cache import FileIdCache, MODE_MP3, MODE_VIDEO, media_items
 from bot.utils.bot_utils import (
-    try_media_album_links, try_send_video_and_cleanup, try_send, try_sticker,
-    try_delete, chunked
+    try_media_album_links, try_send_video_and_cleanup, try_send, try_media_file_ids, chunked
 )
+from bot.utils.progress import ProgressManager
 
 from utils import constants
 from utils.utils import extract_urls
@@ -70,6 +71,27 @@ class Commands(BaseCommands):
         )]
 
 
+    async def _send_cached(self, message: Message, c_link: str, mode: str, markup) -> bool:
+        cache = FileIdCache()
+        sends = await cache.get(c_link, mode)
+        if not sends:
+            return False
+        for n, send in enumerate(sends):
+            r = await try_media_file_ids(
+                self.bot,
+                send["items"],
+                send["text"],
+                message=message,
+                markup=markup,
+                reply_to_message_id=message.message_id,
+            )
+            if isinstance(r, Exception):
+                self.logger.error(f"Cant send cached file_id to chat [{message.chat.id}]: {r}")
+                await cache.invalidate(c_link, mode)
+                # nothing delivered yet, download it again
+                return n > 0
+        return True
+
     async def _send_download(self, message: Message):
         only_audio = " mp3" in message.any_text or "mp3 " in message.any_text
         links = extract_urls(message.any_text)
@@ -102,9 +124,15 @@ class Commands(BaseCommands):
             text=f"Open {c_type.name}",
             url=c_link,
         ))
+        mode = MODE_MP3 if only_audio else MODE_VIDEO
+        if await self._send_cached(message, c_link, mode, markup):
+            return
         try_download = True
         sticker = constants.STICKER_MUSIC if only_audio else constants.STICKER_LOADING
-        st_loading = await try_sticker(self.bot, sticker, message=message, reply_to_message_id=message.message_id)
+        progress = ProgressManager().create(
+            self.bot, message, action="upload_voice" if only_audio else "upload_video", sticker=sticker)
+        await progress.start()
+        sends = []
         result = {"error": "", "video_urls": [], "image_urls": []}
         if c_type == Type.THREADS:
             _dl = ThreadsDownloader(c_link)
@@ -131,7 +159,7 @@ class Commands(BaseCommands):
             )
             if isinstance(r, Exception):
                 self.logger.error(f"Cant _send_download error to chat [{message.chat.id}]: {r}")
-            await try_delete(self.bot, message=st_loading)
+            await progress.stop()
             return
 
         if result.get("error"):
@@ -143,7 +171,7 @@ class Commands(BaseCommands):
             )
             if isinstance(r, Exception):
                 self.logger.error(f"Cant _send_download error to chat [{message.chat.id}]: {r}")
-            await try_delete(self.bot, message=st_loading)
+            await progress.stop()
             return
 
         if result.get("video_file_path"):
@@ -157,6 +185,7 @@ class Commands(BaseCommands):
                 only_audio=only_audio,
                 markup=markup,
             )
+            sends.append({"text": text.strip(), "items": media_items(r)})
             if isinstance(r, Exception):
                 self.logger.error(f"Cant _send_download video_urls to chat [{message.chat.id}]: {r}")
         if result.get("video_urls"):
@@ -173,6 +202,7 @@ class Commands(BaseCommands):
                 download=try_download,
                 markup=markup,
             )
+            sends.append({"text": text.strip(), "items": media_items(r)})
             if isinstance(r, Exception):
                 self.logger.error(f"Cant _send_download video_urls to chat [{message.chat.id}]: {r}")
         if result.get("image_urls"):
@@ -191,9 +221,11 @@ class Commands(BaseCommands):
                     text=text.strip(),
                     markup=markup,
                 )
+                sends.append({"text": text.strip(), "items": media_items(r)})
                 if isinstance(r, Exception):
                     self.logger.error(f"Cant _send_download image_urls to chat [{message.chat.id}]: {r}")
-        await try_delete(self.bot, message=st_loading)
+        await FileIdCache().set(c_link, mode, sends)
+        await progress.stop()
         return
 
     async def handle_any_message(self, message: Message) -> bool:
@@ -220,15 +252,23 @@ class Commands(BaseCommands):
                 c_type = Type.YOUTUBE
             if c_type != Type.UNK: break
         if not c_link: return False
+        if self.command_handler and await self.command_handler.enqueue_command(message, self.module_name, "dl"):
+            return True
 
         markup = InlineKeyboardMarkup()
         markup.add(InlineKeyboardButton(
             text=f"Open {c_type.name}",
             url=c_link,
         ))
+        mode = MODE_MP3 if only_audio else MODE_VIDEO
+        if await self._send_cached(message, c_link, mode, markup):
+            return True
         try_download = True
         sticker = constants.STICKER_MUSIC if only_audio else constants.STICKER_LOADING
-        st_loading = await try_sticker(self.bot, sticker, message=message, reply_to_message_id=message.message_id)
+        progress = ProgressManager().create(
+            self.bot, message, action="upload_voice" if only_audio else "upload_video", sticker=sticker)
+        await progress.start()
+        sends = []
 
         result = {"error": "", "video_urls": [], "image_urls": []}
         if c_type == Type.THREADS:
@@ -256,7 +296,7 @@ class Commands(BaseCommands):
             )
             if isinstance(r, Exception):
                 self.logger.error(f"Cant _send_download error to chat [{message.chat.id}]: {r}")
-            await try_delete(self.bot, message=st_loading)
+            await progress.stop()
             return True
 
         if result.get("error"):
@@ -268,7 +308,7 @@ class Commands(BaseCommands):
             )
             if isinstance(r, Exception):
                 self.logger.error(f"Cant _send_download error to chat [{message.chat.id}]: {r}")
-            await try_delete(self.bot, message=st_loading)
+            await progress.stop()
             return True
 
         success = False
@@ -283,6 +323,7 @@ class Commands(BaseCommands):
                 only_audio=only_audio,
                 markup=markup,
             )
+            sends.append({"text": text.strip(), "items": media_items(r)})
             if isinstance(r, Message):
                 success = True
             if isinstance(r, Exception):
@@ -301,6 +342,7 @@ class Commands(BaseCommands):
                 download=try_download,
                 markup=markup,
             )
+            sends.append({"text": text.strip(), "items": media_items(r)})
             if isinstance(r, list):
                 success = True
             if isinstance(r, Exception):
@@ -321,10 +363,12 @@ class Commands(BaseCommands):
                     text=text.strip(),
                     markup=markup,
                 )
+                sends.append({"text": text.strip(), "items": media_items(r)})
                 if isinstance(r, list):
                     success = True
                 if isinstance(r, Exception):
                     self.logger.error(f"Cant _send_download image_urls to chat [{message.chat.id}]: {r}")
-        await try_delete(self.bot, message=st_loading)
+        await FileIdCache().set(c_link, mode, sends)
+        await progress.stop()
         return success
 
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import urllib.parse
+
+from telebot.types import Message
+
+from utils import load_key
+from utils.logging_utils import setup_temp_logger
+from utils.redis_utils import RedisClient
+from utils.user_settings import TTLCache
+
+MODE_VIDEO = "video"
+MODE_MP3 = "mp3"
+
+_keep_query = {
+    "youtube.com": {"v"},
+}
+
+
+def canonical_url(url: str) -> str:
+    if not url.startswith("http"):
+        url = "https://" + url
+    parts = urllib.parse.urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if host.startswith(("www.", "m.")):
+        host = host.split(".", 1)[1]
+    host = host.replace("threads.net", "threads.com")
+    keep = _keep_query.get(host, set())
+    query = urllib.parse.urlencode(sorted((k, v) for k, v in urllib.parse.parse_qsl(parts.query) if k in keep))
+    return f"{host}{parts.path.rstrip('/')}" + (f"?{query}" if query else "")
+
+
+def message_media(m: Message) -> dict | None:
+    if m.video:
+        return {"type": "video", "file_id": m.video.file_id}
+    if m.audio:
+        return {"type": "audio", "file_id": m.audio.file_id}
+    if m.photo:
+        return {"type": "photo", "file_id": m.photo[-1].file_id}
+    if m.document:
+        return {"type": "document", "file_id": m.document.file_id}
+    return None
+
+
+def media_items(result: Message | list | Exception | None) -> list[dict]:
+    # empty when any sent message has no media, such a result is not cached
+    messages = result if isinstance(result, list) else [result]
+    items = [message_media(m) for m in messages if isinstance(m, Message)]
+    if not items or len(items) != len(messages) or None in items:
+        return []
+    return items
+
+
+class FileIdCache:
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        self.logger = setup_temp_logger('FileIdCache')
+        self.ttl = int(load_key("DL_CACHE_TTL") or 7 * 24 * 3600)
+        # a single bot process with local settings keeps the cache in memory, without Redis
+        self.memory = None
+        if load_key("SETTINGS_BACKEND") == "local":
+            self.memory = TTLCache(int(load_key("DL_CACHE_SIZE") or 10000), self.ttl)
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "invalidated": 0, "errors": 0}
+
+    @staticmethod
+    def key(url: str, mode: str) -> str:
+        digest = hashlib.sha1(canonical_url(url).encode()).hexdigest()
+        return f"dl:file_id:{mode}:{digest}"
+
+    async def get(self, url: str, mode: str) -> list[dict] | None:
+        # [{ "text": "caption", "items": [{"type": "video", "file_id": "..."}] }]
+        try:
+            if self.memory is not None:
+                data = self.memory.get(self.key(url, mode))
+            else:
+                data = await RedisClient().aio().get(self.key(url, mode))
+        except Exception as e:
+            self.stats["errors"] += 1
+            self.logger.error(f"Cant read file_id cache: {e}")
+            return None
+        self.stats["hits" if data else "misses"] += 1
+        if (self.stats["hits"] + self.stats["misses"]) % 100 == 0:
+            self.logger.info(f"File_id cache stats: {self.get_stats()}")
+        return json.loads(data) if data else None
+
+    async def set(self, url: str, mode: str, sends: list[dict]):
+        if not sends or not all(s["items"] for s in sends):
+            return
+        try:
+            data = json.dumps(sends, ensure_ascii=False)
+            if self.memory is not None:
+                self.memory.set(self.key(url, mode), data)
+            else:
+                await RedisClient().aio().set(self.key(url, mode), data, ex=self.ttl)
+            self.stats["stores"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            self.logger.error(f"Cant write file_id cache: {e}")
+
+    async def invalidate(self, url: str, mode: str):
+        try:
+            if self.memory is not None:
+                self.memory.invalidate(self.key(url, mode))
+            else:
+                await RedisClient().aio().delete(self.key(url, mode))
+            self.stats["invalidated"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            self.logger.error(f"Cant invalidate file_id cache: {e}")
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "hit_ratio": round(self.stats["hits"] / lookups, 2) if lookups else 0.0}
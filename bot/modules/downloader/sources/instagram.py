@@ -1,15 +1,12 @@
 import asyncio
-import ssl
 import traceback
 from html import escape
 
-import aiohttp
-import certifi
-
 import instaloader
 
 from yt_dlp import YoutubeDL
 
+from utils.http_client import HttpClients
 from ..utils import normalize_url, shorten_url
 
 
@@ -22,17 +19,15 @@ class InstagramDownloader:
         api_url = f"https://alfan.app/api/prepare"
 
         try:
-            ssl_context = ssl.create_default_context(cafile=certifi.where())
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
-                async with session.post(api_url, ssl=ssl_context, json={"url": self.url}) as resp:
-                    if resp.status != 200:
-                        result["error"] = f"HTTP {resp.status}"
-                        return result
-                    try:
-                        data = await resp.json()
-                    except Exception:
-                        result["error"] = "Invalid JSON response"
-                        return result
+            async with HttpClients().get().post(api_url, json={"url": self.url}) as resp:
+                if resp.status != 200:
+                    result["error"] = f"HTTP {resp.status}"
+                    return result
+                try:
+                    data = await resp.json()
+                except Exception:
+                    result["error"] = "Invalid JSON response"
+                    return result
             dl = data.get("downloadId", "")
             result["text"] = data.get("title", "")
             result["username"] = data.get("author", "")
@@ -1,16 +1,13 @@
 import json
 import re
-import ssl
 import traceback
 import urllib.parse
 from html import escape
 
-import aiohttp
-import certifi
-
 from playwright.async_api import async_playwright
 from bs4 import BeautifulSoup
 from utils.constants import semaphore
+from utils.http_client import HttpClients
 from ..utils import normalize_url, shorten_url
 
 class ThreadsDownloader:
@@ -25,17 +22,15 @@ class ThreadsDownloader:
         api_url = f"https://api.threadsphotodownloader.com/v2/media?url={self.url}"
 
         try:
-            ssl_context = ssl.create_default_context(cafile=certifi.where())
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
-                async with session.get(api_url, ssl=ssl_context) as resp:
-                    if resp.status != 200:
-                        result["error"] = f"HTTP {resp.status}"
-                        return result
-                    try:
-                        data = await resp.json()
-                    except Exception:
-                        result["error"] = "Invalid JSON response"
-                        return result
+            async with HttpClients().get().get(api_url) as resp:
+                if resp.status != 200:
+                    result["error"] = f"HTTP {resp.status}"
+                    return result
+                try:
+                    data = await resp.json()
+                except Exception:
+                    result["error"] = "Invalid JSON response"
+                    return result
 
             result["image_urls"] = data.get("image_urls", [])
             for vid in data.get("video_urls", []):
@@ -1,14 +1,11 @@
 import asyncio
 import os
-import ssl
 import traceback
 from html import escape
 
-import aiohttp
-import certifi
-
 from yt_dlp import YoutubeDL
 
+from utils.http_client import HttpClients
 from ..utils import normalize_url
 
 
@@ -21,9 +18,24 @@ class TiktokDownloader:
         api_url = f"https://alfan.app/api/prepare"
 
         try:
-            ssl_context = ssl.create_default_context(cafile=certifi.where())
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
-                async with session.post(api_url, ssl=ssl_context, json={"url": self.url}) as resp:
+            session = HttpClients().get()
+            async with session.post(api_url, json={"url": self.url}) as resp:
+                if resp.status != 200:
+                    result["error"] = f"HTTP {resp.status}"
+                    return result
+                try:
+                    data = await resp.json()
+                except Exception:
+                    result["error"] = "Invalid JSON response"
+                    return result
+            dl = data.get("downloadId", "")
+            result["text"] = data.get("title", "")
+            result["username"] = data.get("author", "")
+            result["video_urls"] = [f"https://alfan.app/api/download/{dl}"]
+
+            if not data or not dl:
+                api_url = f"https://www.watermarkremover.io/api/video"
+                async with session.post(api_url, json={"url": self.url}) as resp:
                     if resp.status != 200:
                         result["error"] = f"HTTP {resp.status}"
                         return result
@@ -32,24 +44,7 @@ class TiktokDownloader:
                     except Exception:
                         result["error"] = "Invalid JSON response"
                         return result
-            dl = data.get("downloadId", "")
-            result["text"] = data.get("title", "")
-            result["username"] = data.get("author", "")
-            result["video_urls"] = [f"https://alfan.app/api/download/{dl}"]
-
-            if not data or not dl:
-                api_url = f"https://www.watermarkremover.io/api/video"
-                async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
-                    async with session.post(api_url, ssl=ssl_context, json={"url": self.url}) as resp:
-                        if resp.status != 200:
-                            result["error"] = f"HTTP {resp.status}"
-                            return result
-                        try:
-                            data = await resp.json()
-                        except Exception:
-                            result["error"] = "Invalid JSON response"
-                            return result
-                    result["video_urls"] = [data.get("nowm", data.get("wm", ""))]
+                result["video_urls"] = [data.get("nowm", data.get("wm", ""))]
         except Exception as e:
             result["error"] = str(e)
         return result
@@ -1,9 +1,7 @@
 import re
-import ssl
 import urllib.parse
 
-import aiohttp
-import certifi
+from utils.http_client import HttpClients
 
 
 def normalize_url(url: str) -> str:
@@ -33,11 +31,9 @@ async def shorten_url(url: str) -> str:
     try:
         encoded = urllib.parse.quote_plus(url)
         api = f"https://is.gd/create.php?format=simple&url={encoded}"
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
-            async with session.get(api, ssl=ssl_context) as resp:
-                if resp.status == 200:
-                    return await resp.text()
-                return url
+        async with HttpClients().get().get(api) as resp:
+            if resp.status == 200:
+                return await resp.text()
+            return url
     except Exception:
         return url
\ No newline at end of file
@@ -1 +1,16 @@
-from .commands import Commands
\ No newline at end of file
+MANIFEST = {
+    "commands": [
+        "vn", "circle", "voice", "parse", "inspect", "id",
+        "help_circle", "help_voice", "help_parse", "help_id",
+    ],
+    "patterns": [
+        r"^/(vn|circle)(?:@\w+)?",
+        r"^/voice(?:@\w+)?",
+        r"^/(parse|inspect)(?:@\w+)?",
+        r"^/id(?:@\w+)?",
+        r"^/help_(id|vn|circle|parse|voice)(?:@\w+)?",
+    ],
+    "handlers": ["any_message"],
+    "features": ["contact", "video"],
+    "jobs": ["vn", "circle", "voice"],
+}
@@ -9,6 +9,7 @@ from telebot.types import Message, InputFile, InlineKeyboardMarkup
 
 from bot.command_handler import CommandHandler
 from bot.utils import bot_utils
+from bot.utils.progress import ProgressManager
 from utils import constants
 from ..base_commands import BaseCommands
 from .utils import video_to_clip_bytes, audio_as_voice, get_country
@@ -52,20 +53,23 @@ class Commands(BaseCommands):
             return m.document
         return None
 
-    async def _send_tovideonote(self, message: Message):
-        video_file = None
+    @staticmethod
+    def _extract_video(message: Message):
         if message.video or message.document and message.document.mime_type.startswith("video/"):
-            video_file = message.video or message.document
-        elif message.reply_to_message:
-            rep = message.reply_to_message
-            if rep.video or rep.document and rep.document.mime_type.startswith("video/"):
-                video_file = rep.video or rep.document
+            return message.video or message.document
+        rep = message.reply_to_message
+        if rep and (rep.video or rep.document and rep.document.mime_type.startswith("video/")):
+            return rep.video or rep.document
+        return None
 
+    async def _send_tovideonote(self, message: Message):
+        video_file = self._extract_video(message)
         if not video_file:
             raise ValueError("video not founded")
 
-        st_loading = await bot_utils.try_sticker(self.bot, constants.STICKER_LOADING, message=message,
-                                       reply_to_message_id=message.message_id)
+        progress = ProgressManager().create(
+            self.bot, message, action="upload_video_note", sticker=constants.STICKER_LOADING)
+        await progress.start()
 
         try:
             file_info = await self.bot.get_file(video_file.file_id)
@@ -83,15 +87,16 @@ class Commands(BaseCommands):
         except Exception as e:
             raise ValueError(str(e))
         finally:
-            await bot_utils.try_delete(self.bot, message=st_loading)
+            await progress.stop()
 
 
     async def _send_tovoice(self, message: Message):
         _file = self._extract_file(message) or self._extract_file(message.reply_to_message)
         if not _file:
             raise ValueError("audio not founded")
-        st_loading = await bot_utils.try_sticker(self.bot, constants.STICKER_LOADING, message=message,
-                                                 reply_to_message_id=message.message_id)
+        progress = ProgressManager().create(
+            self.bot, message, action="upload_voice", sticker=constants.STICKER_LOADING)
+        await progress.start()
         try:
             file_info = await self.bot.get_file(_file.file_id)
             _bytes = await self.bot.download_file(file_info.file_path)
@@ -108,7 +113,7 @@ class Commands(BaseCommands):
         except Exception as e:
             raise ValueError(str(e))
         finally:
-            await bot_utils.try_delete(self.bot, message=st_loading)
+            await progress.stop()
 
     async def _send_id(self, message: Message):
         def format_phone(p: str) -> str:
@@ -250,7 +255,9 @@ class Commands(BaseCommands):
             except Exception:
                 return False
         try:
-            await self._send_tovideonote(message)
+            if not (self.command_handler and self._extract_video(message) and
+                    await self.command_handler.enqueue_command(message, self.module_name, "circle")):
+                await self._send_tovideonote(message)
             if message.contact or message.reply_to_message or message.forward_from or message.forward_from_chat:
                 await self._send_id(message)
             return True
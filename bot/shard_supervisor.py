@@ -0,0 +1,143 @@
+import asyncio
+import multiprocessing
+import signal
+import traceback
+
+import telebot.async_telebot
+from telebot import asyncio_helper
+
+from bot.webhook_server import WebhookServer
+from utils import setup_logger
+
+CHAT_KEYS = ("message", "edited_message", "channel_post", "edited_channel_post", "business_message")
+USER_KEYS = (
+    "inline_query", "chosen_inline_result", "shipping_query", "pre_checkout_query",
+    "my_chat_member", "chat_member", "chat_join_request", "message_reaction",
+)
+
+
+def update_chat_id(update: dict) -> int:
+    for key in CHAT_KEYS:
+        if obj := update.get(key):
+            return obj["chat"]["id"]
+    if call := update.get("callback_query"):
+        return call["message"]["chat"]["id"] if call.get("message") else call["from"]["id"]
+    for key in USER_KEYS:
+        if obj := update.get(key):
+            if "chat" in obj:
+                return obj["chat"]["id"]
+            if "from" in obj:
+                return obj["from"]["id"]
+    return update.get("update_id", 0)
+
+
+def run_shard(token: str, index: int, queue: multiprocessing.Queue):
+    from bot.async_telebot import TelegramBot
+    logger = setup_logger(f'BotShard{index}', f'bot_shard_{index}.log')
+    TelegramBot(token, logger).run(queue)
+
+
+class ShardSupervisor:
+    def __init__(self, token, logger, shards: int):
+        self.token = token
+        self.logger = logger
+        self.bot = telebot.async_telebot.AsyncTeleBot(token=token)
+        self.queues = [multiprocessing.Queue() for _ in range(shards)]
+        self.processes: list[multiprocessing.Process | None] = [None] * shards
+        self.stop_flag = False
+        self.main_task = None
+        self.routed = [0] * shards
+        self.restarts = [0] * shards
+        self.watch_interval = 5
+        self.webhook = WebhookServer.from_env(self.bot, self.logger, dispatch=self.dispatch)
+
+    def start_shard(self, index: int):
+        p = multiprocessing.Process(target=run_shard, args=(self.token, index, self.queues[index]), daemon=True)
+        p.start()
+        self.processes[index] = p
+
+    def start_shards(self):
+        for index in range(len(self.queues)):
+            self.start_shard(index)
+        self.logger.info(f"Started {len(self.processes)} bot shards")
+
+    async def watch_shards(self):
+        # a crashed shard is started again and takes the updates left in its queue
+        while not self.stop_flag:
+            await asyncio.sleep(self.watch_interval)
+            for index, p in enumerate(self.processes):
+                if p.is_alive() or self.stop_flag:
+                    continue
+                self.restarts[index] += 1
+                self.logger.error(f"Bot shard {index} exited with code {p.exitcode}, restart #{self.restarts[index]}")
+                self.start_shard(index)
+
+    async def dispatch(self, update: dict):
+        # same chat always goes to the same shard, so per-chat order is kept
+        index = update_chat_id(update) % len(self.queues)
+        self.queues[index].put(update)
+        self.routed[index] += 1
+
+    async def start_polling(self):
+        self.logger.info("Starting sharded bot polling...")
+        await self.bot.delete_webhook()
+        offset = None
+        while not self.stop_flag:
+            try:
+                updates = await asyncio_helper.get_updates(
+                    self.token, offset=offset, timeout=40, request_timeout=50)
+                for update in updates:
+                    offset = update["update_id"] + 1
+                    await self.dispatch(update)
+            except Exception as e:
+                self.logger.error(f"Polling error: {e}\n{traceback.format_exc()}")
+                await asyncio.sleep(5)
+
+    async def start_webhook(self):
+        self.logger.info("Starting sharded bot webhook...")
+        await self.webhook.start()
+        while not self.stop_flag:
+            await asyncio.sleep(1)
+
+    def stop_shards(self):
+        for queue in self.queues:
+            queue.put(None)
+        for p in self.processes:
+            p.join(timeout=10)
+            if p.is_alive():
+                p.terminate()
+        self.logger.info(f"Bot shards stopped, routed updates: {self.routed}, restarts: {self.restarts}")
+
+    def graceful_exit(self, signum=None) -> None:
+        self.logger.info(f"Received signal {signum}, stopping shards...")
+        self.stop_flag = True
+        if self.main_task and not self.main_task.done():
+            self.main_task.cancel()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self.graceful_exit, signum)
+        watch = asyncio.create_task(self.watch_shards())
+        self.main_task = asyncio.create_task(self.start_webhook() if self.webhook else self.start_polling())
+        try:
+            await self.main_task
+        except asyncio.CancelledError:
+            pass
+        finally:
+            watch.cancel()
+            if self.webhook:
+                await self.webhook.stop()
+            await self.bot.close_session()
+        self.logger.info("Supervisor stopped")
+
+    def run(self):
+        self.start_shards()
+        try:
+            asyncio.run(self._run())
+        except KeyboardInterrupt:
+            self.logger.info("Supervisor stopped")
+        except Exception as e:
+            self.logger.critical(f"Fatal error: {e}\n{traceback.format_exc()}")
+        finally:
+            self.stop_shards()
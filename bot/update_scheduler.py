@@ -0,0 +1,98 @@
+import asyncio
+import time
+from collections import deque
+from logging import Logger
+from typing import Awaitable, Callable
+
+
+class UpdateScheduler:
+    def __init__(self, logger: Logger, max_concurrency: int = 32, shards: int = 16, max_pending: int = 10000):
+        self.logger = logger
+        self.max_concurrency = max(1, max_concurrency)
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.shards = [{} for _ in range(max(1, shards))]  # [{ chat_id: deque[(enqueued_at, job)] }]
+        self.max_pending = max_pending
+        self.pending = 0
+        self.running = 0
+        self.tasks = set()
+        self.stats_interval = 300
+        self.waits = deque(maxlen=1000)
+        self.stats = {"submitted": 0, "processed": 0, "dropped": 0, "wait_total": 0.0, "wait_max": 0.0}
+
+    def get_shard(self, chat_id: int) -> dict:
+        return self.shards[hash(chat_id) % len(self.shards)]
+
+    def submit(self, chat_id: int, job: Callable[[], Awaitable]) -> bool:
+        if self.pending >= self.max_pending:
+            self.stats["dropped"] += 1
+            self.logger.warning(f"Update queue is full ({self.pending}), update from [{chat_id}] dropped")
+            return False
+        self.pending += 1
+        self.stats["submitted"] += 1
+
+        shard = self.get_shard(chat_id)
+        queue = shard.get(chat_id)
+        if queue is not None:
+            # chat already has a drain task, keep FIFO order behind it
+            queue.append((time.monotonic(), job))
+            return True
+        shard[chat_id] = deque([(time.monotonic(), job)])
+        task = asyncio.create_task(self._drain(chat_id, shard))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return True
+
+    async def _drain(self, chat_id: int, shard: dict):
+        queue = shard[chat_id]
+        try:
+            while queue:
+                async with self.semaphore:
+                    enqueued_at, job = queue.popleft()
+                    self.pending -= 1
+                    wait = time.monotonic() - enqueued_at
+                    self.waits.append(wait)
+                    self.stats["wait_total"] += wait
+                    self.stats["wait_max"] = max(self.stats["wait_max"], wait)
+                    self.running += 1
+                    try:
+                        await job()
+                    except Exception:
+                        self.logger.exception(f"Exception while processing update from [{chat_id}]")
+                    finally:
+                        self.running -= 1
+                        self.stats["processed"] += 1
+        finally:
+            self.pending -= len(queue)
+            shard.pop(chat_id, None)
+
+    def get_stats(self) -> dict:
+        waits = sorted(self.waits)
+
+        def percentile(p: float) -> float:
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))], 4) if waits else 0.0
+
+        processed = self.stats["processed"]
+        return {
+            "pending": self.pending,
+            "running": self.running,
+            "chats": sum(len(s) for s in self.shards),
+            "shard_depth": [sum(len(q) for q in s.values()) for s in self.shards],
+            "submitted": self.stats["submitted"],
+            "processed": processed,
+            "dropped": self.stats["dropped"],
+            "wait_avg": round(self.stats["wait_total"] / processed, 4) if processed else 0.0,
+            "wait_max": round(self.stats["wait_max"], 4),
+            "wait_p50": percentile(0.5),
+            "wait_p95": percentile(0.95),
+            "wait_p99": percentile(0.99),
+        }
+
+    async def stats_loop(self):
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            self.logger.info(f"Update scheduler stats: {self.get_stats()}")
+
+    async def stop(self):
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
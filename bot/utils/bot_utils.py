@@ -2,18 +2,26 @@ import asyncio
 import io
 import os
 import random
-import ssl
 import string
-import time
 import traceback
 
 import aiohttp
-import certifi
 from telebot.async_telebot import AsyncTeleBot
 from telebot.types import Message, InlineKeyboardButton, ReactionTypeEmoji, InputMediaVideo, InputMediaPhoto, \
-    InputMediaAudio, CopyTextButton, ChatMemberAdministrator, ChatMemberOwner
+    InputMediaAudio, InputMediaDocument, InputFile, CopyTextButton, ChatMemberAdministrator, ChatMemberOwner
 
-from bs4 import BeautifulSoup, Comment
+from .flood_control import FloodControl
+from .html_sanitizer import sanitize_html
+from .send_governor import SendGovernor, PRIORITY_REPLY, PRIORITY_SERVICE, PRIORITY_COSMETIC, forget_sent
+from utils import load_key, load_keys
+from utils.http_client import HttpClients, GROUP_MEDIA
+
+governor = SendGovernor()
+
+ALBUM_FETCH_CONCURRENCY = int(load_key("ALBUM_FETCH_CONCURRENCY") or 4)  # per album
+ALBUM_ITEM_MAX_BYTES = int(load_key("ALBUM_ITEM_MAX_MB") or 50) * 1024 * 1024
+ALBUM_TOTAL_MAX_BYTES = int(load_key("ALBUM_TOTAL_MAX_MB") or 200) * 1024 * 1024
+album_fetch_semaphore = asyncio.Semaphore(int(load_key("ALBUM_FETCH_GLOBAL") or 16))  # all albums
 
 
 def b(title: str, callback: str) -> InlineKeyboardButton:
@@ -23,37 +31,6 @@ def cb(title: str, text: str) -> InlineKeyboardButton:
     return InlineKeyboardButton(text=title, copy_text=CopyTextButton(text=str(text)))
 
 
-ALLOWED_TAGS = {
-    "a", "b", "strong", "i", "em", "u", "ins", "blockquote"
-    "s", "strike", "del", "tg-spoiler", "code", "pre", "label"
-}
-ALLOWED_ATTRS = {
-    "a": {"href"},
-}
-
-def _sanitize_html_for_telegram(html: str) -> str:
-    html = html.replace("<blockquote>", " <label>").replace("</blockquote>", "</label> ")
-    soup = BeautifulSoup(html, "html.parser")
-    for node in soup.find_all(string=lambda text: isinstance(text, Comment)):
-        node.extract()
-    for script in soup(["script", "style"]):
-        script.decompose()
-
-    for tag in soup.find_all():
-        name = str(tag.name).lower()
-
-        if name not in ALLOWED_TAGS:
-            tag.unwrap()
-            continue
-
-        allowed = ALLOWED_ATTRS.get(name, set())
-        for attr in list(tag.attrs):
-            if attr not in allowed:
-                del tag.attrs[attr]
-    cleaned = "".join(str(x) for x in soup.body.contents) if soup.body else str(soup)
-    cleaned = cleaned.replace("<label>", "<blockquote>").replace("</label>", "</blockquote>")
-    return cleaned
-
 async def try_send(
         bot: AsyncTeleBot,
         chat_id: int,
@@ -62,14 +39,15 @@ async def try_send(
         reply_to_message_id: int=None,
         **kwargs) -> Message | Exception | None:
     try:
-        return await bot.send_message(
+        text = sanitize_html(text)
+        return await governor.call(chat_id, lambda: bot.send_message(
             chat_id=chat_id,
-            text=_sanitize_html_for_telegram(text),
+            text=text,
             reply_to_message_id=reply_to_message_id,
             reply_markup=markup,
             allow_sending_without_reply=True,
             **kwargs
-        )
+        ))
     except Exception as e:
         return e
 
@@ -84,10 +62,14 @@ async def try_delete(
     try:
         if timeout:
             await asyncio.sleep(int(timeout / 1000))
-        return await bot.delete_message(
-            chat_id=message.chat.id if message else chat_id,
-            message_id=message.message_id if message else message_id
-        )
+        chat_id = message.chat.id if message else chat_id
+        message_id = message.message_id if message else message_id
+        result = await governor.call(chat_id, lambda: bot.delete_message(
+            chat_id=chat_id,
+            message_id=message_id
+        ), priority=PRIORITY_SERVICE)
+        forget_sent(chat_id, message_id)
+        return result
     except Exception as e:
         return e
 
@@ -100,13 +82,14 @@ async def try_sticker(
         **kwargs) -> Message | Exception | None:
     if not chat_id and not message: return None
     try:
-        return await bot.send_sticker(
-            chat_id=message.chat.id if message else chat_id,
+        chat_id = message.chat.id if message else chat_id
+        return await governor.call(chat_id, lambda: bot.send_sticker(
+            chat_id=chat_id,
             sticker=sticker,
             reply_to_message_id=reply_to_message_id,
             allow_sending_without_reply=True,
             **kwargs
-        )
+        ), priority=PRIORITY_COSMETIC)
     except Exception as e:
         return e
 
@@ -129,13 +112,15 @@ async def try_edit(
                 markup=markup,
                 **kwargs
             )
-        return await bot.edit_message_text(
-            chat_id=message.chat.id if message else chat_id,
+        chat_id = message.chat.id if message else chat_id
+        text = sanitize_html(text)
+        return await governor.call(chat_id, lambda: bot.edit_message_text(
+            chat_id=chat_id,
             message_id=message.message_id if message else message_id,
-            text=_sanitize_html_for_telegram(text),
+            text=text,
             reply_markup=markup,
             **kwargs
-        )
+        ))
     except Exception as e:
         return e
 
@@ -152,6 +137,8 @@ async def try_send_video_and_cleanup(
         **kwargs
 ) -> Message | Exception | None:
     m = None
+    audio_path = None
+    uploads = []
     try:
         target_chat_id = chat_id or (message.chat.id if message else None)
         if not target_chat_id:
@@ -161,7 +148,9 @@ async def try_send_video_and_cleanup(
             if os.path.exists(video):
                 base = os.path.basename(video)
                 name = os.path.splitext(base)[0]
-                bio = io.BytesIO(open(video, "rb").read())
+                # streamed from disk while uploading, never read into memory
+                bio = InputFile(video, file_name=name)
+                uploads.append(bio)
             else:
                 bio = None
         elif isinstance(video, io.BytesIO):
@@ -180,33 +169,44 @@ async def try_send_video_and_cleanup(
                 reply_to_message_id=reply_to_message_id,
                 **kwargs
             )
-        bio.name = name
+        if isinstance(bio, io.BytesIO):
+            bio.name = name
         if only_audio and bio:
-            from utils.utils import video_to_audio_bytes
-            audio_bio = await video_to_audio_bytes(video_bytes=bio.read(), name=bio.name)
-            m = await bot.send_audio(
+            if isinstance(bio, InputFile):
+                from utils.utils import video_file_to_audio
+                audio_path = await video_file_to_audio(video)
+                audio = InputFile(audio_path, file_name=f"{name}.mp3")
+                uploads.append(audio)
+            else:
+                from utils.utils import video_to_audio_bytes
+                audio = await video_to_audio_bytes(video_bytes=bio.getvalue(), name=bio.name)
+            m = await governor.call(target_chat_id, lambda: bot.send_audio(
                 chat_id=target_chat_id,
-                audio=InputMediaAudio(audio_bio).media,
+                audio=audio,
                 caption=text,
                 reply_markup=markup,
                 reply_to_message_id=reply_to_message_id,
                 allow_sending_without_reply=True,
                 **kwargs
-            )
+            ), files=(audio.file if isinstance(audio, InputFile) else audio,))
         else:
-            m = await bot.send_video(
+            m = await governor.call(target_chat_id, lambda: bot.send_video(
                 chat_id=target_chat_id,
-                video=InputMediaVideo(bio).media,
+                video=bio,
                 caption=text,
                 reply_markup=markup,
                 reply_to_message_id=reply_to_message_id,
                 allow_sending_without_reply=True,
                 **kwargs
-            )
+            ), files=(bio.file if isinstance(bio, InputFile) else bio,))
     except Exception as e:
         traceback.print_exc()
         return e
     finally:
+        for upload in uploads:
+            upload.file.close()
+        if audio_path and os.path.exists(audio_path):
+            os.remove(audio_path)
         if isinstance(video, str) and os.path.exists(video):
             os.remove(video)
         return m
@@ -215,6 +215,33 @@ async def try_send_video_and_cleanup(
 def chunked(iterable: list, size: int) -> list[list]:
     return [iterable[i:i + size] for i in range(0, len(iterable), size)]
 
+async def _fetch_album_item(
+        session: aiohttp.ClientSession,
+        url: str,
+        semaphore: asyncio.Semaphore,
+        budget: list[int]) -> tuple[str, bytes] | None:
+    async with semaphore, album_fetch_semaphore:
+        read = 0
+        try:
+            async with session.get(url) as resp:
+                if resp.status != 200:
+                    return None
+                size = resp.content_length
+                if size and (size > ALBUM_ITEM_MAX_BYTES or size > budget[0]):
+                    return None
+                chunks = []
+                async for chunk in resp.content.iter_chunked(64 * 1024):
+                    read += len(chunk)
+                    budget[0] -= len(chunk)
+                    if read > ALBUM_ITEM_MAX_BYTES or budget[0] < 0:
+                        budget[0] += read
+                        return None
+                    chunks.append(chunk)
+                return resp.headers.get("Content-Type", ""), b"".join(chunks)
+        except Exception:
+            budget[0] += read
+            return None
+
 async def try_media_album_links(
         bot: AsyncTeleBot,
         text: str,
@@ -229,26 +256,29 @@ async def try_media_album_links(
     media_group = []
     try:
         if download:
-            ssl_context = ssl.create_default_context(cafile=certifi.where())
-            async with aiohttp.ClientSession() as session:
-                for url in urls:
-                    async with session.get(url, ssl=ssl_context) as resp:
-                        if resp.status != 200:
-                            continue
-                        content_type = resp.headers.get("Content-Type", "")
-                        content = await resp.read()
-                        bio = io.BytesIO(content)
-                        bio.name = url.split("/")[-1]
-
-                        if "video" in content_type:
-                            if only_audio:
-                                from utils.utils import video_to_audio_bytes
-                                audio_bio = await video_to_audio_bytes(content, name=bio.name)
-                                media_group.append(InputMediaAudio(audio_bio))
-                            else:
-                                media_group.append(InputMediaVideo(bio))
-                        elif "image" in content_type:
-                            media_group.append(InputMediaPhoto(bio))
+            semaphore = asyncio.Semaphore(ALBUM_FETCH_CONCURRENCY)
+            budget = [ALBUM_TOTAL_MAX_BYTES]
+            session = HttpClients().get(GROUP_MEDIA)
+            # fetched concurrently, gather keeps the order of urls
+            items = await asyncio.gather(*[
+                _fetch_album_item(session, url, semaphore, budget) for url in urls
+            ])
+            for url, item in zip(urls, items):
+                if not item:
+                    continue
+                content_type, content = item
+                bio = io.BytesIO(content)
+                bio.name = url.split("/")[-1]
+
+                if "video" in content_type:
+                    if only_audio:
+                        from utils.utils import video_to_audio_bytes
+                        audio_bio = await video_to_audio_bytes(content, name=bio.name)
+                        media_group.append(InputMediaAudio(audio_bio))
+                    else:
+                        media_group.append(InputMediaVideo(bio))
+                elif "image" in content_type:
+                    media_group.append(InputMediaPhoto(bio))
 
         target_chat_id = chat_id or (message.chat.id if message else None)
         if not target_chat_id:
@@ -261,20 +291,20 @@ async def try_media_album_links(
             chunks = chunked(media_group, 10)
             last_message_id = reply_to_message_id
             for chunk in chunks:
-                msgs = await bot.send_media_group(
+                msgs = await governor.call(target_chat_id, lambda: bot.send_media_group(
                     chat_id=target_chat_id,
                     media=chunk,
                     reply_to_message_id=last_message_id,
                     allow_sending_without_reply=True,
                     **kwargs
-                )
+                ), cost=len(chunk), files=tuple(i.media for i in chunk))
                 last_message_id = msgs[-1].message_id
                 sent_messages.extend(msgs)
         elif media_group:
             m = None
             first = media_group[0]
             if isinstance(first, InputMediaPhoto):
-                m = await bot.send_photo(
+                m = await governor.call(target_chat_id, lambda: bot.send_photo(
                     chat_id=target_chat_id,
                     photo=first.media,
                     caption=text,
@@ -282,9 +312,9 @@ async def try_media_album_links(
                     reply_to_message_id=reply_to_message_id,
                     allow_sending_without_reply=True,
                     **kwargs
-                )
+                ), files=(first.media,))
             elif isinstance(first, InputMediaVideo):
-                m = await bot.send_video(
+                m = await governor.call(target_chat_id, lambda: bot.send_video(
                     chat_id=target_chat_id,
                     video=first.media,
                     caption=text,
@@ -292,9 +322,9 @@ async def try_media_album_links(
                     reply_to_message_id=reply_to_message_id,
                     allow_sending_without_reply=True,
                     **kwargs
-                )
+                ), files=(first.media,))
             elif isinstance(first, InputMediaAudio):
-                m = await bot.send_audio(
+                m = await governor.call(target_chat_id, lambda: bot.send_audio(
                     chat_id=target_chat_id,
                     audio=first.media,
                     caption=text,
@@ -302,7 +332,7 @@ async def try_media_album_links(
                     reply_to_message_id=reply_to_message_id,
                     allow_sending_without_reply=True,
                     **kwargs
-                )
+                ), files=(first.media,))
             if m:
                 sent_messages.append(m)
         elif text:
@@ -322,6 +352,67 @@ async def try_media_album_links(
         return e
 
 
+async def try_media_file_ids(
+        bot: AsyncTeleBot,
+        items: list[dict],
+        text: str,
+        chat_id: int = None,
+        message: Message = None,
+        markup=None,
+        reply_to_message_id: int = None,
+        **kwargs) -> list[Message] | Exception:
+    # items: [{"type": "video" | "audio" | "photo" | "document", "file_id": "..."}]
+    try:
+        target_chat_id = chat_id or (message.chat.id if message else None)
+        if not target_chat_id:
+            raise ValueError("chat_id not set")
+        if not items:
+            raise ValueError("no media")
+
+        if len(items) == 1:
+            item = items[0]
+            send = {
+                "video": bot.send_video,
+                "audio": bot.send_audio,
+                "photo": bot.send_photo,
+                "document": bot.send_document,
+            }[item["type"]]
+            m = await governor.call(target_chat_id, lambda: send(
+                target_chat_id,
+                item["file_id"],
+                caption=text,
+                reply_markup=markup,
+                reply_to_message_id=reply_to_message_id,
+                allow_sending_without_reply=True,
+                **kwargs
+            ))
+            return [m]
+
+        input_media = {
+            "video": InputMediaVideo,
+            "audio": InputMediaAudio,
+            "photo": InputMediaPhoto,
+            "document": InputMediaDocument,
+        }
+        media_group = [input_media[item["type"]](item["file_id"]) for item in items]
+        media_group[-1].caption = text
+        sent_messages = []
+        last_message_id = reply_to_message_id
+        for chunk in chunked(media_group, 10):
+            msgs = await governor.call(target_chat_id, lambda: bot.send_media_group(
+                chat_id=target_chat_id,
+                media=chunk,
+                reply_to_message_id=last_message_id,
+                allow_sending_without_reply=True,
+                **kwargs
+            ), cost=len(chunk))
+            last_message_id = msgs[-1].message_id
+            sent_messages.extend(msgs)
+        return sent_messages
+    except Exception as e:
+        return e
+
+
 async def try_video_note(
         bot: AsyncTeleBot,
         chat_id: int,
@@ -330,13 +421,13 @@ async def try_video_note(
         size: int = 360
 ):
     try:
-        return await bot.send_video_note(
+        return await governor.call(chat_id, lambda: bot.send_video_note(
             chat_id=chat_id,
             data=video_bio,
             allow_sending_without_reply=True,
             length=size,
             reply_to_message_id=reply_to_message_id
-        )
+        ), files=(video_bio,))
     except Exception as e:
         return e
 
@@ -348,12 +439,12 @@ async def try_voice(
         reply_to_message_id: int = None
 ):
     try:
-        return await bot.send_voice(
+        return await governor.call(chat_id, lambda: bot.send_voice(
             chat_id=chat_id,
             voice=audio_bio,
             allow_sending_without_reply=True,
             reply_to_message_id=reply_to_message_id
-        )
+        ), files=(audio_bio,))
     except Exception as e:
         return e
 
@@ -368,11 +459,23 @@ async def try_reaction(
     if not message_id and not chat_id and not message: return False
     try:
         e_reaction = ReactionTypeEmoji(emoji=reaction)
-        return await bot.set_message_reaction(
-            chat_id=message.chat.id if message else chat_id,
+        chat_id = message.chat.id if message else chat_id
+        return await governor.call(chat_id, lambda: bot.set_message_reaction(
+            chat_id=chat_id,
             message_id=message.message_id if message else message_id,
             reaction=[e_reaction],
-            **kwargs)
+            **kwargs), priority=PRIORITY_COSMETIC)
+    except Exception as e:
+        return e
+
+
+async def try_chat_action(
+        bot: AsyncTeleBot,
+        chat_id: int,
+        action: str = "typing") -> bool | Exception | None:
+    try:
+        return await governor.call(
+            chat_id, lambda: bot.send_chat_action(chat_id, action), priority=PRIORITY_COSMETIC)
     except Exception as e:
         return e
 
@@ -385,19 +488,22 @@ async def is_admin(bot: AsyncTeleBot, chat_id: int, user_id: int) -> bool:
         return False
 
 
-hist_user_timecall = {}
+async def block_flood(chat_id: int, time_ms: int):
+    await FloodControl().block(chat_id, time_ms)
+
 
-def block_flood(chat_id: int, time_ms: int):
-    hist = hist_user_timecall.setdefault(chat_id, {})
-    cur_time = int(time.time() * 1000)
-    hist["last"] = cur_time + time_ms
+async def check_flood(chat_id: int) -> int:
+    return await FloodControl().check(chat_id)
 
 
-def check_flood(chat_id: int) -> int:
-    hist = hist_user_timecall.setdefault(chat_id, {})
-    cur_time = int(time.time() * 1000)
-    last_update_ms = cur_time - hist.get("last", 0)
-    return int((hist.get("last", 0) - cur_time) / 1000) if last_update_ms < 500 else 0
+async def repeated_call(chat_id: int, key: str) -> bool:
+    return await FloodControl().repeated(chat_id, key)
 
 def is_owner_chat(message: Message) -> bool:
-    return message.chat.id == message.from_user.id
\ No newline at end of file
+    return message.chat.id == message.from_user.id
+
+
+def chat_class(message: Message) -> str:
+    if str(message.chat.id) in load_keys("OWNER_IDS"):
+        return "owner"
+    return "private" if message.chat.type == "private" else "group"
\ No newline at end of file
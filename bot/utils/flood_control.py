@@ -0,0 +1,85 @@
+import time
+from collections import OrderedDict
+
+from utils import load_key
+from utils.redis_utils import RedisClient
+
+CALL_WINDOW_MS = 500
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class _ChatHist:
+    __slots__ = ("last", "calls", "touched")
+
+    def __init__(self):
+        self.last = 0  # blocked until, ms
+        self.calls = {}  # { key: ms }
+        self.touched = 0
+
+
+class FloodControl:
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        self.max_chats = int(load_key("FLOOD_MAX_CHATS") or 100000)
+        self.max_history = int(load_key("FLOOD_MAX_HISTORY") or 16)
+        self.ttl_ms = 60 * 1000
+        self.hist: OrderedDict[int, _ChatHist] = OrderedDict()  # oldest touched first
+        self.shared = load_key("FLOOD_BACKEND") == "redis"
+
+    def _get(self, chat_id: int, cur_time: int) -> _ChatHist:
+        hist = self.hist.get(chat_id)
+        if hist is None:
+            hist = self.hist[chat_id] = _ChatHist()
+        else:
+            self.hist.move_to_end(chat_id)
+        hist.touched = cur_time
+        self._expire(cur_time)
+        return hist
+
+    def _expire(self, cur_time: int):
+        while self.hist:
+            hist = next(iter(self.hist.values()))
+            expired = cur_time - hist.touched >= self.ttl_ms and hist.last + CALL_WINDOW_MS < cur_time
+            if not expired and len(self.hist) <= self.max_chats:
+                break
+            self.hist.popitem(last=False)
+
+    async def block(self, chat_id: int, time_ms: int):
+        cur_time = now_ms()
+        if self.shared:
+            await RedisClient().aio().set(f"flood:{chat_id}:last", cur_time + time_ms, px=time_ms + CALL_WINDOW_MS)
+            return
+        self._get(chat_id, cur_time).last = cur_time + time_ms
+
+    async def check(self, chat_id: int) -> int:
+        cur_time = now_ms()
+        if self.shared:
+            last = int(await RedisClient().aio().get(f"flood:{chat_id}:last") or 0)
+        else:
+            last = self._get(chat_id, cur_time).last
+        last_update_ms = cur_time - last
+        return int((last - cur_time) / 1000) if last_update_ms < CALL_WINDOW_MS else 0
+
+    async def repeated(self, chat_id: int, key: str, window_ms: int = CALL_WINDOW_MS) -> bool:
+        # tells if the same key was called within the window, otherwise records the call
+        cur_time = now_ms()
+        if self.shared:
+            return not await RedisClient().aio().set(f"flood:{chat_id}:call:{key}", cur_time, px=window_ms, nx=True)
+        calls = self._get(chat_id, cur_time).calls
+        if cur_time - calls.get(key, 0) < window_ms:
+            return True
+        calls.pop(key, None)
+        calls[key] = cur_time
+        if len(calls) > self.max_history:
+            del calls[next(iter(calls))]
+        return False
@@ -0,0 +1,167 @@
+from functools import lru_cache
+from html.entities import html5
+from html.parser import HTMLParser
+
+ALLOWED_TAGS = {
+    "a", "b", "strong", "i", "em", "u", "ins", "blockquote"
+    "s", "strike", "del", "tg-spoiler", "code", "pre", "label"
+}
+ALLOWED_ATTRS = {
+    "a": {"href"},
+}
+DROP_CONTENT_TAGS = {"script", "style"}
+PRESERVE_WHITESPACE_TAGS = {"pre", "textarea"}
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link", "menuitem",
+    "meta", "param", "source", "track", "wbr", "basefont", "bgsound", "command", "image",
+    "isindex", "nextid", "spacer",
+}
+
+_entities = {name.rstrip(";"): char for name, char in html5.items()}
+_escape_table = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+_ascii_spaces = str.maketrans("", "", "\x20\x0a\x09\x0c\x0d")
+
+
+def _escape(text: str) -> str:
+    return text.translate(_escape_table)
+
+
+def _quote_attr(value: str) -> str:
+    value = _escape(value)
+    if '"' not in value:
+        return f'"{value}"'
+    if "'" not in value:
+        return f"'{value}'"
+    return '"' + value.replace('"', "&quot;") + '"'
+
+
+class TelegramHTMLSanitizer(HTMLParser):
+    # gets the same html.parser events as BeautifulSoup, but writes output right away
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.out = []
+        self.data = []
+        self.stack = []  # open tag names, allowed or not
+        self.already_closed = []  # void tags closed on start
+        self.drop = False  # inside script/style
+
+    def feed_all(self, html: str) -> str:
+        self.feed(html)
+        self.close()
+        self.flush()
+        for name in reversed(self.stack):
+            if name in ALLOWED_TAGS:
+                self.out.append(f"</{name}>")
+        self.stack.clear()
+        return "".join(self.out)
+
+    def preserve_whitespace(self) -> bool:
+        return any(n in PRESERVE_WHITESPACE_TAGS for n in self.stack)
+
+    def flush(self):
+        # text between two events is one string, whitespace-only strings collapse like in BeautifulSoup
+        if not self.data:
+            return
+        data = "".join(self.data)
+        self.data.clear()
+        if self.drop:
+            return
+        if not data.translate(_ascii_spaces) and not self.preserve_whitespace():
+            data = "\n" if "\n" in data else " "
+        self.out.append(_escape(data))
+
+    def _pop_to(self, tag: str):
+        if tag not in self.stack:
+            return
+        while self.stack:
+            name = self.stack.pop()
+            if name in DROP_CONTENT_TAGS:
+                self.drop = any(n in DROP_CONTENT_TAGS for n in self.stack)
+            elif name in ALLOWED_TAGS and not self.drop:
+                self.out.append(f"</{name}>")
+            if name == tag:
+                break
+
+    def handle_starttag(self, tag: str, attrs: list, handle_empty_element: bool = True):
+        self.flush()
+        self.stack.append(tag)
+        if tag in DROP_CONTENT_TAGS:
+            self.drop = True
+        elif tag in ALLOWED_TAGS and not self.drop:
+            allowed = ALLOWED_ATTRS.get(tag, ())
+            values = {}
+            for key, value in attrs:
+                if key in allowed:
+                    values[key] = "" if value is None else value
+            self.out.append(f"<{tag}" + "".join(f" {k}={_quote_attr(v)}" for k, v in values.items()) + ">")
+        if tag in VOID_TAGS and handle_empty_element:
+            self._pop_to(tag)
+            self.already_closed.append(tag)
+
+    def handle_startendtag(self, tag: str, attrs: list):
+        self.handle_starttag(tag, attrs, handle_empty_element=False)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag: str):
+        if tag in self.already_closed:
+            self.already_closed.remove(tag)
+        else:
+            self.flush()
+            self._pop_to(tag)
+
+    def handle_data(self, data: str):
+        self.data.append(data)
+
+    def handle_charref(self, name: str):
+        num = int(name[1:], 16) if name[:1] in ("x", "X") else int(name)
+        data = None
+        if num < 256:
+            try:
+                data = bytes([num]).decode("windows-1252")
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(num)
+            except (ValueError, OverflowError):
+                pass
+        self.handle_data(data or "\N{REPLACEMENT CHARACTER}")
+
+    def handle_entityref(self, name: str):
+        self.handle_data(_entities.get(name, f"&{name}"))
+
+    def handle_comment(self, data: str):
+        self.flush()
+        # empty comments in pre are not matched as comments by BeautifulSoup and were kept
+        if not data and not self.drop and self.preserve_whitespace():
+            self.out.append("<!---->")
+
+    def handle_decl(self, decl: str):
+        self.flush()
+        if not self.drop:
+            self.out.append(f"<!DOCTYPE {decl[len('DOCTYPE '):]}>\n")
+
+    def unknown_decl(self, data: str):
+        self.flush()
+        if not self.drop and data.upper().startswith("CDATA["):
+            self.out.append(f"<![CDATA[{data[len('CDATA['):]}]]>")
+        elif not self.drop:
+            self.out.append(f"<?{data}?>")
+
+    def handle_pi(self, data: str):
+        self.flush()
+        if not self.drop:
+            self.out.append(f"<?{data}>")
+
+
+@lru_cache(maxsize=1024)
+def _sanitize(html: str) -> str:
+    html = html.replace("<blockquote>", " <label>").replace("</blockquote>", "</label> ")
+    cleaned = TelegramHTMLSanitizer().feed_all(html)
+    return cleaned.replace("<label>", "<blockquote>").replace("</label>", "</blockquote>")
+
+
+def sanitize_html(html: str) -> str:
+    if "<" not in html and "&" not in html and ">" not in html and html.translate(_ascii_spaces):
+        return html
+    return _sanitize(html)
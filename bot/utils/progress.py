@@ -0,0 +1,168 @@
+import asyncio
+import time
+
+from telebot.async_telebot import AsyncTeleBot
+from telebot.types import Message
+
+from utils import load_key
+from utils.logging_utils import setup_temp_logger
+from .bot_utils import governor, try_sticker, try_delete, try_send, try_chat_action
+
+MODE_NONE = "none"
+MODE_ACTION = "action"
+MODE_STICKER = "sticker"
+MODE_STATUS = "status"
+
+
+class Progress:
+    mode = MODE_NONE
+
+    def __init__(self, bot: AsyncTeleBot, message: Message):
+        self.bot = bot
+        self.message = message
+        self.calls = 0
+        self.started_at = 0.0
+
+    async def start(self):
+        self.started_at = time.monotonic()
+
+    async def stop(self):
+        if self.started_at:
+            ProgressManager().record(self)
+        self.started_at = 0.0
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+
+class ActionProgress(Progress):
+    mode = MODE_ACTION
+    refresh_sec = 4.5  # Telegram shows an action for 5 seconds
+
+    def __init__(self, bot: AsyncTeleBot, message: Message, action: str = "typing",
+                 refresh: bool = True, max_time: float = 300):
+        super().__init__(bot, message)
+        self.action = action
+        self.refresh = refresh
+        self.max_time = max_time
+        self.task: asyncio.Task | None = None
+
+    async def _send(self):
+        self.calls += 1
+        await try_chat_action(self.bot, self.message.chat.id, self.action)
+
+    async def _loop(self):
+        while time.monotonic() - self.started_at < self.max_time:
+            await asyncio.sleep(self.refresh_sec)
+            await self._send()
+
+    async def start(self):
+        await super().start()
+        await self._send()
+        if self.refresh:
+            self.task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        await super().stop()
+
+
+class StickerProgress(Progress):
+    mode = MODE_STICKER
+
+    def __init__(self, bot: AsyncTeleBot, message: Message, sticker: str):
+        super().__init__(bot, message)
+        self.sticker = sticker
+        self.m_sticker = None
+
+    async def start(self):
+        await super().start()
+        self.calls += 1
+        self.m_sticker = await try_sticker(
+            self.bot, self.sticker, message=self.message, reply_to_message_id=self.message.message_id)
+
+    async def stop(self):
+        if isinstance(self.m_sticker, Message):
+            self.calls += 1
+            await try_delete(self.bot, message=self.m_sticker)
+        self.m_sticker = None
+        await super().stop()
+
+
+class StatusProgress(Progress):
+    mode = MODE_STATUS
+
+    def __init__(self, bot: AsyncTeleBot, message: Message, text: str = "⏳"):
+        super().__init__(bot, message)
+        self.text = text
+        self.m_status = None
+
+    async def start(self):
+        await super().start()
+        self.calls += 1
+        self.m_status = await try_send(
+            self.bot, self.message.chat.id, self.text, reply_to_message_id=self.message.message_id)
+
+    async def stop(self):
+        if isinstance(self.m_status, Message):
+            self.calls += 1
+            await try_delete(self.bot, message=self.m_status)
+        self.m_status = None
+        await super().stop()
+
+
+class ProgressManager:
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        self.logger = setup_temp_logger('Progress')
+        self.mode = load_key("PROGRESS_MODE") or MODE_STICKER
+        # above this many queued outgoing calls only one chat action is sent
+        self.load_threshold = int(load_key("PROGRESS_LOAD_THRESHOLD") or 50)
+        self.stats_interval = 300
+        self.stats = {}  # { mode: {"requests": 0, "calls": 0, "time": 0.0} }
+
+    def create(self, bot: AsyncTeleBot, message: Message, action: str = "typing", sticker: str = None) -> Progress:
+        if governor.depth() >= self.load_threshold:
+            return ActionProgress(bot, message, action, refresh=False)
+        if self.mode == MODE_ACTION:
+            return ActionProgress(bot, message, action)
+        if self.mode == MODE_STICKER and sticker:
+            return StickerProgress(bot, message, sticker)
+        if self.mode == MODE_STATUS:
+            return StatusProgress(bot, message)
+        return Progress(bot, message)
+
+    def record(self, progress: Progress):
+        stats = self.stats.setdefault(progress.mode, {"requests": 0, "calls": 0, "time": 0.0})
+        stats["requests"] += 1
+        stats["calls"] += progress.calls
+        stats["time"] += time.monotonic() - progress.started_at
+
+    def get_stats(self) -> dict:
+        return {
+            mode: {
+                "requests": s["requests"],
+                "calls": s["calls"],
+                "calls_per_request": round(s["calls"] / s["requests"], 2) if s["requests"] else 0.0,
+                "time_avg": round(s["time"] / s["requests"], 2) if s["requests"] else 0.0,
+            }
+            for mode, s in self.stats.items()
+        }
+
+    async def stats_loop(self):
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            self.logger.info(f"Progress stats: {self.get_stats()}")
@@ -0,0 +1,311 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Awaitable, Callable
+
+from telebot.asyncio_helper import ApiTelegramException
+
+from utils import load_key
+from utils.logging_utils import setup_temp_logger
+
+# lower value goes first
+PRIORITY_REPLY = 0
+PRIORITY_SERVICE = 1
+PRIORITY_COSMETIC = 2
+PRIORITIES = (PRIORITY_REPLY, PRIORITY_SERVICE, PRIORITY_COSMETIC)
+# deletes, chat actions, stickers and reactions are not counted in the per-chat message limits
+CHAT_EXEMPT = (PRIORITY_SERVICE, PRIORITY_COSMETIC)
+
+# { (chat_id, message_id) } sent by the current command and not deleted, set by the command runner
+sent_messages: ContextVar[set | None] = ContextVar("sent_messages", default=None)
+
+
+def remember_sent(chat_id: int | None, result):
+    sent = sent_messages.get()
+    if sent is None:
+        return
+    for m in result if isinstance(result, list) else (result,):
+        if hasattr(m, "message_id"):
+            sent.add((chat_id, m.message_id))
+
+
+def forget_sent(chat_id: int | None, message_id: int):
+    sent = sent_messages.get()
+    if sent is not None:
+        sent.discard((chat_id, message_id))
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float, cost: float = 1) -> float:
+        self.refill(now)
+        # a cost above the capacity (an album of 10 in a chat with burst 3) goes once the bucket is full,
+        # take() leaves it negative so the next calls wait for the rest
+        need = min(cost, self.capacity)
+        return 0.0 if self.tokens >= need else (need - self.tokens) / self.rate
+
+    def take(self, cost: float = 1):
+        self.tokens -= cost
+
+    def is_full(self, now: float) -> bool:
+        self.refill(now)
+        return self.tokens >= self.capacity
+
+
+class SendGovernor:
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        self.logger = setup_temp_logger('SendGovernor')
+        # every shard and job worker process has its own governor, the bot limit is split between them,
+        # per-chat limits stay as they are because a chat is always handled by the same shard
+        self.global_rate = float(load_key("SEND_GLOBAL_RATE") or 30) / self.senders()
+        self.chat_rate = float(load_key("SEND_CHAT_RATE") or 1)
+        self.chat_burst = float(load_key("SEND_CHAT_BURST") or 3)
+        self.group_rate = float(load_key("SEND_GROUP_PER_MIN") or 20) / 60
+        self.group_burst = float(load_key("SEND_GROUP_BURST") or 5)
+        self.max_retries = int(load_key("SEND_MAX_RETRIES") or 3)
+        self.cosmetic_limit = int(load_key("SEND_COSMETIC_LIMIT") or 100)
+        self.max_buckets = 10000
+        self.stats_interval = 300
+        self.loop = None
+        self.reset()
+
+    @staticmethod
+    def senders() -> int:
+        senders = max(1, int(load_key("BOT_SHARDS") or 1))
+        if load_key("JOB_QUEUE"):
+            senders += max(1, int(load_key("JOB_PROCESSES") or 1))
+        return senders
+
+    def reset(self):
+        self.global_bucket = TokenBucket(self.global_rate, self.global_rate)
+        self.chat_buckets: dict[int, TokenBucket] = {}
+        self.blocked_until: dict[int | None, float] = {}  # None key blocks everything
+        # { chat_id: (deque[(enqueued_at, cost, future)] per priority) }
+        self.pending: dict[int | None, tuple[deque, ...]] = {}
+        # chats with calls of the priority that can go now, served round robin
+        self.ready = {p: deque() for p in PRIORITIES}
+        # throttled (chat_id, priority) -> wake time, with a heap of wake times
+        self.sleeping: dict[tuple, float] = {}
+        self.timers = []  # heap[(wake_at, seq, chat_id, priority)]
+        self.seq = itertools.count()
+        self.queued = 0
+        self.wakeup = asyncio.Event()
+        self.dispatcher = None
+        self.stats = {
+            "granted": 0, "throttled": 0, "retried": 0, "failed_429": 0, "dropped": 0,
+            "wait_total": 0.0, "wait_max": 0.0,
+        }
+
+    def ensure_dispatcher(self):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            # new event loop (restart or another process), old state belongs to a dead loop
+            self.loop = loop
+            self.reset()
+        if self.dispatcher is None or self.dispatcher.done():
+            self.dispatcher = loop.create_task(self._dispatch())
+
+    def depth(self) -> int:
+        return self.queued
+
+    def chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= self.max_buckets:
+                now = time.monotonic()
+                self.chat_buckets = {k: v for k, v in self.chat_buckets.items() if not v.is_full(now)}
+            if isinstance(chat_id, int) and chat_id < 0:
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    def chat_delay(self, chat_id: int | None, cost: float, now: float) -> float:
+        delay = max(0.0, self.blocked_until.get(chat_id, 0) - now)
+        if chat_id is not None:
+            delay = max(delay, self.chat_bucket(chat_id).delay(now, cost))
+        return delay
+
+    def _wake(self, now: float):
+        while self.timers and self.timers[0][0] <= now:
+            _, _, chat_id, priority = heapq.heappop(self.timers)
+            if self.sleeping.pop((chat_id, priority), None) is None:
+                continue
+            if (queues := self.pending.get(chat_id)) and queues[priority]:
+                self.ready[priority].append(chat_id)
+
+    def _forget(self, chat_id: int | None):
+        if not any(self.pending[chat_id]):
+            del self.pending[chat_id]
+
+    def _grant(self, now: float) -> bool:
+        for priority in PRIORITIES:
+            ready = self.ready[priority]
+            while ready:
+                chat_id = ready.popleft()
+                queue = self.pending[chat_id][priority]
+                while queue and queue[0][2].done():
+                    queue.popleft()
+                    self.queued -= 1
+                if not queue:
+                    self._forget(chat_id)
+                    continue
+                enqueued_at, cost, future = queue[0]
+                delay = self.chat_delay(chat_id, cost, now)
+                if delay > 0:
+                    # the chat leaves the ready queue until its bucket refills
+                    self.sleeping[(chat_id, priority)] = now + delay
+                    heapq.heappush(self.timers, (now + delay, next(self.seq), chat_id, priority))
+                    continue
+                queue.popleft()
+                self.queued -= 1
+                self.global_bucket.take()
+                if chat_id is not None and cost:
+                    self.chat_bucket(chat_id).take(cost)
+                if queue:
+                    ready.append(chat_id)
+                else:
+                    self._forget(chat_id)
+                wait = now - enqueued_at
+                self.stats["granted"] += 1
+                self.stats["wait_total"] += wait
+                self.stats["wait_max"] = max(self.stats["wait_max"], wait)
+                future.set_result(None)
+                return True
+        return False
+
+    async def _dispatch(self):
+        while True:
+            now = time.monotonic()
+            self._wake(now)
+            if not any(self.ready.values()):
+                # every queued chat is throttled, sleep until the first one frees up or a new call arrives
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), self.timers[0][0] - now if self.timers else None)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            wait = max(self.global_bucket.delay(now), self.blocked_until.get(None, 0) - now)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            self._grant(now)
+
+    async def acquire(self, chat_id: int | None, priority: int = PRIORITY_REPLY, cost: int = 1):
+        self.ensure_dispatcher()
+        if priority in CHAT_EXEMPT:
+            cost = 0
+        now = time.monotonic()
+        if self.chat_delay(chat_id, cost, now) > 0 or self.depth():
+            self.stats["throttled"] += 1
+        future = self.loop.create_future()
+        queues = self.pending.get(chat_id)
+        if queues is None:
+            queues = self.pending[chat_id] = tuple(deque() for _ in PRIORITIES)
+        queue = queues[priority]
+        # a chat with queued calls is already in the ready queue or sleeping
+        if not queue and (chat_id, priority) not in self.sleeping:
+            self.ready[priority].append(chat_id)
+        queue.append((now, cost, future))
+        self.queued += 1
+        self.wakeup.set()
+        await future
+
+    def block(self, chat_id: int | None, retry_after: float):
+        until = time.monotonic() + retry_after
+        self.blocked_until[chat_id] = max(self.blocked_until.get(chat_id, 0), until)
+        if len(self.blocked_until) > self.max_buckets:
+            now = time.monotonic()
+            self.blocked_until = {k: v for k, v in self.blocked_until.items() if v > now}
+
+    async def call(
+            self,
+            chat_id: int | None,
+            request: Callable[[], Awaitable],
+            priority: int = PRIORITY_REPLY,
+            cost: int = 1,
+            files: tuple = ()):
+        if priority == PRIORITY_COSMETIC and self.depth() >= self.cosmetic_limit:
+            self.stats["dropped"] += 1
+            return None
+        attempt = 0
+        while True:
+            await self.acquire(chat_id, priority, cost)
+            for f in files:
+                if hasattr(f, "seek"):
+                    f.seek(0)
+            try:
+                result = await request()
+                if priority == PRIORITY_REPLY:
+                    remember_sent(chat_id, result)
+                return result
+            except ApiTelegramException as e:
+                if e.error_code != 429:
+                    raise
+                retry_after = (e.result_json or {}).get("parameters", {}).get("retry_after", 1)
+                self.block(chat_id, retry_after)
+                if attempt >= self.max_retries:
+                    self.stats["failed_429"] += 1
+                    raise
+                attempt += 1
+                self.stats["retried"] += 1
+                self.logger.warning(f"429 for [{chat_id}], retry {attempt}/{self.max_retries} in {retry_after}s")
+
+    def get_stats(self) -> dict:
+        granted = self.stats["granted"]
+        return {
+            "depth": {p: sum(len(q[p]) for q in self.pending.values()) for p in PRIORITIES},
+            "granted": granted,
+            "throttled": self.stats["throttled"],
+            "retried": self.stats["retried"],
+            "failed_429": self.stats["failed_429"],
+            "dropped": self.stats["dropped"],
+            "blocked_chats": sum(1 for v in self.blocked_until.values() if v > time.monotonic()),
+            "wait_avg": round(self.stats["wait_total"] / granted, 4) if granted else 0.0,
+            "wait_max": round(self.stats["wait_max"], 4),
+        }
+
+    async def stats_loop(self):
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            self.logger.info(f"Send governor stats: {self.get_stats()}")
+
+    async def stop(self):
+        if self.dispatcher and not self.dispatcher.done():
+            self.dispatcher.cancel()
+            await asyncio.gather(self.dispatcher, return_exceptions=True)
+        for queues in self.pending.values():
+            for queue in queues:
+                for _, _, future in queue:
+                    future.cancel()
+        self.pending.clear()
+        for ready in self.ready.values():
+            ready.clear()
+        self.sleeping.clear()
+        self.timers.clear()
+        self.queued = 0
@@ -0,0 +1,97 @@
+import asyncio
+import hmac
+from logging import Logger
+from typing import Awaitable, Callable
+
+from aiohttp import web
+from telebot.async_telebot import AsyncTeleBot
+from telebot.types import Update
+
+from utils import load_key
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    def __init__(
+            self,
+            bot: AsyncTeleBot,
+            logger: Logger,
+            url: str,
+            secret: str = "",
+            host: str = "0.0.0.0",
+            port: int = 8080,
+            path: str = "/webhook",
+            dispatch: Callable[[dict], Awaitable] = None):
+        self.bot = bot
+        self.logger = logger
+        self.path = "/" + path.strip("/")
+        self.url = url.rstrip("/") + self.path if url else ""
+        self.secret = secret
+        self.host = host
+        self.port = port
+        self.dispatch = dispatch
+        self.runner: web.AppRunner | None = None
+        self.tasks = set()
+
+    @classmethod
+    def from_env(cls, bot: AsyncTeleBot, logger: Logger,
+                 dispatch: Callable[[dict], Awaitable] = None) -> "WebhookServer | None":
+        if not (url := load_key("WEBHOOK_URL")):
+            return None
+        if not load_key("WEBHOOK_SECRET"):
+            # without it anyone who finds the url can send updates as any user
+            raise RuntimeError("WEBHOOK_SECRET is not set in environment, it is required with WEBHOOK_URL")
+        return cls(
+            bot, logger,
+            url=url,
+            secret=load_key("WEBHOOK_SECRET"),
+            host=load_key("WEBHOOK_HOST") or "0.0.0.0",
+            port=int(load_key("WEBHOOK_PORT") or 8080),
+            path=load_key("WEBHOOK_PATH") or "/webhook",
+            dispatch=dispatch,
+        )
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        return app
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if not self.secret or not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+            if self.dispatch:
+                await self.dispatch(data)
+                return web.Response()
+            update = Update.de_json(data)
+        except Exception:
+            return web.Response(status=400)
+        # answer Telegram right away, the update is handled in background
+        task = asyncio.create_task(self.process_update(update))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return web.Response()
+
+    async def process_update(self, update: Update):
+        try:
+            await self.bot.process_new_updates([update])
+        except Exception:
+            self.logger.exception(f"Exception while processing webhook update {update.update_id}")
+
+    async def start(self):
+        self.runner = web.AppRunner(self.make_app())
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        self.logger.info(f"Webhook server listening on {self.host}:{self.port}{self.path}")
+        if self.url:
+            await self.bot.set_webhook(url=self.url, secret_token=self.secret)
+            self.logger.info(f"Webhook set to {self.url}")
+
+    async def stop(self):
+        for task in list(self.tasks):
+            task.cancel()
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
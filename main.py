@@ -1,4 +1,5 @@
 from bot.async_telebot import TelegramBot
+from bot.shard_supervisor import ShardSupervisor
 from utils import load_key, setup_logger
 
 
@@ -8,6 +9,10 @@ def main() -> None:
 
     logger = setup_logger('BotMain', 'bot.log')
 
+    if (shards := int(load_key("BOT_SHARDS") or 1)) > 1:
+        ShardSupervisor(BOT_TOKEN, logger, shards).run()
+        return
+
     telegram_bot = TelegramBot(BOT_TOKEN, logger)
 
     telegram_bot.run()
@@ -0,0 +1,15 @@
+import sys
+
+from utils import setup_logger
+from utils.redis_utils import RedisClient
+from utils.user_settings import RedisSettingsStore
+
+
+def main() -> None:
+    # moves old `user:{id}:lang` keys into the bucketed settings hashes, `--keep` leaves the old keys
+    logger = setup_logger('SettingsMigration', 'migration.log')
+    RedisSettingsStore(RedisClient()).migrate(logger, delete="--keep" not in sys.argv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import re
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("telebot")
+
+from bot.command_router import CommandRouter
+
+
+def make_router() -> CommandRouter:
+    router = CommandRouter()
+    router.add_command("dl", "downloader")
+    router.add_command("help", "base")
+    router.add_pattern(re.compile(r"^/(dl|download)(?:@\w+)?", re.IGNORECASE), "downloader")
+    router.add_pattern(re.compile(r"^/help_(dl|download)(?:@\w+)?", re.IGNORECASE), "downloader")
+    router.compile()
+    return router
+
+
+@pytest.mark.parametrize("text, instance, command, bot_name, pattern", [
+    ("/dl https://x.com/a", "downloader", "dl", "", ""),
+    ("/DL@My_Bot link", "downloader", "dl", "my_bot", ""),
+    ("/help", "base", "help", "", ""),
+    ("/Download link", "downloader", "download", "", r"^/(dl|download)(?:@\w+)?"),
+    ("/help_dl@my_bot", "downloader", "help_dl", "my_bot", r"^/help_(dl|download)(?:@\w+)?"),
+])
+def test_routes(text, instance, command, bot_name, pattern):
+    route = make_router().classify(SimpleNamespace(any_text=text))
+    assert (route.instance, route.command, route.bot_name, route.pattern) == (instance, command, bot_name, pattern)
+
+
+@pytest.mark.parametrize("text", ["hello", "", None, "/unknown", "/", "https://x.com/dl"])
+def test_no_route(text):
+    assert make_router().classify(SimpleNamespace(any_text=text)) is None
+
+
+def test_result_is_kept_on_message():
+    router = make_router()
+    hit, miss = SimpleNamespace(any_text="/dl x"), SimpleNamespace(any_text="/unknown")
+    assert router.classify(hit) is router.classify(hit)
+    assert router.classify(miss) is None
+    # the miss is not matched again, even when a later pattern would match it
+    router.add_pattern(re.compile(r"^/unknown"), "other")
+    router.compile()
+    assert router.classify(miss) is None
+    assert router.classify(SimpleNamespace(any_text="/unknown")).instance == "other"
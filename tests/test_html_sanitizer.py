@@ -0,0 +1,102 @@
+"""Differential test of sanitize_html against the BeautifulSoup version it replaced."""
+import glob
+import json
+import os
+import random
+
+import pytest
+
+bs4 = pytest.importorskip("bs4")
+if not bs4.__version__.startswith("4.13."):
+    # output of entities and character references changed in later versions
+    pytest.skip("reference output is from beautifulsoup4 4.13 (requirements.txt)", allow_module_level=True)
+
+from bot.utils.html_sanitizer import ALLOWED_ATTRS, ALLOWED_TAGS, sanitize_html
+
+DIR_STRINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "strings")
+
+EDGE_CASES = [
+    "<code>x < y && z > 1</code>", "<blockquote expandable><pre><code class='json'>{\"a\": 1}</code></pre></blockquote>",
+    "<a href='https://x.y/?a=1&b=2'>link</a>", "<a href=\"x'y\">q</a>", "<a href=\"a'b&quot;c\">q</a>",
+    "<b><i>unclosed", "</b>stray", "<script>alert(1)</script>ok<style>p{}</style>", "<!-- c -->x",
+    "&amp; &lt; &gt; &nbsp; &copy &#169; &#x41; &#128; &#0; &#99999999; &bogus; &", "<br>a<br/>b</br>",
+    "<br><br/><b>x</br>y</b>", "<div><p>para</p></div>", "<B>Upper</B>", "<a HREF=x onclick=y>z</a>",
+    "<!DOCTYPE html><html><body><b>x</b></body></html>", "<?php x ?>", "<![CDATA[x]]>", "<tg-spoiler>s</tg-spoiler>",
+    "<b>a</i>b</b>", "<b><script>x", "a > b", "<blockquote>q</blockquote>", "<pre><code>x</pre></code>", "<a>",
+    "<a href>x</a>", "<img src=x>y", "<u/>z", "1 < 2", "<3 you", "a <b c", "<", "</", "<!", "<!-", "x&#", "&#x;",
+    "", " ", "\n", "   \n  ", "<pre>  </pre>", "text\n\n<b> </b>\n", "<i>a</i> <i>b</i>", "&lt;b&gt;",
+]
+ALPHABET = [
+    "<b>", "</b>", "<i>", "</i>", "<a href='u'>", "</a>", "<br>", "<br/>", "</br>", "<script>", "</script>",
+    "<blockquote>", "</blockquote>", "<div>", "</div>", "<code>", "</code>", "&amp;", "&lt;", "&", "<", ">", "x", " ",
+    "\n", "'", '"', "&#65;", "<!--", "-->", "<p>", "</p>", "<hr>", "<style>", "</style>", "<pre>", "</pre>", "\t",
+    "<!DOCTYPE x>", "<?pi>", "<![CDATA[y]]>", "<textarea>", "</textarea>", "<label>", "</label>", "<img src=\"a\">",
+    "<a href=\"q'\">",
+]
+
+
+def bs4_sanitize(html: str) -> str:
+    # _sanitize_html_for_telegram before the single-pass parser
+    html = html.replace("<blockquote>", " <label>").replace("</blockquote>", "</label> ")
+    soup = bs4.BeautifulSoup(html, "html.parser")
+    for node in soup.find_all(string=lambda text: isinstance(text, bs4.Comment)):
+        node.extract()
+    for script in soup(["script", "style"]):
+        script.decompose()
+
+    for tag in soup.find_all():
+        name = str(tag.name).lower()
+
+        if name not in ALLOWED_TAGS:
+            tag.unwrap()
+            continue
+
+        allowed = ALLOWED_ATTRS.get(name, set())
+        for attr in list(tag.attrs):
+            if attr not in allowed:
+                del tag.attrs[attr]
+    cleaned = "".join(str(x) for x in soup.body.contents) if soup.body else str(soup)
+    cleaned = cleaned.replace("<label>", "<blockquote>").replace("</label>", "</blockquote>")
+    return cleaned
+
+
+def bot_strings() -> list[str]:
+    found = []
+
+    def walk(value):
+        if isinstance(value, str):
+            found.append(value)
+        elif isinstance(value, dict):
+            for v in value.values():
+                walk(v)
+        elif isinstance(value, list):
+            for v in value:
+                walk(v)
+
+    for path in sorted(glob.glob(os.path.join(DIR_STRINGS, "**", "*.json"), recursive=True)):
+        with open(path, encoding="utf-8") as f:
+            walk(json.load(f))
+    return found
+
+
+def random_markup(count: int, seed: int = 1) -> list[str]:
+    rnd = random.Random(seed)
+    return ["".join(rnd.choice(ALPHABET) for _ in range(rnd.randint(1, 15))) for _ in range(count)]
+
+
+def corpus(random_count: int = 5000) -> list[str]:
+    return bot_strings() + EDGE_CASES + random_markup(random_count)
+
+
+def test_bot_strings_are_found():
+    assert len(bot_strings()) > 100
+
+
+@pytest.mark.parametrize("html", EDGE_CASES)
+def test_edge_cases(html):
+    assert sanitize_html(html) == bs4_sanitize(html)
+
+
+def test_same_output_as_bs4():
+    mismatches = [html for html in corpus() if sanitize_html(html) != bs4_sanitize(html)]
+    assert mismatches == []
@@ -0,0 +1,187 @@
+"""Which failed jobs are retried and how they come back to the stream."""
+import asyncio
+import json
+import os
+
+import pytest
+
+pytest.importorskip("telebot")
+pytest.importorskip("redis")
+
+import aiohttp
+import redis
+from telebot.asyncio_helper import ApiTelegramException
+from telebot.types import Message
+
+from bot.modules.base_commands import BaseCommands, is_transient
+from bot.utils import bot_utils
+from utils.job_queue import JobQueue
+from utils.strings_manager import update_langs
+
+CHAT_ID = 1001
+
+
+def telegram_error(code: int, description: str) -> ApiTelegramException:
+    return ApiTelegramException("sendVideo", None, {"error_code": code, "description": description})
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []  # texts
+        self.deleted = []
+        self.message_id = 100
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.message_id += 1
+        self.sent.append(text)
+        return message(text, self.message_id, chat_id)
+
+    async def delete_message(self, chat_id, message_id):
+        self.deleted.append(message_id)
+        return True
+
+
+def message(text: str = "/dl https://example.com/v", message_id: int = 1, chat_id: int = CHAT_ID) -> Message:
+    return Message.de_json({
+        "message_id": message_id, "date": 0, "text": text,
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": CHAT_ID, "is_bot": False, "first_name": "User"},
+    })
+
+
+@pytest.mark.parametrize("error, transient", [
+    (ConnectionResetError(), True),
+    (asyncio.TimeoutError(), True),
+    (aiohttp.ServerDisconnectedError(), True),
+    (telegram_error(429, "Too Many Requests"), True),
+    (telegram_error(502, "Bad Gateway"), True),
+    (telegram_error(400, "Bad Request: file is too big"), False),
+    (ValueError("video not founded"), False),
+    (KeyError("url"), False),
+])
+def test_is_transient(error, transient):
+    assert is_transient(error) is transient
+
+
+def run_command(monkeypatch, make) -> tuple[FakeBot, Exception | None]:
+    # make(bot) returns the command function
+    bot = FakeBot()
+    commands = BaseCommands(bot, {"dl": make(bot)}, {}, "downloader")
+
+    async def no_sticker(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(bot_utils, "try_sticker", no_sticker)
+
+    async def main():
+        update_langs.set({})
+        try:
+            await commands.make_command(message(), command="dl", raise_errors=True)
+        except Exception as e:
+            return e
+    return bot, asyncio.run(main())
+
+
+def test_network_error_is_retried(monkeypatch):
+    def make(bot):
+        async def dl(message):
+            raise ConnectionResetError("reset by peer")
+        return dl
+
+    bot, error = run_command(monkeypatch, make)
+    assert isinstance(error, ConnectionResetError)
+    assert bot.sent == []
+
+
+def test_deterministic_error_is_answered_at_once(monkeypatch):
+    def make(bot):
+        async def dl(message):
+            raise ValueError("video not founded")
+        return dl
+
+    bot, error = run_command(monkeypatch, make)
+    assert error is None
+    assert len(bot.sent) == 1 and "video not founded" in bot.sent[0]
+
+
+def test_command_that_answered_is_not_run_again(monkeypatch):
+    def make(bot):
+        async def dl(message):
+            await bot_utils.try_send(bot, message.chat.id, "first part")
+            raise ConnectionResetError("reset by peer")
+        return dl
+
+    bot, error = run_command(monkeypatch, make)
+    assert error is None
+    assert bot.sent[0] == "first part"
+    assert len(bot.sent) == 2  # and the error
+
+
+def test_deleted_status_message_is_not_an_answer(monkeypatch):
+    def make(bot):
+        async def dl(message):
+            status = await bot_utils.try_send(bot, message.chat.id, "⏳")
+            await bot_utils.try_delete(bot, message=status)
+            raise ConnectionResetError("reset by peer")
+        return dl
+
+    bot, error = run_command(monkeypatch, make)
+    assert isinstance(error, ConnectionResetError)
+    assert bot.deleted == [101]
+
+
+def redis_or_skip() -> redis.Redis:
+    client = redis.Redis(port=int(os.getenv("TEST_REDIS_PORT") or 6379), db=15, decode_responses=True)
+    try:
+        client.ping()
+    except redis.ConnectionError:
+        pytest.skip("needs a Redis server")
+    return client
+
+
+def test_retry_waits_before_the_job_comes_back():
+    client = redis_or_skip()
+    client.flushdb()
+
+    async def main():
+        queue = JobQueue(port=client.connection_pool.connection_kwargs["port"], db=15,
+                         stream="test:jobs", retry_delay=0.5)
+        await queue.ensure_group()
+        entry_id = await queue.enqueue({"module": "downloader", "command": "dl"})
+        await queue.retry(entry_id, {"data": json.dumps({"module": "downloader"}), "attempt": "0"}, "reset")
+        assert await queue.redis.xlen(queue.stream) == 0
+        assert await queue.move_due() == 0
+        await asyncio.sleep(0.6)
+        assert await queue.move_due() == 1
+        entries = await queue.redis.xrange(queue.stream)
+        assert [fields for _, fields in entries] == [{"data": json.dumps({"module": "downloader"}), "attempt": "1"}]
+        assert await queue.redis.zcard(queue.stream_delayed) == 0
+        await queue.close()
+
+    try:
+        asyncio.run(main())
+    finally:
+        client.flushdb()
+
+
+def test_retry_delay_doubles_and_ends_in_dead_stream():
+    client = redis_or_skip()
+    client.flushdb()
+
+    async def main():
+        queue = JobQueue(port=client.connection_pool.connection_kwargs["port"], db=15,
+                         stream="test:jobs", retry_delay=10, max_retries=2)
+        await queue.ensure_group()
+        fields = {"data": "{}", "attempt": "0"}
+        for attempt in range(3):
+            entry_id = await queue.enqueue({})
+            await queue.retry(entry_id, {**fields, "attempt": str(attempt)}, "reset")
+        delays = sorted(score for _, score in await queue.redis.zrange(queue.stream_delayed, 0, -1, withscores=True))
+        assert 9 < delays[1] - delays[0] < 11  # 10s, then 20s
+        assert await queue.redis.xlen(queue.stream_dead) == 1
+        await queue.close()
+
+    try:
+        asyncio.run(main())
+    finally:
+        client.flushdb()
@@ -0,0 +1,54 @@
+import ast
+import importlib
+import pathlib
+
+import pytest
+
+MODULES_DIR = pathlib.Path(__file__).resolve().parent.parent / "bot" / "modules"
+MODULE_NAMES = sorted(p.parent.name for p in MODULES_DIR.glob("*/__init__.py"))
+HANDLERS = ("inline", "any_message", "callback")
+
+
+def parse_commands(name: str):
+    # reads cmd_func / cmd_func_pattern from Commands.__init__ without importing the module deps
+    tree = ast.parse((MODULES_DIR / name / "commands.py").read_text(encoding="utf-8"))
+    cls = next(n for n in tree.body if isinstance(n, ast.ClassDef) and n.name == "Commands")
+    commands, patterns = [], []
+    init = next(n for n in cls.body if isinstance(n, ast.AsyncFunctionDef | ast.FunctionDef) and n.name == "__init__")
+    for node in ast.walk(init):
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Dict):
+            target = node.targets[0].id
+            if target == "cmd_func":
+                commands = [k.value for k in node.value.keys]
+            elif target == "cmd_func_pattern":
+                patterns = [k.args[0].value for k in node.value.keys]
+    handlers = {h for h in HANDLERS for n in cls.body
+                if isinstance(n, ast.AsyncFunctionDef) and n.name == f"handle_{h}"}
+    return commands, patterns, handlers
+
+
+@pytest.mark.parametrize("name", MODULE_NAMES)
+def test_manifest_matches_commands(name):
+    manifest = importlib.import_module(f"bot.modules.{name}").MANIFEST
+    commands, patterns, handlers = parse_commands(name)
+    assert manifest["commands"] == commands
+    assert manifest["patterns"] == patterns
+    assert set(manifest["handlers"]) == handlers
+    assert set(manifest.get("jobs", [])) <= set(commands)
+
+
+def test_mismatch_raises_at_load():
+    pytest.importorskip("telebot")
+    from bot.lazy_commands import LazyCommands
+
+    class Commands:
+        cmd_list = ["calc"]
+        cmd_patterns = []
+
+        async def handle_callback(self, call):
+            return False
+
+    lazy = LazyCommands(None, "fake", {"commands": ["calc", "math"], "patterns": [], "handlers": ["callback"]})
+    with pytest.raises(RuntimeError, match="fake MANIFEST .*commands"):
+        lazy.check_manifest(Commands())
+    LazyCommands(None, "fake", {"commands": ["calc"], "patterns": [], "handlers": ["callback"]}).check_manifest(Commands())
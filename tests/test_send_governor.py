@@ -0,0 +1,116 @@
+"""SendGovernor with calls that cost more than a chat can send at once."""
+import asyncio
+import socket
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("telebot")
+
+from aiohttp import web
+
+from bot.utils import bot_utils
+from bot.utils.send_governor import SendGovernor
+from utils.http_client import HttpClients
+
+PRIVATE_CHAT = 1001
+GROUP_CHAT = -1001
+
+
+class FakeBot:
+    def __init__(self):
+        self.albums = []  # [(chat_id, items)]
+        self.message_id = 0
+
+    async def send_media_group(self, chat_id, media, **kwargs):
+        self.albums.append((chat_id, len(media)))
+        sent = []
+        for _ in media:
+            self.message_id += 1
+            sent.append(SimpleNamespace(message_id=self.message_id))
+        return sent
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def serve_images():
+    async def image(request):
+        return web.Response(body=b"\xff\xd8\xff" + request.match_info["n"].encode(), content_type="image/jpeg")
+
+    app = web.Application()
+    app.router.add_get("/{n}.jpg", image)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = free_port()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner, [f"http://127.0.0.1:{port}/{n}.jpg" for n in range(10)]
+
+
+def bucket_debt(chat_id: int) -> float:
+    governor = SendGovernor()
+    bucket = governor.chat_bucket(chat_id)
+    return bucket.capacity - bucket.tokens
+
+
+@pytest.mark.parametrize("chat_id", [PRIVATE_CHAT, GROUP_CHAT])
+def test_album_above_chat_burst_is_sent(chat_id):
+    async def main():
+        runner, urls = await serve_images()
+        bot = FakeBot()
+        try:
+            sent = await asyncio.wait_for(bot_utils.try_media_album_links(bot, "caption", urls, chat_id=chat_id), 5)
+        finally:
+            await HttpClients().close()
+            await runner.cleanup()
+        assert not isinstance(sent, Exception), sent
+        assert bot.albums == [(chat_id, 10)]
+        assert len(sent) == 10
+        # the album is still counted in full, later messages of the chat wait for it
+        assert bucket_debt(chat_id) >= 10
+    asyncio.run(main())
+
+
+def test_call_after_album_waits_for_the_debt():
+    async def main():
+        governor = SendGovernor()
+        governor.ensure_dispatcher()
+        await asyncio.wait_for(governor.acquire(PRIVATE_CHAT, cost=10), 1)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(governor.acquire(PRIVATE_CHAT), 0.3)
+        assert governor.chat_delay(PRIVATE_CHAT, 1, time.monotonic()) > 0
+        await governor.stop()
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("chat_id", [PRIVATE_CHAT, GROUP_CHAT])
+def test_cached_album_above_chat_burst_is_sent(chat_id):
+    async def main():
+        bot = FakeBot()
+        items = [{"type": "photo", "file_id": f"file{n}"} for n in range(10)]
+        sent = await asyncio.wait_for(bot_utils.try_media_file_ids(bot, items, "caption", chat_id=chat_id), 5)
+        assert not isinstance(sent, Exception), sent
+        assert bot.albums == [(chat_id, 10)]
+        assert len(sent) == 10
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("env, rate", [
+    ({}, 30),
+    ({"BOT_SHARDS": "3"}, 10),
+    ({"JOB_QUEUE": "1", "JOB_PROCESSES": "2"}, 10),
+    ({"BOT_SHARDS": "3", "JOB_QUEUE": "1", "JOB_PROCESSES": "3"}, 5),
+    ({"JOB_PROCESSES": "2"}, 30),  # workers are not used without JOB_QUEUE
+])
+def test_global_rate_is_split_between_senders(monkeypatch, env, rate):
+    for key in ("SEND_GLOBAL_RATE", "BOT_SHARDS", "JOB_QUEUE", "JOB_PROCESSES"):
+        monkeypatch.delenv(key, raising=False)
+    for key, value in env.items():
+        monkeypatch.setenv(key, value)
+    monkeypatch.setattr(SendGovernor, "_instance", None)
+    assert SendGovernor().global_rate == rate
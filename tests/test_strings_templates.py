@@ -0,0 +1,84 @@
+"""Differential test of precompiled templates against the formatting StringsManager did on every call."""
+import contextlib
+import glob
+import io
+import json
+import os
+import re
+import traceback
+
+import pytest
+
+from utils.strings_manager import Template
+
+DIR_STRINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "strings")
+
+EDGE_CASES = [
+    "%1$s and %2$s", "%2$d %1$s!", "%0$s x", "%1$s 50%", "%1$s 10%", "%s %d", "%d", "100%% of %s", "%%", "%%s %s",
+    "%%%s", "% c %s", "%(a)s", "%1$s %s", "%3$s", "%1$d", "%s%%%s", "%s%%", "%5.2f", "x % y %s", "%", "[!key]", "",
+]
+ARGS = [
+    (), ("x",), ("a", "b"), ("a", "b", "c"), (1,), (1, 2), (0, "%d"), (True,), (2.5,), ("50%",), ("%s",),
+    ("%1$s", "y"), ("a%s", 3), (None,), ((1, 2),), ([1],), ({"a": 1},), ("<b>", 7, "z", 4, 5),
+]
+KWARGS = [{}, {"a": 1}]
+
+
+def old_format(text: str, args: tuple, kwargs: dict) -> str:
+    # StringsManager.get_with_lang before templates
+    if args or kwargs:
+        try:
+            def repl(m):
+                idx = int(m.group(1)) - 1
+                if idx < len(args):
+                    return str(args[idx])
+                return m.group(0)
+
+            text = re.sub(r"%(\d+)\$[sd]", repl, text)
+            if "%" in text:
+                text = text % args if args else text % kwargs
+        except Exception:
+            traceback.print_exc()
+    return text
+
+
+def bot_strings() -> list[str]:
+    found = []
+    for path in sorted(glob.glob(os.path.join(DIR_STRINGS, "**", "*.json"), recursive=True)):
+        with open(path, encoding="utf-8") as f:
+            found.extend(v for v in json.load(f).values() if isinstance(v, str))
+    return found
+
+
+def render_both(text: str, args: tuple, kwargs: dict):
+    # the result and whether a formatting error was printed
+    with contextlib.redirect_stderr(io.StringIO()) as old_err:
+        old = old_format(text, args, kwargs)
+    with contextlib.redirect_stderr(io.StringIO()) as new_err:
+        new = Template(text).render(args, kwargs)
+    return (old, bool(old_err.getvalue())), (new, bool(new_err.getvalue()))
+
+
+def test_bot_strings_are_found():
+    strings = bot_strings()
+    assert len(strings) > 100
+    assert any("%" in s for s in strings)
+
+
+@pytest.mark.parametrize("text", EDGE_CASES)
+def test_edge_cases(text):
+    for args in ARGS:
+        for kwargs in KWARGS:
+            old, new = render_both(text, args, kwargs)
+            assert new == old, (args, kwargs)
+
+
+def test_same_output_for_bot_strings():
+    mismatches = []
+    for text in bot_strings():
+        for args in ARGS:
+            for kwargs in KWARGS:
+                old, new = render_both(text, args, kwargs)
+                if new != old:
+                    mismatches.append((text, args, kwargs))
+    assert mismatches == []
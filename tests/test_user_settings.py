@@ -0,0 +1,26 @@
+"""Bucketing of user settings in Redis hashes."""
+import random
+from collections import Counter
+
+import pytest
+
+pytest.importorskip("redis")
+
+from utils import user_settings
+from utils.user_settings import bucket_key
+
+
+def test_field_is_the_user_id():
+    assert bucket_key(123456789)[1] == "123456789"
+    assert bucket_key("-1001234567890")[1] == "-1001234567890"
+    assert bucket_key(123456789) == bucket_key("123456789")
+
+
+def test_sparse_ids_fill_buckets_evenly(monkeypatch):
+    monkeypatch.setattr(user_settings, "SETTINGS_BUCKETS", 1000)
+    rnd = random.Random(1)
+    # real ids are 10 digits, ranges of ids would put every user into its own hash
+    ids = {rnd.randint(10 ** 8, 8 * 10 ** 9) for _ in range(64000)}
+    sizes = Counter(bucket_key(u)[0] for u in ids)
+    assert len(sizes) == 1000
+    assert max(sizes.values()) < 128  # hash-max-listpack-entries
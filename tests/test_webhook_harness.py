@@ -0,0 +1,213 @@
+"""Offline harness: a fake Telegram Bot API and the bot in webhook mode.
+
+Updates are POSTed to the webhook like Telegram does, replies are read from the calls
+the bot made to the fake API.
+"""
+import asyncio
+import json
+import socket
+import urllib.parse
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("telebot")
+
+from aiohttp import ClientSession, web
+from telebot import asyncio_helper
+
+TOKEN = "123:harness"
+SECRET = "harness-secret"
+CHAT_ID = 1001
+
+ENV = {
+    "SETTINGS_BACKEND": "local",
+    "PROGRESS_MODE": "none",
+    "WEBHOOK_SECRET": SECRET,
+    "WEBHOOK_HOST": "127.0.0.1",
+    "WEBHOOK_PATH": "/webhook",
+}
+
+from bot.async_telebot import TelegramBot
+from bot.modules.downloader.file_cache import FileIdCache
+from bot.utils.progress import ProgressManager
+from utils.logging_utils import setup_temp_logger
+from utils.strings_manager import StringsManager
+from utils.user_settings import UserSettings
+
+# singletons that read ENV when they are created
+SINGLETONS = (UserSettings, StringsManager, ProgressManager, FileIdCache)
+
+
+@pytest.fixture(scope="module")
+def harness_env(tmp_path_factory):
+    # the environment and the singletons built from it are restored after this module
+    with pytest.MonkeyPatch.context() as mp:
+        for key, value in ENV.items():
+            mp.setenv(key, value)
+        mp.setenv("SETTINGS_PATH", str(tmp_path_factory.mktemp("harness") / "settings.sqlite"))
+        for cls in SINGLETONS:
+            mp.setattr(cls, "_instance", None)
+        yield mp
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class FakeTelegram:
+    def __init__(self):
+        self.calls = []  # [(method, params)]
+        self.message_id = 100
+        self.runner = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        # telebot sends form data, also in the body of GET requests
+        params = dict(request.query)
+        if request.content_type == "multipart/form-data":
+            params.update(await request.post())
+        else:
+            params.update(urllib.parse.parse_qsl((await request.read()).decode()))
+        self.calls.append((method, params))
+        result = True
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Harness", "username": "harness_bot"}
+        elif method.startswith("send"):
+            self.message_id += 1
+            result = {
+                "message_id": self.message_id, "date": 0,
+                "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+                "text": params.get("text", ""),
+            }
+        return web.json_response({"ok": True, "result": result})
+
+    async def start(self) -> int:
+        app = web.Application()
+        app.router.add_route("*", "/bot{token}/{method}", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        port = free_port()
+        await web.TCPSite(self.runner, "127.0.0.1", port).start()
+        asyncio_helper.API_URL = f"http://127.0.0.1:{port}/bot{{0}}/{{1}}"
+        return port
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    def sent(self, method: str = "sendMessage") -> list[dict]:
+        return [params for m, params in self.calls if m == method]
+
+    async def wait_sent(self, count: int, method: str = "sendMessage", timeout: float = 5) -> list[dict]:
+        deadline = asyncio.get_running_loop().time() + timeout
+        while len(self.sent(method)) < count and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.02)
+        return self.sent(method)
+
+
+def reply_to(params: dict) -> int:
+    return json.loads(params["reply_parameters"])["message_id"]
+
+
+def message_update(update_id: int, text: str, chat_id: int = CHAT_ID) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "User"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}],
+        },
+    }
+
+
+def run_harness(env: pytest.MonkeyPatch, scenario):
+    async def main():
+        fake = FakeTelegram()
+        await fake.start()
+        port = free_port()
+        env.setenv("WEBHOOK_URL", f"http://127.0.0.1:{port}")
+        env.setenv("WEBHOOK_PORT", str(port))
+        bot = TelegramBot(TOKEN, setup_temp_logger("Harness"))
+        try:
+            await bot.load_bot_info()
+            await bot.webhook.start()
+            async with ClientSession() as session:
+                async def post(update, secret=SECRET, raw=None) -> int:
+                    async with session.post(
+                            f"http://127.0.0.1:{port}/webhook",
+                            data=raw if raw is not None else json.dumps(update),
+                            headers={"X-Telegram-Bot-Api-Secret-Token": secret,
+                                     "Content-Type": "application/json"}) as resp:
+                        return resp.status
+                await scenario(fake, post)
+        finally:
+            await bot.stop_tasks()
+            await fake.stop()
+    asyncio.run(main())
+
+
+def test_webhook_is_registered_with_secret(harness_env):
+    async def scenario(fake, post):
+        set_webhook = fake.sent("setWebhook")
+        assert len(set_webhook) == 1
+        assert set_webhook[0]["url"].endswith("/webhook")
+        assert set_webhook[0]["secret_token"] == SECRET
+    run_harness(harness_env, scenario)
+
+
+def test_command_is_answered(harness_env):
+    async def scenario(fake, post):
+        assert await post(message_update(1, "/calc 2+2")) == 200
+        replies = await fake.wait_sent(1)
+        assert len(replies) == 1
+        assert replies[0]["chat_id"] == str(CHAT_ID)
+        assert reply_to(replies[0]) == 1
+        assert "4" in replies[0]["text"]
+    run_harness(harness_env, scenario)
+
+
+def test_updates_of_one_chat_are_answered_in_order(harness_env):
+    async def scenario(fake, post):
+        for n in range(1, 6):
+            assert await post(message_update(n, f"/calc {n}*10")) == 200
+        replies = await fake.wait_sent(5)
+        assert [reply_to(r) for r in replies] == [1, 2, 3, 4, 5]
+        assert ["10", "20", "30", "40", "50"] == [r["text"].rsplit("<code>", 1)[1].split("<")[0] for r in replies]
+    run_harness(harness_env, scenario)
+
+
+def test_rejected_updates(harness_env):
+    async def scenario(fake, post):
+        assert await post(message_update(1, "/calc 1+1"), secret="wrong") == 403
+        assert await post(None, raw="not json") == 400
+        await asyncio.sleep(0.2)
+        assert fake.sent() == []
+    run_harness(harness_env, scenario)
+
+
+def test_callback_from_inline_message_is_answered(harness_env):
+    # inline-mode callbacks have no message, they are scheduled by user
+    async def scenario(fake, post):
+        assert await post({
+            "update_id": 1,
+            "callback_query": {
+                "id": "cb1", "chat_instance": "1", "inline_message_id": "im1", "data": "base_h",
+                "from": {"id": CHAT_ID, "is_bot": False, "first_name": "User"},
+            },
+        }) == 200
+        answers = await fake.wait_sent(1, "answerCallbackQuery")
+        assert [a["callback_query_id"] for a in answers] == ["cb1"]
+    run_harness(harness_env, scenario)
+
+
+def test_webhook_is_not_started_without_secret(harness_env):
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("WEBHOOK_URL", "http://127.0.0.1:1")
+        mp.delenv("WEBHOOK_SECRET")
+        with pytest.raises(RuntimeError, match="WEBHOOK_SECRET"):
+            TelegramBot(TOKEN, setup_temp_logger("Harness"))
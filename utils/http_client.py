@@ -0,0 +1,117 @@
+import asyncio
+import ssl
+from types import SimpleNamespace
+
+import aiohttp
+import certifi
+
+from .key_loader import load_key
+from .logging_utils import setup_temp_logger
+
+GROUP_API = "api"  # small json calls to third-party apis
+GROUP_AI = "ai"  # slow llm completions
+GROUP_MEDIA = "media"  # big media downloads from CDNs
+
+# group: (total connections, connections per host, default total timeout)
+GROUPS = {
+    GROUP_API: (100, 10, 10),
+    GROUP_AI: (20, 10, 30),
+    GROUP_MEDIA: (64, 8, 300),
+}
+
+_ssl_context = None
+
+def get_ssl_context() -> ssl.SSLContext:
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = ssl.create_default_context(cafile=certifi.where())
+    return _ssl_context
+
+
+class HttpClients:
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        self.logger = setup_temp_logger('HttpClients')
+        self.sessions: dict[str, aiohttp.ClientSession] = {}
+        self.loop = None
+        self.dns_ttl = int(load_key("HTTP_DNS_TTL") or 300)
+        self.stats_interval = 300
+        self.stats = {}  # { host: {"requests": 0, "new": 0, "reused": 0, "errors": 0} }
+        self.max_hosts = 500
+        self.trace = aiohttp.TraceConfig()
+        self.trace.on_request_start.append(self._on_request_start)
+        self.trace.on_request_exception.append(self._on_request_exception)
+        self.trace.on_connection_create_end.append(self._on_connection_new)
+        self.trace.on_connection_reuseconn.append(self._on_connection_reused)
+
+    def _host_stats(self, ctx: SimpleNamespace) -> dict:
+        return self.stats.setdefault(ctx.host, {"requests": 0, "new": 0, "reused": 0, "errors": 0})
+
+    async def _on_request_start(self, session, ctx, params):
+        host = params.url.host
+        # CDN hosts can be endless, keep the stats bounded
+        ctx.host = host if host in self.stats or len(self.stats) < self.max_hosts else "other"
+        self._host_stats(ctx)["requests"] += 1
+
+    async def _on_request_exception(self, session, ctx, params):
+        self._host_stats(ctx)["errors"] += 1
+
+    async def _on_connection_new(self, session, ctx, params):
+        self._host_stats(ctx)["new"] += 1
+
+    async def _on_connection_reused(self, session, ctx, params):
+        self._host_stats(ctx)["reused"] += 1
+
+    def _create(self, group: str) -> aiohttp.ClientSession:
+        limit, limit_per_host, timeout = GROUPS.get(group, GROUPS[GROUP_API])
+        connector = aiohttp.TCPConnector(
+            limit=limit,
+            limit_per_host=limit_per_host,
+            ttl_dns_cache=self.dns_ttl,
+            ssl=get_ssl_context(),
+            keepalive_timeout=30,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=timeout, connect=10),
+            trace_configs=[self.trace],
+        )
+
+    def get(self, group: str = GROUP_API) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            # sessions are bound to the loop they were created in
+            self.loop = loop
+            self.sessions = {}
+        session = self.sessions.get(group)
+        if session is None or session.closed:
+            session = self.sessions[group] = self._create(group)
+        return session
+
+    async def start(self):
+        for group in GROUPS:
+            self.get(group)
+
+    def get_stats(self) -> dict:
+        return {
+            host: {**s, "reuse_ratio": round(s["reused"] / (s["new"] + s["reused"]), 2) if s["new"] + s["reused"] else 0.0}
+            for host, s in self.stats.items()
+        }
+
+    async def stats_loop(self):
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            self.logger.info(f"Http clients stats: {self.get_stats()}")
+
+    async def close(self):
+        sessions, self.sessions = self.sessions, {}
+        for session in sessions.values():
+            if not session.closed:
+                await session.close()
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import os
+import socket
+import time
+from typing import Awaitable, Callable
+
+import redis.asyncio as aioredis
+from redis.exceptions import ResponseError
+
+from .logging_utils import setup_temp_logger
+
+STREAM = "jobs:commands"
+GROUP = "workers"
+
+# KEYS: delayed zset, stream. ARGV: now, max jobs, stream maxlen.
+# Moves retries that are due back to the stream, one worker takes each of them.
+MOVE_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, member in ipairs(due) do
+    local job = cjson.decode(member)
+    redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[3], '*', 'data', job.data, 'attempt', tostring(job.attempt))
+    redis.call('ZREM', KEYS[1], member)
+end
+return #due
+"""
+
+
+class JobQueue:
+    def __init__(self, host="localhost", port=6379, db=0, logger=None,
+                 stream: str = STREAM, max_retries: int = 3, claim_idle_ms: int = 10 * 60 * 1000,
+                 retry_delay: float = 10):
+        self.logger = logger or setup_temp_logger('JobQueue')
+        self.redis = aioredis.Redis(host=host, port=port, db=db, decode_responses=True)
+        self.stream = stream
+        self.stream_dead = f"{stream}:dead"
+        self.stream_delayed = f"{stream}:delayed"  # zset of retries by due time
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay  # doubled with every attempt
+        self.claim_idle_ms = claim_idle_ms
+        self.maxlen = 100000
+        self.move_due_script = self.redis.register_script(MOVE_DUE_SCRIPT)
+        self.stop_flag = False
+
+    @staticmethod
+    def consumer_name() -> str:
+        return f"{socket.gethostname()}-{os.getpid()}"
+
+    async def enqueue(self, payload: dict, attempt: int = 0) -> str:
+        return await self.redis.xadd(
+            self.stream,
+            {"data": json.dumps(payload, ensure_ascii=False), "attempt": attempt},
+            maxlen=self.maxlen, approximate=True
+        )
+
+    async def ensure_group(self):
+        try:
+            await self.redis.xgroup_create(self.stream, GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def retry(self, entry_id: str, fields: dict, reason: str):
+        attempt = int(fields.get("attempt", 0)) + 1
+        if attempt > self.max_retries:
+            self.logger.error(f"Job {entry_id} dropped after {attempt - 1} retries: {reason}")
+            await self.redis.xadd(self.stream_dead, {**fields, "error": reason}, maxlen=self.maxlen, approximate=True)
+        else:
+            delay = self.retry_delay * 2 ** (attempt - 1)
+            self.logger.warning(f"Job {entry_id} retry {attempt}/{self.max_retries} in {delay:.0f}s: {reason}")
+            job = {"id": entry_id, "data": fields["data"], "attempt": attempt}
+            await self.redis.zadd(self.stream_delayed, {json.dumps(job, ensure_ascii=False): time.time() + delay})
+        await self.ack(entry_id)
+
+    async def move_due(self, count: int = 100) -> int:
+        return await self.move_due_script(
+            keys=[self.stream_delayed, self.stream], args=[time.time(), count, self.maxlen])
+
+    async def ack(self, entry_id: str):
+        await self.redis.xack(self.stream, GROUP, entry_id)
+        await self.redis.xdel(self.stream, entry_id)
+
+    async def consume(self, handler: Callable[[dict], Awaitable], concurrency: int = 2, consumer: str = None):
+        consumer = consumer or self.consumer_name()
+        await self.ensure_group()
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = set()
+
+        async def process(entry_id: str, fields: dict):
+            try:
+                job = json.loads(fields["data"])
+                job["attempt"] = int(fields.get("attempt", 0))
+                await handler(job)
+                await self.ack(entry_id)
+            except Exception as e:
+                self.logger.exception(f"Job {entry_id} failed")
+                await self.retry(entry_id, fields, str(e))
+            finally:
+                semaphore.release()
+
+        while not self.stop_flag:
+            try:
+                await self.move_due()
+                # entries of crashed consumers go back to the queue as retries
+                _, claimed, *_ = await self.redis.xautoclaim(
+                    self.stream, GROUP, consumer, min_idle_time=self.claim_idle_ms, count=concurrency)
+                for entry_id, fields in claimed:
+                    if fields:
+                        await self.retry(entry_id, fields, "consumer timeout")
+                    else:
+                        await self.ack(entry_id)
+
+                await semaphore.acquire()
+                semaphore.release()
+                free = concurrency - len(tasks)
+                response = await self.redis.xreadgroup(
+                    GROUP, consumer, {self.stream: ">"}, count=max(1, free), block=5000)
+                for _, entries in response or []:
+                    for entry_id, fields in entries:
+                        await semaphore.acquire()
+                        task = asyncio.create_task(process(entry_id, fields))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Job queue error: {e}")
+                await asyncio.sleep(5)
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def close(self):
+        self.stop_flag = True
+        await self.redis.aclose()
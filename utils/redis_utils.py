@@ -1,5 +1,9 @@
+import asyncio
+
 import redis
+import redis.asyncio as aioredis
 
+from .key_loader import load_key
 from .logging_utils import setup_temp_logger
 from .utils import in_docker
 
@@ -24,8 +28,32 @@ class RedisClient:
         #     self.start_redis()
         # self.redis = redis.StrictRedis(host=host, port=port, db=db, decode_responses=True)
         self.is_redis_running()
-        self.pubsub = self.redis.pubsub()
-        self.user_lang_cache = {}
+        self.max_connections = int(load_key("REDIS_MAX_CONNECTIONS") or 50)
+        self.loop = None
+        self.aredis: aioredis.Redis | None = None
+
+    def aio(self) -> aioredis.Redis:
+        # asyncio client with its own pool, connections are bound to the loop they were created in
+        loop = asyncio.get_running_loop()
+        if self.aredis is None or self.loop is not loop:
+            self.loop = loop
+            pool = aioredis.ConnectionPool(
+                host=self.host, port=self.port, db=self.db,
+                decode_responses=True, max_connections=self.max_connections,
+            )
+            self.aredis = aioredis.Redis(connection_pool=pool)
+        return self.aredis
+
+    async def aclose(self):
+        if self.aredis is not None:
+            aredis, self.aredis = self.aredis, None
+            await aredis.aclose()
+
+    @classmethod
+    async def shutdown(cls):
+        # on stop, without connecting when Redis was never used (local settings)
+        if cls._instance is not None:
+            await cls._instance.aclose()
 
     def is_redis_running(self) -> bool:
         try:
@@ -49,18 +77,3 @@ class RedisClient:
 
     def set(self, key, value, ex=None):
         self.redis.set(key, value, ex=ex)
-
-    # -----------------
-
-    def get_user_lang(self, user_id):
-        lang = self.user_lang_cache.get(user_id)
-        if lang is not None:
-            return lang
-        lang = self.redis.get(f"user:{user_id}:lang")
-        self.user_lang_cache[user_id] = lang
-        return lang
-
-    def set_user_lang(self, user_id, lang: str):
-        self.redis.set(f"user:{user_id}:lang", lang)
-        self.user_lang_cache[user_id] = lang
-        return lang
\ No newline at end of file
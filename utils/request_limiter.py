@@ -1,8 +1,145 @@
 import asyncio
+import heapq
+import inspect
+import itertools
 import random
 import string
-from collections import defaultdict
-from datetime import datetime, timedelta
+import time
+from collections import deque
+from typing import Awaitable, Callable, Coroutine
+
+import redis.asyncio as aioredis
+
+from .key_loader import load_key
+from .logging_utils import setup_temp_logger
+from .redis_utils import RedisClient
+
+# KEYS: lane key, quota key. ARGV: lane interval ms, quota per minute, quota burst.
+# Returns 0 when the request is admitted, otherwise ms to wait (negative when the lane itself has to wait).
+ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local interval = tonumber(ARGV[1])
+local per_min = tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local lane_next = tonumber(redis.call('GET', KEYS[1]) or '0')
+if lane_next > now then return now - lane_next end
+local tokens = 0
+if per_min > 0 then
+    local state = redis.call('HMGET', KEYS[2], 'tokens', 'ts')
+    tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + (now - ts) * per_min / 60000)
+    if tokens < 1 then return math.ceil((1 - tokens) * 60000 / per_min) end
+end
+if interval > 0 then redis.call('SET', KEYS[1], now + interval, 'PX', interval) end
+if per_min > 0 then
+    redis.call('HSET', KEYS[2], 'tokens', tokens - 1, 'ts', now)
+    redis.call('PEXPIRE', KEYS[2], math.ceil(burst * 60000 / per_min) + 1000)
+end
+return 0
+"""
+
+
+class _Fenwick:
+    # prefix counts of live entries by sequence number, grows by append
+    __slots__ = ("tree", "total")
+
+    def __init__(self):
+        self.tree = [0]
+        self.total = 0
+
+    def append(self, value: int):
+        i = len(self.tree)
+        low = i - (i & -i)
+        self.tree.append(value + self.prefix(i - 1) - self.prefix(low))
+        self.total += value
+
+    def add(self, i: int, value: int):
+        self.total += value
+        while i < len(self.tree):
+            self.tree[i] += value
+            i += i & -i
+
+    def prefix(self, i: int) -> int:
+        s = 0
+        while i > 0:
+            s += self.tree[i]
+            i -= i & -i
+        return s
+
+
+class _Lane:
+    # one queue per (name, proxy, user_id), runs its entries one by one
+    __slots__ = ("key", "entries", "order", "head", "next_at", "running", "task", "weight_class", "tag")
+
+    def __init__(self, key: tuple):
+        self.key = key
+        self.entries = {}  # { seq: (task_id, factory, callback, queued_at) } not started yet
+        self.order = _Fenwick()  # 1 for every queued or running seq
+        self.head = 1  # lowest seq that can still be queued
+        self.next_at = 0.0  # monotonic time when the next entry may start
+        self.running = 0  # seq of the running entry, -1 while the backend is asked
+        self.task: asyncio.Task | None = None
+        self.weight_class = "default"
+        self.tag = 0.0  # virtual finish time of the last request admitted from the quota
+
+
+class _Pool:
+    # lanes of one quota-limited name, served by the smallest virtual finish time
+    __slots__ = ("ready", "vtime", "task")
+
+    def __init__(self):
+        self.ready = []  # [(tag, n, lane)]
+        self.vtime = 0.0
+        self.task: asyncio.Task | None = None
+
+
+class LocalLimiterBackend:
+    # single process, the lane interval is kept by the lanes themselves
+    remote = False
+
+    def __init__(self):
+        self.buckets = {}  # { name: [tokens, monotonic ts] }
+
+    async def acquire(self, key: tuple, interval: float, quota: tuple | None) -> float:
+        if not quota:
+            return 0.0
+        per_min, burst = quota
+        now = time.monotonic()
+        bucket = self.buckets.setdefault(key[0], [burst, now])
+        tokens = min(burst, bucket[0] + (now - bucket[1]) * per_min / 60)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            return (1 - tokens) * 60 / per_min
+        bucket[0] = tokens - 1
+        return 0.0
+
+
+class RedisLimiterBackend:
+    # shared by all bot processes, one script call per admission attempt
+    remote = True
+
+    def __init__(self, logger=None):
+        self.logger = logger or setup_temp_logger('RequestLimiter')
+        client = RedisClient()
+        self.redis = aioredis.Redis(host=client.host, port=client.port, db=client.db, decode_responses=True)
+        self.script = self.redis.register_script(ACQUIRE_SCRIPT)
+
+    async def acquire(self, key: tuple, interval: float, quota: tuple | None) -> float:
+        name, proxy, user_id = key
+        per_min, burst = quota or (0, 0)
+        try:
+            wait_ms = await self.script(
+                keys=[f"limiter:{name}:{proxy}:{user_id}", f"limiter:{name}:quota"],
+                args=[int(interval * 1000), per_min, burst],
+            )
+        except Exception as e:
+            # redis is down, let the local lanes keep the rate
+            self.logger.error(f"Cant acquire distributed limit: {e}")
+            return 0.0
+        return int(wait_ms) / 1000
 
 
 class RequestLimiter:
@@ -15,116 +152,248 @@ class RequestLimiter:
         return cls._instance
 
     def _init(self):
-        self.rate_limits = defaultdict(lambda: timedelta(seconds=5))
-        self.queues = defaultdict(lambda: defaultdict(lambda: defaultdict(lambda: asyncio.Queue())))
-        self.queue_meta = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
-        self.last_request = defaultdict(lambda: defaultdict(lambda: defaultdict(lambda: datetime.min)))
-        self.cleanup_interval = 300
-        self.task_ids = {}
+        self.rate_limits = {}  # { name: seconds }
+        self.quotas = {}  # { name: (per minute, burst) } shared by all users of the name
+        self.default_rate = 5.0
+        self.backend_name = load_key("LIMITER_BACKEND") or "memory"
+        # shares of a quota when lanes of several classes compete for it
+        self.weights = {
+            "owner": float(load_key("FAIR_WEIGHT_OWNER") or 4),
+            "private": float(load_key("FAIR_WEIGHT_PRIVATE") or 2),
+            "group": float(load_key("FAIR_WEIGHT_GROUP") or 1),
+        }
+        self.waits = {}  # { weight_class: deque of seconds from run to start }
+        self.stats_interval = 300
+        self.logger = setup_temp_logger('RequestLimiter')
+        self.loop = None
+        self.reset()
 
-        asyncio.create_task(self.cleanup_loop())
+    def reset(self):
+        self.lanes: dict[tuple, _Lane] = {}
+        self.index: dict[str, tuple[_Lane, int]] = {}  # { task_id: (lane, seq) }
+        self.heap = []  # [(next_at, n, lane)] lanes waiting for their next start
+        self.pools: dict[str, _Pool] = {}
+        self.counter = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.dispatcher = None
+        # redis connections are bound to the loop, so the backend is created with the loop state
+        self.backend = RedisLimiterBackend(self.logger) if self.backend_name == "redis" else LocalLimiterBackend()
 
-    @staticmethod
-    def _gen_task_id(length=5):
-        return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
+    def _gen_task_id(self, length=5):
+        while True:
+            task_id = ''.join(random.choices(string.ascii_letters + string.digits, k=length))
+            if task_id not in self.index:
+                return task_id
 
     def set_rate_limit(self, name: str, seconds: int):
-        self.rate_limits[name] = timedelta(seconds=seconds)
+        self.rate_limits[name] = float(seconds)
+
+    def set_quota(self, name: str, per_minute: int, burst: int = 1):
+        # provider-wide limit, with the redis backend it is shared by all bot replicas
+        if per_minute > 0:
+            self.quotas[name] = (per_minute, max(1, burst))
+        else:
+            self.quotas.pop(name, None)
 
+    def _ensure_dispatcher(self):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop = loop
+            self.reset()
+        if self.dispatcher is None or self.dispatcher.done():
+            self.dispatcher = loop.create_task(self._dispatch())
 
-    async def run(self, name, proxy, user_id, coro, callback=None) -> str:
+    def _schedule(self, lane: _Lane):
+        heapq.heappush(self.heap, (lane.next_at, next(self.counter), lane))
+        if self.heap[0][2] is lane:
+            self.wakeup.set()
+
+    async def run(
+            self, name, proxy, user_id,
+            coro: Callable[[], Awaitable] | Coroutine,
+            callback=None, weight_class: str = "default") -> str:
+        # coro is a factory (or a not awaited coroutine), the work starts only when its turn comes
+        self._ensure_dispatcher()
+        key = (name, proxy, user_id)
+        lane = self.lanes.get(key)
+        if lane is None:
+            lane = self.lanes[key] = _Lane(key)
+        lane.weight_class = weight_class
         task_id = self._gen_task_id()
-        task = asyncio.create_task(coro)
-        self.task_ids[task_id] = task
+        lane.order.append(1)
+        seq = len(lane.order.tree) - 1
+        lane.entries[seq] = (task_id, coro, callback, time.monotonic())
+        self.index[task_id] = (lane, seq)
+        if not lane.running and len(lane.entries) == 1:
+            self._schedule(lane)
+        return task_id
 
-        q = self.queues[name][proxy][user_id]
-        meta = self.queue_meta[name][proxy][user_id]
-        await q.put((task_id, task, callback))
-        meta.append(task_id)
+    async def _dispatch(self):
+        while True:
+            if not self.heap:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            next_at, _, lane = self.heap[0]
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                # sleep until the earliest lane is ready or an earlier one is added
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self.heap)
+            if lane.running or next_at != lane.next_at or self.lanes.get(lane.key) is not lane:
+                continue
+            if lane.key[0] in self.quotas:
+                self._enqueue_fair(lane)
+            elif self.backend.remote:
+                # round trips of different lanes should not wait for each other
+                lane.running = -1
+                asyncio.create_task(self._admit(lane))
+            else:
+                await self._admit(lane)
 
-        if not hasattr(q, "_processor_started"):
-            asyncio.create_task(self._process_queue(name, proxy, user_id))
-            q._processor_started = True
+    async def _admit(self, lane: _Lane):
+        name = lane.key[0]
+        interval = self.rate_limits.get(name, self.default_rate)
+        wait = await self.backend.acquire(lane.key, interval, self.quotas.get(name))
+        lane.running = 0
+        if not lane.entries:
+            if self.lanes.get(lane.key) is lane:
+                self.lanes.pop(lane.key)
+        elif wait:
+            lane.next_at = time.monotonic() + abs(wait)
+            self._schedule(lane)
+        else:
+            self._start_next(lane, interval)
 
-        return task_id
+    def _enqueue_fair(self, lane: _Lane):
+        name = lane.key[0]
+        pool = self.pools.get(name)
+        if pool is None:
+            pool = self.pools[name] = _Pool()
+        # idle lanes do not save up credit, a lane continues from the current virtual time
+        lane.tag = max(pool.vtime, lane.tag) + 1 / self.weights.get(lane.weight_class, 1.0)
+        lane.running = -1
+        heapq.heappush(pool.ready, (lane.tag, next(self.counter), lane))
+        if pool.task is None or pool.task.done():
+            pool.task = asyncio.create_task(self._serve(name, pool))
 
-    async def _process_queue(self, name, proxy, user_id):
+    async def _serve(self, name: str, pool: _Pool):
+        # weighted fair queuing: the quota goes to the ready lane with the smallest finish tag
+        while pool.ready:
+            item = heapq.heappop(pool.ready)
+            tag, _, lane = item
+            if not lane.entries or self.lanes.get(lane.key) is not lane:
+                lane.running = 0
+                if not lane.entries and self.lanes.get(lane.key) is lane:
+                    self.lanes.pop(lane.key)
+                continue
+            interval = self.rate_limits.get(name, self.default_rate)
+            wait = await self.backend.acquire(lane.key, interval, self.quotas.get(name))
+            if wait > 0:
+                heapq.heappush(pool.ready, item)
+                await asyncio.sleep(wait)
+                continue
+            lane.running = 0
+            if not lane.entries:
+                if self.lanes.get(lane.key) is lane:
+                    self.lanes.pop(lane.key)
+            elif wait < 0:
+                lane.next_at = time.monotonic() - wait
+                self._schedule(lane)
+            else:
+                pool.vtime = tag
+                self._start_next(lane, interval)
+
+    def _start_next(self, lane: _Lane, interval: float):
+        while lane.head not in lane.entries:
+            lane.head += 1
+        seq = lane.head
+        task_id, factory, callback, queued_at = lane.entries.pop(seq)
+        lane.head += 1
+        waits = self.waits.get(lane.weight_class)
+        if waits is None:
+            waits = self.waits[lane.weight_class] = deque(maxlen=1000)
+        waits.append(time.monotonic() - queued_at)
+        lane.running = seq
+        lane.next_at = time.monotonic() + interval
+        lane.task = asyncio.create_task(factory() if callable(factory) else factory)
+        asyncio.create_task(self._finish(lane, seq, task_id, callback))
+
+    async def _finish(self, lane: _Lane, seq: int, task_id: str, callback):
         async def try_callback(result_callback):
             try:
                 await callback(result_callback)
             except Exception:
                 pass
 
-        q = self.queues[name][proxy][user_id]
-        while not q.empty():
-            now = datetime.now()
-            last = self.last_request[name][proxy][user_id]
-            if (now - last) < self.rate_limits[name]:
-                await asyncio.sleep(0.5)
-                continue
-
-            task_id, task, callback = await q.get()
-            self.last_request[name][proxy][user_id] = datetime.now()
-            try:
-                result = await task
-                if callback: await try_callback(result)
-            except Exception as e:
-                if callback: await try_callback(e)
-            finally:
-                self.cancel_task(task_id)
-                if q.empty():
-                    self.queues[name][proxy].pop(user_id, None)
-                    self.last_request[name][proxy].pop(user_id, None)
+        try:
+            result = await lane.task
+            if callback: await try_callback(result)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            if callback: await try_callback(e)
+        finally:
+            self.index.pop(task_id, None)
+            lane.order.add(seq, -1)
+            lane.running = 0
+            lane.task = None
+            if lane.entries:
+                self._schedule(lane)
+            elif self.lanes.get(lane.key) is lane:
+                self.lanes.pop(lane.key)
 
     def cancel_task(self, task_id: str) -> bool:
-        task = self.task_ids.get(task_id)
-        if not task:
+        item = self.index.pop(task_id, None)
+        if not item:
             return False
-        task.cancel()
-        self.task_ids.pop(task_id, None)
-
-        for name, proxies in self.queue_meta.items():
-            for proxy, users in proxies.items():
-                for user_id, meta in users.items():
-                    if task_id in meta:
-                        meta.remove(task_id)
-                        q = self.queues[name][proxy][user_id]
-                        try:
-                            items = list(q._queue)
-                            q._queue.clear()
-                            for t in items:
-                                if t is not task:
-                                    q.put_nowait(t)
-                        except Exception:
-                            pass
+        lane, seq = item
+        if lane.running == seq:
+            lane.task.cancel()
+            return True
+        _, factory, _, _ = lane.entries.pop(seq)
+        lane.order.add(seq, -1)
+        if inspect.iscoroutine(factory):
+            factory.close()
+        if not lane.entries and not lane.running:
+            self.lanes.pop(lane.key, None)
         return True
 
     def get_queue_status(self, name, proxy, user_id):
-        q = self.queues[name][proxy][user_id]
-        size = q.qsize()
+        lane = self.lanes.get((name, proxy, user_id))
+        size = len(lane.entries) if lane else 0
         return (0, 0) if size == 0 else (1, size)
 
     def get_task_position(self, task_id: str) -> tuple[int, int]:
-        for name, proxies in self.queue_meta.items():
-            for proxy, users in proxies.items():
-                for user_id, meta in users.items():
-                    if task_id in meta:
-                        position = meta.index(task_id) + 1
-                        total = len(meta)
-                        return position, total
-        return 0, 0
-
-    async def cleanup_loop(self):
+        item = self.index.get(task_id)
+        if not item:
+            return 0, 0
+        lane, seq = item
+        return lane.order.prefix(seq), lane.order.total
+
+    def get_stats(self) -> dict:
+        stats = {}
+        for weight_class, waits in self.waits.items():
+            waits = sorted(waits)
+
+            def percentile(p: float) -> float:
+                return round(waits[min(len(waits) - 1, int(len(waits) * p))], 2) if waits else 0.0
+
+            stats[weight_class] = {
+                "weight": self.weights.get(weight_class, 1.0),
+                "started": len(waits),
+                "wait_p50": percentile(0.5),
+                "wait_p95": percentile(0.95),
+                "wait_p99": percentile(0.99),
+            }
+        return stats
+
+    async def stats_loop(self):
         while True:
-            await self.cleanup()
-            await asyncio.sleep(self.cleanup_interval)
-
-    async def cleanup(self):
-        now = datetime.now()
-        for name, proxies in list(self.queues.items()):
-            for proxy, users in list(proxies.items()):
-                for user_id, q in list(users.items()):
-                    last = self.last_request[name][proxy][user_id]
-                    if q.empty() and (now - last).total_seconds() > self.cleanup_interval:
-                        users.pop(user_id, None)
-                        self.last_request[name][proxy].pop(user_id, None)
+            await asyncio.sleep(self.stats_interval)
+            self.logger.info(f"Request limiter stats: {self.get_stats()}")
@@ -2,13 +2,98 @@ import json
 import os
 import re
 import traceback
+from contextvars import ContextVar
 
-from .redis_utils import RedisClient
+from .user_settings import UserSettings
 
 ROOT_DIR = os.path.abspath(os.path.dirname(__file__))  # path to .utils
 BOT_ROOT = os.path.abspath(os.path.join(ROOT_DIR, ".."))
 DIR_STRINGS = os.path.join(BOT_ROOT, "data", "strings")
 
+# { user_id: lang } resolved at the start of the current update
+update_langs: ContextVar[dict | None] = ContextVar("update_langs", default=None)
+
+SLOT_RE = re.compile(r"%(\d+)\$[sd]")
+FORMAT_RE = re.compile(r"%[sd%]")
+
+
+def format_text(text: str, args: tuple, kwargs: dict) -> str:
+    # full formatting, used when a compiled template can not be sure to give the same result
+    try:
+        def repl(m):
+            idx = int(m.group(1)) - 1
+            if idx < len(args):
+                return str(args[idx])
+            return m.group(0)
+
+        text = SLOT_RE.sub(repl, text)
+        if "%" in text:
+            text = text % args if args else text % kwargs
+    except Exception:
+        traceback.print_exc()
+    return text
+
+
+class Template:
+    # string parsed once at load, rendering is a join of literals and args
+    __slots__ = ("text", "plain", "literals", "slots")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.plain = "%" not in text  # args can not change it
+        self.literals = None  # [literal, literal, ...] around the slots, None - format_text is used
+        self.slots = ()  # ("s" | "d" for "%s" / "%d", int for "%1$s")
+        if self.plain:
+            return
+        if SLOT_RE.search(text):
+            slots = [int(m.group(1)) - 1 for m in SLOT_RE.finditer(text)]
+            literals = SLOT_RE.split(text)[::2]
+            if min(slots) >= 0 and not any("%" in lit for lit in literals):
+                self.literals, self.slots = literals, tuple(slots)
+            return
+        literals, slots, pos = [], [], 0
+        for m in FORMAT_RE.finditer(text):
+            if m.group(0) == "%%":
+                continue
+            literals.append(text[pos:m.start()].replace("%%", "%"))
+            slots.append(m.group(0)[1])
+            pos = m.end()
+        tail = text[pos:]
+        if "%" in FORMAT_RE.sub("", text):
+            return  # "%" that is not a plain spec, e.g. "10%" in a help text
+        literals.append(tail.replace("%%", "%"))
+        self.literals, self.slots = literals, tuple(slots)
+
+    def render(self, args: tuple = (), kwargs: dict = None) -> str:
+        if self.plain or not (args or kwargs):
+            return self.text
+        literals, slots = self.literals, self.slots
+        if literals is None or not args:
+            return format_text(self.text, args, kwargs or {})
+        if slots and type(slots[0]) is int:
+            values = []
+            for idx in slots:
+                if idx >= len(args):
+                    return format_text(self.text, args, kwargs or {})
+                value = str(args[idx])
+                if "%" in value:
+                    # substituted args go through "%" formatting too
+                    return format_text(self.text, args, kwargs or {})
+                values.append(value)
+        else:
+            if len(args) != len(slots):
+                return format_text(self.text, args, kwargs or {})
+            values = []
+            for spec, arg in zip(slots, args):
+                if spec == "d" and type(arg) is not int:
+                    return format_text(self.text, args, kwargs or {})
+                values.append(str(arg))
+        out = [literals[0]]
+        for value, literal in zip(values, literals[1:]):
+            out.append(value)
+            out.append(literal)
+        return "".join(out)
+
 class StringsManager:
     _instance = None
 
@@ -21,7 +106,9 @@ class StringsManager:
 
     def _init(self):
         self.strings_by_lang = {}
-        self.redis = RedisClient()
+        self.templates_by_lang = {}
+        self.version = 0
+        self.settings = UserSettings()
         self.load_all_strings()
 
     def load_all_strings(self):
@@ -47,9 +134,43 @@ class StringsManager:
             elif f_name.startswith("strings_") and f_name.endswith(".json"):
                 lang = f_name.split("_")[1].split(".")[0]
                 load_file(file_path, lang)
+        self.templates_by_lang = {
+            lang: {key: Template(text) for key, text in strings.items()}
+            for lang, strings in self.strings_by_lang.items()
+        }
+        self.version += 1
+
+    def has(self, key: str, lang: str = None) -> bool:
+        return key in self.strings_by_lang.get(lang, {}) or key in self.strings_by_lang.get(None, {})
+
+    async def resolve_langs(self, *user_ids) -> dict:
+        # one lookup per update, handlers below read the result without touching redis
+        try:
+            langs = await self.settings.aget_user_langs(*{u for u in user_ids if u})
+        except Exception as e:
+            self.settings.logger.error(f"Cant resolve langs {user_ids}: {e}")
+            langs = {}
+        update_langs.set(langs)
+        return langs
+
+    async def set_user_lang(self, user_id, lang: str) -> str:
+        await self.settings.aset_user_lang(user_id, lang)
+        langs = update_langs.get()
+        if langs is not None:
+            langs[user_id] = lang
+        return lang
 
     def get_cur_lang(self, user_id=None) -> str:
-        return self.redis.get_user_lang(user_id) if user_id else None
+        if not user_id:
+            return None
+        langs = update_langs.get()
+        if langs is None:
+            # outside of an update, e.g. startup code
+            return self.settings.get_user_lang(user_id)
+        if user_id in langs:
+            return langs[user_id]
+        # not resolved for this update, never block the loop on redis here
+        return self.settings.cached_user_lang(user_id)
 
     def get(self, key: str, user_id=None, *args, **kwargs):
         return self.get_with_lang(key, user_id, None, *args, **kwargs)
@@ -57,21 +178,11 @@ class StringsManager:
     def get_with_lang(self, key: str, user_id=None, lang: str = None, *args, **kwargs):
         if not key: return ""
         if not lang:
-            lang = self.redis.get_user_lang(user_id) if user_id else None
-        text = self.strings_by_lang.get(lang, {}).get(key)
-        if text is None:
-            text = self.strings_by_lang.get(None, {}).get(key, f"[!{key}]")
-        if args or kwargs:
-            try:
-                def repl(m):
-                    idx = int(m.group(1)) - 1
-                    if idx < len(args):
-                        return str(args[idx])
-                    return m.group(0)
-
-                text = re.sub(r"%(\d+)\$[sd]", repl, text)
-                if "%" in text:
-                    text = text % args if args else text % kwargs
-            except Exception:
-                traceback.print_exc()
-        return text
+            lang = self.get_cur_lang(user_id)
+        template = self.templates_by_lang.get(lang, {}).get(key)
+        if template is None:
+            template = self.templates_by_lang.get(None, {}).get(key)
+        if template is None:
+            text = f"[!{key}]"
+            return format_text(text, args, kwargs) if args or kwargs else text
+        return template.render(args, kwargs)
@@ -0,0 +1,361 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from logging import Logger
+
+from .key_loader import load_key
+from .logging_utils import BOT_ROOT, setup_temp_logger
+from .redis_utils import RedisClient
+
+DIR_DATA = os.path.join(BOT_ROOT, ".data")
+
+# users are spread over a fixed number of hashes by crc32 of the id (ids are sparse, ranges of ids
+# would give a hash per user). Up to about 100 users per hash keeps it under hash-max-listpack-entries (128)
+# in the compact listpack encoding, the default is enough for about 1.5M users. Changing it needs a new migration.
+SETTINGS_BUCKETS = int(load_key("SETTINGS_BUCKETS") or 16384)
+BUCKET_PREFIX = "us"
+LEGACY_FIELDS = ("lang",)  # stored as `user:{id}:{field}` before the buckets
+USER_INVALIDATE_CHANNEL = "user:invalidate"
+
+# KEYS: bucket. ARGV: user field, json of changed settings (null removes a setting),
+# "nx" to keep settings that are already set.
+UPDATE_SCRIPT = """
+local raw = redis.call('HGET', KEYS[1], ARGV[1])
+local data = raw and cjson.decode(raw) or {}
+local nx = ARGV[3] == 'nx'
+for k, v in pairs(cjson.decode(ARGV[2])) do
+    if v == cjson.null then
+        if not nx then data[k] = nil end
+    elseif not (nx and data[k] ~= nil) then
+        data[k] = v
+    end
+end
+if next(data) == nil then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+else
+    redis.call('HSET', KEYS[1], ARGV[1], cjson.encode(data))
+end
+return 1
+"""
+
+
+def bucket_key(user_id) -> tuple[str, str]:
+    user_id = str(int(user_id))
+    return f"{BUCKET_PREFIX}:{zlib.crc32(user_id.encode()) % SETTINGS_BUCKETS}", user_id
+
+
+def _decode(raw: str | None) -> dict:
+    try:
+        return json.loads(raw) if raw else {}
+    except ValueError:
+        return {}
+
+
+class TTLCache:
+    # LRU with expiry, None values are not kept
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.data: OrderedDict = OrderedDict()  # { key: (expires_at, value) }, oldest used first
+        self.stats = {"hits": 0, "misses": 0, "invalidated": 0}
+
+    def get(self, key, default=None):
+        item = self.data.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self.data[key]
+            self.stats["misses"] += 1
+            return default
+        self.data.move_to_end(key)
+        self.stats["hits"] += 1
+        return item[1]
+
+    def set(self, key, value):
+        if value is None:
+            self.data.pop(key, None)
+            return
+        self.data[key] = (time.monotonic() + self.ttl, value)
+        self.data.move_to_end(key)
+        while len(self.data) > self.max_size:
+            self.data.popitem(last=False)
+
+    def invalidate(self, key):
+        if self.data.pop(key, None) is not None:
+            self.stats["invalidated"] += 1
+
+    def clear(self):
+        self.data.clear()
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "size": len(self.data)}
+
+
+class RedisSettingsStore:
+    # per-user settings packed as small json values in bucketed hashes
+    local = False
+
+    def __init__(self, client: RedisClient):
+        self.client = client  # RedisClient
+        # until the migration is done, missing settings are read from the old keys in the same round trip
+        self.legacy = (load_key("SETTINGS_LEGACY_KEYS") or "1") != "0"
+        self.update_script = client.redis.register_script(UPDATE_SCRIPT)
+        self.aupdate_script = None
+
+    def _queue_reads(self, pipe, user_ids):
+        for u in user_ids:
+            pipe.hget(*bucket_key(u))
+            if self.legacy:
+                for field in LEGACY_FIELDS:
+                    pipe.get(f"user:{u}:{field}")
+
+    def _collect(self, user_ids, values) -> dict:
+        result, values = {}, iter(values)
+        for u in user_ids:
+            settings = _decode(next(values))
+            if self.legacy:
+                for field in LEGACY_FIELDS:
+                    value = next(values)
+                    if value is not None and field not in settings:
+                        settings[field] = value
+            result[u] = settings
+        return result
+
+    def get(self, user_id) -> dict:
+        pipe = self.client.redis.pipeline(transaction=False)
+        self._queue_reads(pipe, [user_id])
+        return self._collect([user_id], pipe.execute())[user_id]
+
+    async def get_many(self, user_ids) -> dict:
+        # { user_id: { setting: value } }, all users in one round trip
+        user_ids = list(user_ids)
+        pipe = self.client.aio().pipeline(transaction=False)
+        self._queue_reads(pipe, user_ids)
+        return self._collect(user_ids, await pipe.execute())
+
+    def update(self, user_id, **settings):
+        key, field = bucket_key(user_id)
+        self.update_script(keys=[key], args=[field, json.dumps(settings), ""])
+
+    async def aupdate(self, user_id, **settings):
+        aredis = self.client.aio()
+        if self.aupdate_script is None or self.aupdate_script.registered_client is not aredis:
+            self.aupdate_script = aredis.register_script(UPDATE_SCRIPT)
+        key, field = bucket_key(user_id)
+        await self.aupdate_script(keys=[key], args=[field, json.dumps(settings), ""])
+
+    def migrate(self, logger: Logger, batch: int = 1000, delete: bool = True) -> int:
+        # moves `user:{id}:{field}` keys into the buckets, safe to run again
+        redis = self.client.redis
+        moved = 0
+        for field in LEGACY_FIELDS:
+            keys = []
+            for key in redis.scan_iter(match=f"user:*:{field}", count=batch):
+                keys.append(key)
+                if len(keys) >= batch:
+                    moved += self._migrate_keys(field, keys, delete)
+                    keys = []
+                    logger.info(f"Migrated {moved} settings")
+            if keys:
+                moved += self._migrate_keys(field, keys, delete)
+        logger.info(f"Migration done, {moved} settings moved")
+        return moved
+
+    def _migrate_keys(self, field: str, keys: list, delete: bool) -> int:
+        redis = self.client.redis
+        values = redis.mget(keys)
+        pipe = redis.pipeline(transaction=False)
+        moved = 0
+        for key, value in zip(keys, values):
+            user_id = key.split(":")[1]
+            if value is None or not user_id.lstrip("-").isdigit():
+                continue
+            b_key, b_field = bucket_key(user_id)
+            # settings already written to the bucket are newer than the old key
+            self.update_script(keys=[b_key], args=[b_field, json.dumps({field: value}), "nx"], client=pipe)
+            if delete:
+                pipe.delete(key)
+            moved += 1
+        pipe.execute()
+        return moved
+
+
+class LocalSettingsStore:
+    # single process: settings live in memory and are saved to sqlite in the background
+    local = True
+
+    def __init__(self, path: str, logger: Logger):
+        self.path = path
+        self.logger = logger
+        self.data = {}  # { user_id: { setting: value } }
+        self.dirty = set()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            for user_id, raw in db.execute("SELECT user_id, data FROM settings"):
+                self.data[user_id] = _decode(raw)
+        self.logger.info(f"Loaded settings of {len(self.data)} users from {path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path)
+        db.execute("CREATE TABLE IF NOT EXISTS settings (user_id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        return db
+
+    def get(self, user_id) -> dict:
+        return dict(self.data.get(str(user_id)) or {})
+
+    async def get_many(self, user_ids) -> dict:
+        return {u: self.get(u) for u in user_ids}
+
+    def update(self, user_id, **settings):
+        user_id = str(user_id)
+        data = self.data.setdefault(user_id, {})
+        for k, v in settings.items():
+            if v is None:
+                data.pop(k, None)
+            else:
+                data[k] = v
+        if not data:
+            self.data.pop(user_id)
+        self.dirty.add(user_id)
+
+    async def aupdate(self, user_id, **settings):
+        self.update(user_id, **settings)
+
+    def _take_dirty(self) -> tuple[list, list]:
+        dirty, self.dirty = self.dirty, set()
+        rows = [(u, json.dumps(self.data[u])) for u in dirty if u in self.data]
+        deleted = [(u,) for u in dirty if u not in self.data]
+        return rows, deleted
+
+    def _write(self, rows: list, deleted: list):
+        with self._connect() as db:
+            db.executemany("INSERT OR REPLACE INTO settings (user_id, data) VALUES (?, ?)", rows)
+            db.executemany("DELETE FROM settings WHERE user_id = ?", deleted)
+
+    async def snapshot(self):
+        rows, deleted = self._take_dirty()
+        if not rows and not deleted:
+            return
+        try:
+            await asyncio.to_thread(self._write, rows, deleted)
+        except Exception as e:
+            # keep them for the next snapshot
+            self.dirty.update(u for u, *_ in rows + deleted)
+            self.logger.error(f"Cant save settings to {self.path}: {e}")
+
+    def flush(self):
+        rows, deleted = self._take_dirty()
+        if rows or deleted:
+            self._write(rows, deleted)
+
+
+class UserSettings:
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        self.logger = setup_temp_logger('UserSettings')
+        self.backend_name = load_key("SETTINGS_BACKEND") or "redis"
+        if self.backend_name == "local":
+            path = load_key("SETTINGS_PATH") or os.path.join(DIR_DATA, "settings.sqlite")
+            self.store = LocalSettingsStore(path, self.logger)
+            self.redis = None
+        else:
+            self.redis = RedisClient()
+            self.store = RedisSettingsStore(self.redis)
+        self.snapshot_interval = int(load_key("SETTINGS_SNAPSHOT_INTERVAL") or 30)
+        self.lang_cache = TTLCache(
+            # the local store is memory already
+            max_size=0 if self.store.local else int(load_key("LANG_CACHE_SIZE") or 10000),
+            ttl=int(load_key("LANG_CACHE_TTL") or 600),
+        )
+        self.instance_id = uuid.uuid4().hex[:8]
+
+    def cached_user_lang(self, user_id):
+        if self.store.local:
+            return self.store.get(user_id).get("lang")
+        return self.lang_cache.get(str(user_id))
+
+    def get_user_lang(self, user_id):
+        lang = self.cached_user_lang(user_id)
+        if lang is not None:
+            return lang
+        lang = self.store.get(user_id).get("lang")
+        self.lang_cache.set(str(user_id), lang)
+        return lang
+
+    def set_user_lang(self, user_id, lang: str):
+        self.store.update(user_id, lang=lang)
+        self._publish_sync(user_id)
+        self.lang_cache.set(str(user_id), lang)
+        return lang
+
+    async def aget_user_langs(self, *user_ids) -> dict:
+        # cached langs plus one pipelined read for the rest
+        langs = {}
+        for u in user_ids:
+            if (lang := self.cached_user_lang(u)) is not None:
+                langs[u] = lang
+        missing = [u for u in user_ids if u not in langs]
+        if missing:
+            settings = await self.store.get_many(missing)
+            for u in missing:
+                langs[u] = lang = settings[u].get("lang")
+                self.lang_cache.set(str(u), lang)
+        return langs
+
+    async def aget_user_lang(self, user_id):
+        return (await self.aget_user_langs(user_id)).get(user_id)
+
+    async def aset_user_lang(self, user_id, lang: str):
+        await self.store.aupdate(user_id, lang=lang)
+        if self.redis is not None:
+            await self.redis.aio().publish(USER_INVALIDATE_CHANNEL, f"{self.instance_id}:{user_id}")
+        self.lang_cache.set(str(user_id), lang)
+        return lang
+
+    def _publish_sync(self, user_id):
+        if self.redis is not None:
+            self.redis.redis.publish(USER_INVALIDATE_CHANNEL, f"{self.instance_id}:{user_id}")
+
+    async def sync_loop(self):
+        # local: saves changed settings to disk, redis: drops settings changed by other bot processes from the cache
+        if self.store.local:
+            while True:
+                await asyncio.sleep(self.snapshot_interval)
+                await self.store.snapshot()
+        while True:
+            pubsub = self.redis.aio().pubsub()
+            try:
+                await pubsub.subscribe(USER_INVALIDATE_CHANNEL)
+                # messages could be missed while not subscribed
+                self.lang_cache.clear()
+                async for msg in pubsub.listen():
+                    if msg.get("type") != "message":
+                        continue
+                    sender, _, user_id = str(msg["data"]).partition(":")
+                    if sender != self.instance_id:
+                        self.lang_cache.invalidate(user_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"User cache invalidation error: {e}")
+                await asyncio.sleep(5)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    async def close(self):
+        if self.store.local:
+            self.store.flush()
@@ -4,8 +4,6 @@ import re
 import io
 import tempfile
 
-from moviepy.video.io.VideoFileClip import VideoFileClip
-
 TMP_DIR = os.path.join(".temp")
 
 def highlight_html(_text: str, _query: str, tag:str = None) -> str:
@@ -32,22 +30,37 @@ def in_docker():
     except FileNotFoundError:
         return False
 
-async def video_to_audio_bytes(video_bytes: bytes, audio_format="mp3", name: str = None) -> io.BytesIO:
+async def video_file_to_audio(video_path: str, audio_format="mp3") -> str:
+    # returns path of a new temp audio file, caller removes it
+    from moviepy.video.io.VideoFileClip import VideoFileClip
+
     loop = asyncio.get_event_loop()
-    out_buffer = io.BytesIO()
+    os.makedirs(TMP_DIR, exist_ok=True)
+    fd, audio_path = tempfile.mkstemp(dir=TMP_DIR, suffix=f".{audio_format}")
+    os.close(fd)
+
+    def _extract_audio():
+        with VideoFileClip(video_path) as clip:
+            clip.audio.write_audiofile(audio_path, fps=44100, codec=audio_format, write_logfile=False)
+
+    try:
+        await loop.run_in_executor(None, _extract_audio)
+    except Exception:
+        os.remove(audio_path)
+        raise
+    return audio_path
 
-    def _extract_audio(tmp_video_path: str):
-        with VideoFileClip(tmp_video_path) as clip:
-            with tempfile.NamedTemporaryFile(dir=TMP_DIR, suffix=f".{audio_format}", delete=True) as tmp_audio:
-                clip.audio.write_audiofile(tmp_audio.name, fps=44100, codec=audio_format, write_logfile=False)
-                tmp_audio.seek(0)
-                out_buffer.write(tmp_audio.read())
-        out_buffer.seek(0)
 
+async def video_to_audio_bytes(video_bytes: bytes, audio_format="mp3", name: str = None) -> io.BytesIO:
     with tempfile.NamedTemporaryFile(dir=TMP_DIR, suffix=".mp4", delete=True) as tmp_video:
         tmp_video.write(video_bytes)
         tmp_video.flush()
-        await loop.run_in_executor(None, _extract_audio, tmp_video.name)
+        audio_path = await video_file_to_audio(tmp_video.name, audio_format)
+    try:
+        with open(audio_path, "rb") as f:
+            out_buffer = io.BytesIO(f.read())
+    finally:
+        os.remove(audio_path)
     if not name: name = "audio"
     out_buffer.name = f"{name}.{audio_format}"
     return out_buffer
\ No newline at end of file
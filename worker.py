@@ -0,0 +1,27 @@
+from multiprocessing import Process
+
+from bot.job_worker import JobWorker
+from utils import load_key, setup_logger
+
+
+def run_worker(token: str) -> None:
+    logger = setup_logger('BotWorker', 'worker.log')
+    JobWorker(token, logger).run()
+
+
+def main() -> None:
+    if not (BOT_TOKEN := load_key("BOT_TOKEN")):
+        raise RuntimeError("Telegram BOT_TOKEN is not set in environment")
+
+    processes = [
+        Process(target=run_worker, args=(BOT_TOKEN,), daemon=True)
+        for _ in range(int(load_key("JOB_PROCESSES") or 1))
+    ]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+
+if __name__ == "__main__":
+    main()